@@ -0,0 +1,147 @@
+import os
+import sys
+import shutil
+import importlib.util
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from image_utils import convert_to_square_rgb, open_for_width
+from image_cache import file_key
+
+# ====================
+# Chuyển nhiều ảnh song song trên nhiều process (không import Qt)
+# ====================
+
+
+def default_workers():
+    return max(1, os.cpu_count() or 1)
+
+
+def convert_file(src, out_dir, width):
+    """Chuyển 1 ảnh → BMP, trả (src, tên file, dung lượng, lỗi)."""
+    name = _bmp_name(src)
+    try:
+        with open_for_width(src) as im:
+            im2 = convert_to_square_rgb(width, im)
+        out_path = os.path.join(out_dir, name)
+        im2.save(out_path, "BMP")
+        return src, name, os.path.getsize(out_path), None
+    except Exception as e:
+        return src, name, None, str(e)
+
+
+def duplicate_groups(files):
+    """
+    Gom các file trùng nội dung: {file đại diện: [các file trùng]}.
+    Chỉ băm các file có cùng dung lượng, file khác dung lượng bỏ qua.
+    """
+    by_size = {}
+    for f in files:
+        try:
+            size = os.path.getsize(f)
+        except OSError:
+            size = None
+        by_size.setdefault(size, []).append(f)
+
+    leader_of = {}
+    for size, same in by_size.items():
+        if size is None or len(same) == 1:
+            continue
+        by_hash = {}
+        for f in same:
+            try:
+                by_hash.setdefault(file_key(f), []).append(f)
+            except OSError:
+                pass
+        for group in by_hash.values():
+            for f in group[1:]:
+                if f != group[0]:
+                    leader_of[f] = group[0]
+
+    groups = {}
+    for f in files:
+        if f in leader_of:
+            groups[leader_of[f]].append(f)
+        else:
+            groups.setdefault(f, [])
+    return groups
+
+
+@contextmanager
+def _light_main():
+    """
+    spawn chạy lại module __main__ trong mỗi process con → mở từ main.py thì
+    process con nạp cả PySide6 chỉ để convert ảnh. Lúc tạo process con, tạm
+    trỏ __main__ về module này để process con chỉ nạp image_utils / PIL.
+    """
+    main = sys.modules.get("__main__")
+    if main is None:
+        yield
+        return
+    old = getattr(main, "__spec__", None)
+    main.__spec__ = importlib.util.find_spec(__name__)
+    try:
+        yield
+    finally:
+        main.__spec__ = old
+
+
+def _bmp_name(path):
+    return os.path.splitext(os.path.basename(path))[0] + ".bmp"
+
+
+def _copy_result(result, dupe, out_dir):
+    src, name, size, error = result
+    dupe_name = _bmp_name(dupe)
+    if error:
+        return dupe, dupe_name, None, error
+    if dupe_name != name:
+        shutil.copyfile(os.path.join(out_dir, name), os.path.join(out_dir, dupe_name))
+    return dupe, dupe_name, size, None
+
+
+def iter_convert(files, out_dir, width, workers=None, window=None, cancelled=None):
+    """
+    Trả kết quả convert_file theo thứ tự xong trước.
+    Chỉ giữ tối đa `window` ảnh đang xử lý để RAM không tăng theo số file.
+    Ảnh trùng nội dung chỉ convert 1 lần, các bản còn lại copy file kết quả.
+    """
+    workers = workers or default_workers()
+    window = window or workers * 2
+    groups = duplicate_groups(files)
+    pending = iter(groups)
+
+    # spawn: giống hành vi trên Windows, không fork process đang chạy Qt
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        in_flight = set()
+
+        def fill():
+            # process con được tạo dần trong submit() → bọc cả vòng
+            with _light_main():
+                while len(in_flight) < window:
+                    src = next(pending, None)
+                    if src is None:
+                        return
+                    in_flight.add(pool.submit(convert_file, src, out_dir, width))
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                in_flight.discard(fut)
+                result = fut.result()
+                yield result
+                for dupe in groups[result[0]]:
+                    try:
+                        yield _copy_result(result, dupe, out_dir)
+                    except OSError as e:
+                        yield dupe, _bmp_name(dupe), None, str(e)
+
+            if cancelled and cancelled():
+                for fut in in_flight:
+                    fut.cancel()
+                return
+
+            fill()
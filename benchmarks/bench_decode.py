@@ -0,0 +1,140 @@
+"""
+So sánh convert ảnh lớn: decode đầy đủ + LANCZOS (cách cũ)
+với draft JPEG + reduce + LANCZOS (cách mới).
+
+Chạy:  python benchmarks/bench_decode.py [ảnh.jpg] [--width 72]
+Không truyền ảnh → tự tạo JPEG ~24 MP trong thư mục tạm.
+Mỗi cách (và cả bước tạo ảnh mẫu) chạy trong process riêng để đo RAM đỉnh
+của riêng lần decode đó (Linux: VmHWM sau khi đặt lại, nơi khác: ru_maxrss).
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_sample(path, size=(6000, 4000)):
+    from PIL import Image
+    # gradient + nhiễu nhẹ để JPEG không quá dễ nén
+    small = Image.effect_mandelbrot((600, 400), (-2.2, -1.2, 1.0, 1.2), 100)
+    im = Image.merge("RGB", (
+        small,
+        Image.linear_gradient("L").resize(small.size),
+        Image.effect_noise(small.size, 40),
+    )).resize(size, Image.BICUBIC)
+    im.save(path, "JPEG", quality=92)
+
+
+def _reset_peak():
+    # Linux: ru_maxrss giữ qua fork/exec (lấy cả mức đỉnh của process cha)
+    # → đặt lại VmHWM về RSS hiện tại trước khi đo
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KB, macOS: byte
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+
+def run_one(mode, path, width, out_path):
+    from PIL import Image
+    from image_utils import center_crop_square, convert_to_square_rgb, open_for_width
+
+    _reset_peak()
+    start = time.perf_counter()
+    if mode == "old":
+        with Image.open(path) as im:
+            out = center_crop_square(im).resize((width, width), Image.LANCZOS).convert("RGB")
+    else:
+        with open_for_width(path) as im:
+            out = convert_to_square_rgb(width, im)
+    elapsed = time.perf_counter() - start
+
+    out.save(out_path, "PNG")
+    print(json.dumps({"time": elapsed, "rss": _peak_rss_mb()}))
+
+
+def psnr(a, b):
+    from PIL import ImageChops, ImageStat
+    diff = ImageChops.difference(a, b)
+    max_diff = max(hi for _, hi in diff.getextrema())
+    mse = sum(v for v in ImageStat.Stat(diff).sum2) / (a.width * a.height * 3)
+    return max_diff, (float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("image", nargs="?")
+    ap.add_argument("--width", type=int, default=72)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    ap.add_argument("--out", help=argparse.SUPPRESS)
+    ap.add_argument("--make-sample", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_one(args.child, args.image, args.width, args.out)
+        return
+    if args.make_sample:
+        make_sample(args.make_sample)
+        return
+
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.image
+        if not path:
+            path = os.path.join(tmp, "sample.jpg")
+            print("Tạo ảnh mẫu 6000x4000...")
+            # process riêng: RAM lúc tạo ảnh không lẫn vào số đo của các lần decode
+            subprocess.run([sys.executable, __file__, "--make-sample", path], check=True)
+
+        with Image.open(path) as im:
+            print(f"Ảnh: {os.path.basename(path)} {im.size[0]}x{im.size[1]} {im.format}, width={args.width}")
+
+        results = {}
+        for mode in ("old", "new"):
+            out = os.path.join(tmp, f"{mode}.png")
+            runs = []
+            for _ in range(args.repeat):
+                p = subprocess.run(
+                    [sys.executable, __file__, path, "--width", str(args.width),
+                     "--child", mode, "--out", out],
+                    capture_output=True, text=True, check=True,
+                )
+                runs.append(json.loads(p.stdout))
+            best = min(r["time"] for r in runs)
+            rss = max((r["rss"] or 0) for r in runs)
+            results[mode] = Image.open(out).convert("RGB")
+            print(f"  {mode}: {best * 1000:8.1f} ms   RAM đỉnh {rss:7.1f} MB")
+
+        max_diff, db = psnr(results["old"], results["new"])
+        print(f"  chênh lệch: max {max_diff}/255, PSNR {db:.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
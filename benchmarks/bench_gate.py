@@ -0,0 +1,97 @@
+"""
+Đo thời gian lệnh người dùng (POST /json/state) phải chờ khi mạch đang bị
+theo dõi nền dồn dập (nhiều thread GET /json/info "poll" / "probe").
+So sánh hàng chờ ưu tiên của DeviceClient với cách cũ (chỉ giới hạn
+pool socket, ai tới trước chạy trước).
+
+    python benchmarks/bench_gate.py --latency 100 --background 6 --commands 10
+Thoát mã 1 nếu lệnh người dùng chậm nhất (có hàng chờ) vượt --budget (ms).
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(address, max_in_flight, args):
+    from device_client import DeviceClient
+
+    client = DeviceClient(address, max_in_flight=max_in_flight)
+    stop = threading.Event()
+
+    def background(kind):
+        while not stop.is_set():
+            try:
+                client.get("/json/info", kind)
+            except Exception:
+                pass
+
+    threads = [
+        threading.Thread(target=background, args=("poll" if i % 2 else "probe",), daemon=True)
+        for i in range(args.background)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)   # để hàng chờ đầy
+
+    totals = []
+    for i in range(args.commands):
+        start = time.perf_counter()
+        client.post_state({"seg": [{"id": 0, "fx": i % 5}]})
+        totals.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.1)
+
+    stop.set()
+    for t in threads:
+        t.join()
+    gate = client.gate
+    client.close()
+    return totals, gate
+
+
+def main():
+    from fake_poi import FakePoi
+    from device_client import MAX_IN_FLIGHT
+
+    ap = argparse.ArgumentParser(description="Lệnh người dùng khi mạch đang bị theo dõi nền")
+    ap.add_argument("--latency", type=float, default=100.0, help="RTT mạch giả (ms)")
+    ap.add_argument("--background", type=int, default=6, help="số thread theo dõi nền")
+    ap.add_argument("--commands", type=int, default=10)
+    ap.add_argument("--budget", type=float, default=None,
+                    help="ngưỡng lệnh chậm nhất (ms), mặc định 3 × RTT "
+                         "(chờ 1 request đang chạy + RTT của chính nó)")
+    args = ap.parse_args()
+    budget = args.budget or args.latency * 3
+
+    dev = FakePoi(args.latency / 1000)
+    address = dev.start()
+
+    # giới hạn rất lớn → hàng chờ không bao giờ đầy, chỉ còn pool socket (như trước)
+    print("không ưu tiên:")
+    totals, _ = run(address, 1000, args)
+    print(f"  lệnh người dùng: trung vị {statistics.median(totals):.0f} ms, "
+          f"chậm nhất {max(totals):.0f} ms")
+
+    print("hàng chờ ưu tiên:")
+    totals, gate = run(address, MAX_IN_FLIGHT, args)
+    print(f"  lệnh người dùng: trung vị {statistics.median(totals):.0f} ms, "
+          f"chậm nhất {max(totals):.0f} ms")
+    print(f"  hàng chờ sâu nhất: {gate.max_depth}")
+    for kind, (n, avg, mx) in gate.summary().items():
+        print(f"  chờ {kind:6}: {n:4} req, TB {avg:6.1f} ms, max {mx:6.1f} ms")
+    dev.stop()
+
+    worst = max(totals)
+    ok = worst <= budget
+    print(f"{'✅ Đạt' if ok else '❌ Không đạt'} (ngưỡng {budget:.0f} ms)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
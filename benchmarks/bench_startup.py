@@ -0,0 +1,90 @@
+"""
+Đo thời gian từ lúc chạy app tới khi cửa sổ sẵn sàng (time-to-window).
+Thoát mã 1 nếu vượt ngân sách hoặc nếu lúc khởi động đã nạp module nặng
+(PIL, requests, zeroconf, QtWebEngine) — các module này phải nạp khi cần.
+
+    python benchmarks/bench_startup.py                      # chạy main.py
+    python benchmarks/bench_startup.py --exe dist/main.exe  # bản đóng gói
+    python benchmarks/bench_startup.py --budget 2500 --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ngân sách mặc định (ms), trung vị các lần chạy
+DEFAULT_BUDGET_MS = 3000
+
+
+def run_once(cmd, timeout):
+    fd, probe = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    os.remove(probe)
+
+    env = dict(os.environ, POI_STARTUP_PROBE=probe)
+    start = time.time()
+    p = subprocess.run(cmd, cwd=ROOT, env=env, timeout=timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        with open(probe, encoding="utf-8") as f:
+            data = json.load(f)
+    except OSError:
+        raise SystemExit(f"App không ghi kết quả đo (mã thoát {p.returncode}):\n"
+                         + p.stderr.decode(errors="replace")[-2000:])
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+
+    return {
+        "shown": (data["shown"] - start) * 1000,
+        "ready": (data["ready"] - start) * 1000,
+        "loaded": data["loaded"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--exe", help="đường dẫn file .exe đã đóng gói (mặc định chạy main.py)")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget", type=float,
+                    default=float(os.environ.get("POI_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)),
+                    help="ngân sách time-to-window (ms)")
+    ap.add_argument("--timeout", type=float, default=60)
+    args = ap.parse_args()
+
+    cmd = [args.exe] if args.exe else [sys.executable, os.path.join(ROOT, "main.py")]
+
+    # lần đầu làm nóng cache đĩa / giải nén onefile, không tính
+    run_once(cmd, args.timeout)
+
+    runs = [run_once(cmd, args.timeout) for _ in range(args.runs)]
+    shown = statistics.median(r["shown"] for r in runs)
+    ready = statistics.median(r["ready"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+
+    print(f"Lệnh: {' '.join(cmd)}")
+    print(f"  hiện cửa sổ : {shown:7.0f} ms (trung vị {args.runs} lần)")
+    print(f"  sẵn sàng    : {ready:7.0f} ms  (ngân sách {args.budget:.0f} ms)")
+    print(f"  module nặng : {', '.join(loaded) or 'không'}")
+
+    failed = False
+    if ready > args.budget:
+        print("✗ Vượt ngân sách khởi động")
+        failed = True
+    if loaded:
+        print("✗ Module nặng bị nạp lúc khởi động")
+        failed = True
+
+    if not failed:
+        print("✓ OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
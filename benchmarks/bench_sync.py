@@ -0,0 +1,74 @@
+"""
+Đo độ lệch thời điểm bắt đầu preset giữa nhiều POI giả có độ trễ khác nhau:
+gửi song song bình thường (fan-out) so với sync_poi (bù trễ từng mạch).
+Độ lệch lấy từ thời điểm mạch giả thật sự áp dụng lệnh.
+
+    python benchmarks/bench_sync.py --latency 5,40,120 --jitter 2 --runs 5
+Thoát mã 1 nếu độ lệch trung vị của sync_poi vượt --budget (ms).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def applied_spread(devices, since):
+    times = []
+    for dev in devices:
+        with dev.lock:
+            hits = [t for t, _ in dev.applied if t >= since]
+        times.append(min(hits))
+    return max(times) - min(times)
+
+
+def main():
+    from fake_poi import start_many
+    from fanout import post_state_all
+    from sync_poi import sync_start, preset_payload
+
+    ap = argparse.ArgumentParser(description="Độ lệch bắt đầu preset giữa các POI")
+    ap.add_argument("--latency", default="5,40,120", help="RTT từng mạch (ms)")
+    ap.add_argument("--jitter", type=float, default=1.0, help="lệch ngẫu nhiên mỗi chiều (ms)")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=10.0, help="ngưỡng độ lệch sync_poi (ms)")
+    args = ap.parse_args()
+
+    devices = start_many([float(x) / 1000 for x in args.latency.split(",")], args.jitter / 1000)
+    ips = [dev.address for dev in devices]
+    payload = preset_payload(1)
+
+    naive, synced, predicted = [], [], []
+    for _ in range(args.runs):
+        since = time.perf_counter()
+        post_state_all(ips, payload)
+        naive.append(applied_spread(devices, since))
+
+        since = time.perf_counter()
+        report, _ = sync_start(ips, payload)
+        synced.append(applied_spread(devices, since))
+        predicted.append(report.spread)
+
+    def ms(values):
+        return f"trung vị {statistics.median(values) * 1000:6.1f} ms, tối đa {max(values) * 1000:6.1f} ms"
+
+    print(f"Mạch giả RTT: {args.latency} ms, jitter ±{args.jitter} ms, {args.runs} lượt")
+    print(f"Fan-out thường : {ms(naive)}")
+    print(f"sync_poi (thật): {ms(synced)}")
+    print(f"sync_poi (báo) : {ms(predicted)}")
+
+    for dev in devices:
+        dev.stop()
+
+    if statistics.median(synced) * 1000 > args.budget:
+        print(f"❌ Vượt ngân sách {args.budget} ms")
+        sys.exit(1)
+    print("✅ Đạt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Xóa hàng loạt preset trên mạch POI giả qua DeviceClient thật (có hàng chờ ưu tiên):
+kiểm tra giới hạn đồng thời AIMD của preset_wipe thật sự tăng quá START_LIMIT
+khi mạch trả lời tốt, và số request cùng lúc tới mạch không vượt BULK_IN_FLIGHT.
+
+    python benchmarks/bench_wipe.py --latency 30 --count 80
+Thoát mã 1 nếu giới hạn không tăng quá START_LIMIT, vượt BULK_IN_FLIGHT hoặc còn ID lỗi.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    from fake_poi import FakePoi
+    from device_client import DeviceClient, BULK_IN_FLIGHT
+    from preset_wipe import START_LIMIT, wipe_presets
+
+    ap = argparse.ArgumentParser(description="Giới hạn đồng thời khi xóa preset hàng loạt")
+    ap.add_argument("--latency", type=float, default=30.0, help="RTT mạch giả (ms)")
+    ap.add_argument("--count", type=int, default=80, help="số preset xóa")
+    ap.add_argument("--poll", action="store_true", help="chạy thêm 1 thread theo dõi nền")
+    args = ap.parse_args()
+
+    dev = FakePoi(args.latency / 1000)
+    address = dev.start()
+    client = DeviceClient(address)
+
+    # đếm số request "bulk" đang chạy cùng lúc phía client
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    post_state = client.post_state
+
+    def counted(payload, kind="state", verbose=True):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return post_state(payload, kind, verbose)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    client.post_state = counted
+
+    stop = threading.Event()
+    if args.poll:
+        def poll():
+            while not stop.is_set():
+                client.get("/json/info", "poll")
+        threading.Thread(target=poll, daemon=True).start()
+
+    limits = []
+    start = time.perf_counter()
+    failed = wipe_presets(client, list(range(1, args.count + 1)),
+                          on_progress=lambda n, pid, limit: limits.append(limit))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    client.close()
+    dev.stop()
+
+    top = max(limits, default=0)
+    print(f"{args.count} preset trong {elapsed:.2f} s, lỗi {failed}")
+    print(f"  giới hạn: bắt đầu {START_LIMIT}, cao nhất {top} (tối đa {BULK_IN_FLIGHT})")
+    print(f"  request xóa cùng lúc cao nhất: {peak[0]}")
+
+    ok = top > START_LIMIT and top <= BULK_IN_FLIGHT and not failed
+    print("✅ Đạt" if ok else "❌ Không đạt")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
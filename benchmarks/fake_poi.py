@@ -0,0 +1,229 @@
+"""
+Mạch POI giả (HTTP + WebSocket /ws, chỉ thư viện chuẩn) để thử đồng bộ / fan-out /
+state qua WebSocket không cần phần cứng.
+Mỗi mạch có độ trễ mạng riêng: nửa trễ trước khi "áp dụng" lệnh, nửa trễ khi trả lời
+→ RTT ≈ trễ, thời điểm áp dụng được ghi lại để đo độ lệch thật giữa các mạch.
+Như WLED: client /ws nhận {"state", "info"} khi kết nối và sau mỗi lần state đổi.
+
+    python benchmarks/fake_poi.py --latency 5,40,120      # chạy 3 mạch tới khi Ctrl+C
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakePoi:
+    def __init__(self, latency=0.0, jitter=0.0, name="POI-FAKE"):
+        self.latency = latency      # (s) RTT mạng
+        self.jitter = jitter        # (s) lệch ngẫu nhiên thêm mỗi chiều
+        self.info = {"name": name, "ver": "0.15", "repo": "HappySmartLight",
+                     "fs": {"u": 100, "t": 1000}}
+        self.state = {"on": False, "bri": 128, "ps": -1, "seg": [{"id": 0, "fx": 0, "pal": 0}]}
+        self.presets = {"0": {}, "1": {"n": "Preset 1"}, "2": {"n": "Preset 2"}}
+        self.effects = ["Solid", "Blink", "Breathe", "Wipe", "Rainbow"]
+        self.palettes = ["Default", "Rainbow", "Party"]
+        self.applied = []           # (time.perf_counter(), payload) mỗi lần POST /json/state
+        self.lock = threading.Lock()
+        self.server = None
+        self.ws_clients = []        # WsClient đang kết nối
+
+    def apply(self, payload):
+        """Áp dụng lệnh /json/state (tập con của WLED) rồi đẩy state mới cho client /ws."""
+        with self.lock:
+            for k, v in payload.items():
+                if k == "seg":
+                    for seg in v:
+                        self.state["seg"][0].update({sk: sv for sk, sv in seg.items() if sk != "id"})
+                elif k in self.state:
+                    self.state[k] = v
+            # chọn effect trực tiếp → thoát preset đang chạy
+            if any("fx" in seg for seg in payload.get("seg", [])) and "ps" not in payload:
+                self.state["ps"] = -1
+        self.push()
+
+    def snapshot(self):
+        with self.lock:
+            return json.dumps({"state": self.state, "info": self.info})
+
+    def push(self):
+        message = self.snapshot()
+        for client in list(self.ws_clients):
+            client.send_text(message)
+
+    def one_way(self):
+        return max(0.0, self.latency / 2 + random.uniform(-self.jitter, self.jitter))
+
+    @property
+    def address(self):
+        return "127.0.0.1:%d" % self.server.server_address[1]
+
+    def start(self, port=0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WsClient:
+    """1 kết nối WebSocket phía server (frame server → client không mask)."""
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.lock = threading.Lock()
+
+    def _send(self, opcode, data):
+        head = bytes([0x80 | opcode])
+        n = len(data)
+        if n < 126:
+            head += bytes([n])
+        elif n < 65536:
+            head += bytes([126]) + struct.pack(">H", n)
+        else:
+            head += bytes([127]) + struct.pack(">Q", n)
+        with self.lock:
+            try:
+                self.wfile.write(head + data)
+                self.wfile.flush()
+            except OSError:
+                pass
+
+    def send_text(self, text):
+        self._send(0x1, text.encode())
+
+    def read_frame(self):
+        # trả (opcode, payload), None khi client đóng kết nối
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None
+        opcode, n = head[0] & 0x0F, head[1] & 0x7F
+        if n == 126:
+            n = struct.unpack(">H", self.rfile.read(2))[0]
+        elif n == 127:
+            n = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else b"\0\0\0\0"
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(n)))
+        return opcode, data
+
+
+def _handler(dev):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, obj):
+            time.sleep(dev.one_way())
+            body = json.dumps(obj).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _websocket(self):
+            accept = base64.b64encode(hashlib.sha1(
+                (self.headers["Sec-WebSocket-Key"] + WS_GUID).encode()).digest()).decode()
+            self.send_response(101)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+
+            client = WsClient(self.rfile, self.wfile)
+            dev.ws_clients.append(client)
+            client.send_text(dev.snapshot())
+            try:
+                while True:
+                    frame = client.read_frame()
+                    if frame is None or frame[0] == 0x8:
+                        break
+                    if frame[0] == 0x9:
+                        client._send(0xA, frame[1])   # ping → pong
+                    elif frame[0] == 0x1:
+                        dev.apply(json.loads(frame[1] or b"{}"))
+            finally:
+                dev.ws_clients.remove(client)
+                self.close_connection = True
+
+        def do_GET(self):
+            if self.headers.get("Upgrade", "").lower() == "websocket":
+                self._websocket()
+                return
+            time.sleep(dev.one_way())
+            path = self.path.split("?")[0]
+            if path == "/json/info":
+                self._reply(dev.info)
+            elif path == "/json/state":
+                self._reply(dev.state)
+            elif path == "/presets.json":
+                self._reply(dev.presets)
+            elif path == "/json/eff":
+                self._reply(dev.effects)
+            elif path == "/json/pal":
+                self._reply(dev.palettes)
+            elif path == "/json":
+                self._reply({"info": dev.info, "state": dev.state,
+                             "effects": dev.effects, "palettes": dev.palettes})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(dev.one_way())
+            payload = json.loads(data or b"{}")
+            with dev.lock:
+                dev.applied.append((time.perf_counter(), payload))
+            dev.apply(payload)
+            if payload.get("v"):
+                with dev.lock:
+                    state = json.loads(json.dumps(dev.state))
+                self._reply(state)   # như WLED: "v": true → trả state đầy đủ
+            else:
+                self._reply({"success": True})
+
+    return Handler
+
+
+def start_many(latencies, jitter=0.0):
+    """Chạy nhiều mạch giả, latencies tính bằng giây → [FakePoi]."""
+    devices = []
+    for i, lat in enumerate(latencies):
+        dev = FakePoi(lat, jitter, name=f"POI-FAKE-{i + 1}")
+        dev.start()
+        devices.append(dev)
+    return devices
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Chạy mạch POI giả")
+    ap.add_argument("--latency", default="5,40,120", help="RTT từng mạch (ms), cách nhau dấu phẩy")
+    ap.add_argument("--jitter", type=float, default=0.0, help="lệch ngẫu nhiên mỗi chiều (ms)")
+    args = ap.parse_args()
+
+    devices = start_many([float(x) / 1000 for x in args.latency.split(",")], args.jitter / 1000)
+    for dev in devices:
+        print(f"{dev.info['name']}: http://{dev.address}  (RTT {dev.latency * 1000:.0f} ms)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Mạch nhận UDP giả cho chế độ Live (DDP / DRGB / DNRGB): ghép gói thành frame,
+đếm fps — dùng để thử live_stream.py không cần phần cứng.
+
+    python benchmarks/udp_receiver.py --protocol ddp            # nghe cổng 4048, in fps mỗi giây
+    python benchmarks/udp_receiver.py --selftest --fps 100      # tự stream tới chính nó, đo fps + độ trễ
+Selftest thoát mã 1 nếu độ trễ đổi ảnh → tới nơi vượt --budget (ms) hoặc fps lệch > 10%.
+"""
+import argparse
+import os
+import socket
+import statistics
+import struct
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from live_stream import (PORTS, DDP_PUSH, DRGB, DNRGB, LiveStreamer,  # noqa: E402
+                         image_frames)
+
+
+class UdpReceiver:
+    def __init__(self, protocol="ddp", port=None, host="127.0.0.1"):
+        self.protocol = protocol
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, PORTS[protocol] if port is None else port))
+        self.sock.settimeout(0.2)
+        self.address = self.sock.getsockname()
+        self.frames = []        # (time.perf_counter(), bytes)
+        self.lock = threading.Lock()
+        self._buf = bytearray()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self.sock.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                packet = self.sock.recv(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            frame = self._decode(packet)
+            if frame is not None:
+                with self.lock:
+                    self.frames.append((time.perf_counter(), frame))
+
+    def _decode(self, packet):
+        # trả bytes RGB khi đủ 1 frame, chưa đủ → None
+        if self.protocol == "ddp":
+            flags, _, _, _, offset, length = struct.unpack(">BBBBIH", packet[:10])
+            data = packet[10:10 + length]
+            if offset == 0:
+                self._buf = bytearray()
+            self._buf[offset:offset + length] = data
+            if flags & DDP_PUSH:
+                return bytes(self._buf)
+            return None
+
+        kind = packet[0]
+        if kind == DRGB:
+            return packet[2:]
+        if kind == DNRGB:
+            start = struct.unpack(">H", packet[2:4])[0] * 3
+            if start == 0:
+                self._buf = bytearray()
+            self._buf[start:start + len(packet) - 4] = packet[4:]
+            return bytes(self._buf)   # DNRGB không có cờ kết thúc → mỗi gói cập nhật 1 phần
+        return None
+
+    def fps(self, window=1.0):
+        now = time.perf_counter()
+        with self.lock:
+            return sum(1 for t, _ in self.frames if now - t <= window) / window
+
+
+def selftest(args):
+    from PIL import Image
+
+    rx = UdpReceiver(args.protocol, port=0).start()
+    red = image_frames(Image.new("RGB", (args.width, args.width), (255, 0, 0)))
+    blue = image_frames(Image.new("RGB", (args.width, args.width), (0, 0, 255)))
+
+    tx = LiveStreamer([rx.address], red, fps=args.fps, protocol=args.protocol)
+    tx.start()
+    time.sleep(1.0)
+
+    latencies = []
+    for i in range(args.changes):
+        frames = blue if i % 2 == 0 else red
+        changed_at = time.perf_counter()
+        tx.set_frames(frames)
+        wanted = frames[0]
+        deadline = changed_at + 1.0
+        got = None
+        while got is None and time.perf_counter() < deadline:
+            with rx.lock:
+                got = next((t for t, f in rx.frames if t >= changed_at and f == wanted), None)
+            time.sleep(0.001)
+        latencies.append((got - changed_at) * 1000 if got else float("inf"))
+        time.sleep(0.2)
+
+    measured_fps, sent_fps = rx.fps(), tx.actual_fps
+    tx.stop()
+    rx.stop()
+
+    lat = statistics.median(latencies)
+    print(f"Giao thức {args.protocol}, {args.width} LED, mục tiêu {args.fps} fps")
+    print(f"  nhận được : {measured_fps:.0f} fps (gửi {sent_fps:.0f} fps, trễ lịch {tx.late} frame)")
+    print(f"  đổi ảnh → tới nơi: trung vị {lat:.1f} ms, tối đa {max(latencies):.1f} ms")
+
+    ok = lat <= args.budget and abs(measured_fps - args.fps) <= args.fps * 0.1
+    print("✅ Đạt" if ok else "❌ Không đạt")
+    return 0 if ok else 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mạch nhận UDP realtime giả")
+    ap.add_argument("--protocol", choices=sorted(PORTS), default="ddp")
+    ap.add_argument("--port", type=int, help="mặc định theo giao thức (DDP 4048, DRGB 21324)")
+    ap.add_argument("--selftest", action="store_true")
+    ap.add_argument("--fps", type=int, default=60)
+    ap.add_argument("--width", type=int, default=72)
+    ap.add_argument("--changes", type=int, default=10)
+    ap.add_argument("--budget", type=float, default=100.0)
+    args = ap.parse_args()
+
+    if args.selftest:
+        sys.exit(selftest(args))
+
+    rx = UdpReceiver(args.protocol, args.port, host="0.0.0.0").start()
+    print(f"Đang nghe {args.protocol.upper()} ở cổng {rx.address[1]} (Ctrl+C để dừng)")
+    try:
+        while True:
+            time.sleep(1)
+            with rx.lock:
+                last = rx.frames[-1][1] if rx.frames else b""
+            print(f"{rx.fps():5.0f} fps, frame {len(last) // 3} LED")
+    except KeyboardInterrupt:
+        rx.stop()
+
+
+if __name__ == "__main__":
+    main()
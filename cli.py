@@ -0,0 +1,234 @@
+"""
+Dòng lệnh (không giao diện) — KHÔNG import Qt, khởi động nhanh cho script / render farm.
+
+    python cli.py convert ảnh/ -o out/ -w 72
+    python cli.py send 192.168.1.50 ảnh/*.png -w 72
+"""
+import argparse
+import os
+import sys
+
+from image_utils import MAX_WIDTH, POI_MAX_BYTES
+
+# Đuôi file được lấy khi truyền vào một thư mục
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".tif", ".tiff")
+
+
+def collect_images(sources, recursive=False):
+    """Gom file ảnh từ danh sách file / thư mục, giữ thứ tự, bỏ trùng."""
+    files = []
+    for src in sources:
+        if os.path.isdir(src):
+            if recursive:
+                walk = (
+                    os.path.join(root, name)
+                    for root, _, names in sorted(os.walk(src))
+                    for name in sorted(names)
+                )
+            else:
+                walk = (os.path.join(src, name) for name in sorted(os.listdir(src)))
+            files.extend(f for f in walk if f.lower().endswith(IMAGE_EXTS) and os.path.isfile(f))
+        elif os.path.isfile(src):
+            files.append(src)
+        else:
+            print(f"⚠ Bỏ qua (không tồn tại): {src}", file=sys.stderr)
+
+    return list(dict.fromkeys(files))
+
+
+def _check_width(width):
+    # giống gợi ý trên giao diện: POI HSL dùng 15 → 72 mắt LED
+    if not 15 <= width <= MAX_WIDTH:
+        raise SystemExit(f"Chiều rộng phải trong khoảng 15–{MAX_WIDTH} px")
+
+
+# ====================
+# convert: ảnh → BMP 24-bit
+# ====================
+def cmd_convert(args):
+    from batch_convert import iter_convert
+
+    files = collect_images(args.sources, args.recursive)
+    if not files:
+        print("Không có ảnh nào để chuyển.", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    failed = 0
+    for done, (src, name, size, error) in enumerate(
+        iter_convert(files, args.out, args.width, workers=args.jobs), start=1
+    ):
+        if error:
+            failed += 1
+            print(f"[{done}/{len(files)}] ✗ {src}: {error}")
+        elif size >= POI_MAX_BYTES:
+            print(f"[{done}/{len(files)}] ⚠ {name} ({size} bytes) — quá lớn cho POI")
+        elif not args.quiet:
+            print(f"[{done}/{len(files)}] ✓ {name} ({size} bytes)")
+
+    print(f"Xong: {len(files) - failed}/{len(files)} ảnh → {args.out}")
+    return 1 if failed else 0
+
+
+# ====================
+# send: convert trong RAM + upload + lưu preset 1..N
+# ====================
+def cmd_send(args):
+    from device_client import get_client, close_all, DeviceOffline
+    from upload_pipeline import send_images
+
+    files = collect_images(args.sources, args.recursive)
+    if not files:
+        print("Không có ảnh nào để gửi.", file=sys.stderr)
+        return 1
+
+    client = get_client(args.ip)
+    try:
+        if not client.is_online():
+            raise DeviceOffline(f"Mạch {args.ip} không phản hồi")
+
+        files, args.width = _fit_flash(client, files, args)
+        if not files:
+            return 3
+
+        def on_item(idx, path):
+            if not args.quiet:
+                print(f"[{idx}/{len(files)}] 📤 {os.path.basename(path)}")
+
+        result = send_images(client, files, args.width, args.start, on_item, args.sync)
+    except Exception as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+    finally:
+        close_all()
+
+    if result["skipped"] and not args.quiet:
+        print(f"⏭ Bỏ qua {len(result['skipped'])} ảnh đã có trên mạch: {', '.join(result['skipped'])}")
+
+    for w in result["warnings"]:
+        print(f"⚠ Không lưu preset: {w}", file=sys.stderr)
+
+    if result["locked"] is not None:
+        # CLI không hỏi PIN → báo để mở khóa trên mạch rồi chạy lại với --start
+        print(
+            f"✗ Mạch yêu cầu mã PIN (dừng ở ảnh {result['locked']}). "
+            f"Mở khóa rồi chạy lại với --start {result['locked']}",
+            file=sys.stderr,
+        )
+        return 2
+
+    sent = len(files) - args.start + 1 - len(result["skipped"])
+    print(f"🎉 Đã gửi {sent} ảnh tới {args.ip}")
+    return 1 if result["warnings"] else 0
+
+
+# ====================
+# discover: tìm mạch ARGB HSL trong mạng (mDNS + danh sách đã lưu)
+# ====================
+def cmd_discover(args):
+    import time
+    from discovery import DiscoveryService
+
+    found = {}
+    service = DiscoveryService(on_found=lambda ip, name: found.setdefault(ip, name))
+    service.reconcile()
+    try:
+        service.start()
+    except ImportError:
+        print("⚠ Chưa cài zeroconf, chỉ kiểm tra danh sách mạch đã lưu", file=sys.stderr)
+
+    time.sleep(args.timeout)
+    service.stop()
+
+    for ip, name in sorted(found.items()):
+        print(f"{ip}\t{name}")
+    return 0 if found else 1
+
+
+def _fit_flash(client, files, args):
+    """Tính trước dung lượng; không đủ chỗ → xử lý theo --fit. Trả (files, width)."""
+    from device_client import PinRequired
+    from flash_planner import plan_batch, fit_width
+    from fs_cleanup import list_files
+    from upload_pipeline import make_preset_name
+
+    todo = files[args.start - 1:]
+    names = [
+        make_preset_name(path, f"Preset_{idx}") + ".bmp"
+        for idx, path in enumerate(todo, start=args.start)
+    ]
+    info = client.get_json("/json/info")
+    try:
+        existing = list_files(client)
+    except PinRequired:
+        existing = {}
+
+    plan = plan_batch(names, args.width, info, existing)
+    if plan.fits:
+        return files, args.width
+
+    print(
+        f"⚠ Cần ~{plan.need / 1024:.0f} KB, mạch còn trống {plan.free / 1024:.0f} KB",
+        file=sys.stderr,
+    )
+    if args.fit == "trim" and plan.fit_count():
+        count = plan.fit_count()
+        print(f"→ chỉ gửi {count} ảnh đầu", file=sys.stderr)
+        return files[:args.start - 1 + count], args.width
+    if args.fit == "rewidth":
+        best = fit_width(names, args.width, info, existing)
+        if best:
+            print(f"→ giảm width còn {best}px", file=sys.stderr)
+            return files, best
+
+    print("✗ Không gửi (bộ nhớ không đủ). Dùng --fit trim / rewidth hoặc xóa bớt ảnh.", file=sys.stderr)
+    return [], args.width
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Chuyển ảnh sang BMP POI và gửi lên mạch ARGB (không giao diện).",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("sources", nargs="+", help="file ảnh hoặc thư mục")
+        p.add_argument("-w", "--width", type=int, default=MAX_WIDTH, help=f"số mắt LED (mặc định {MAX_WIDTH})")
+        p.add_argument("-r", "--recursive", action="store_true", help="lấy cả thư mục con")
+        p.add_argument("-q", "--quiet", action="store_true", help="chỉ in lỗi / tổng kết")
+
+    p = sub.add_parser("convert", help="chuyển ảnh sang BMP 24-bit")
+    common(p)
+    p.add_argument("-o", "--out", required=True, help="thư mục lưu BMP")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="số process (mặc định = số CPU)")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("send", help="gửi ảnh lên mạch, lưu thành preset 1..N")
+    p.add_argument("ip", help="IP mạch ARGB")
+    common(p)
+    p.add_argument("--start", type=int, default=1, help="bắt đầu từ ảnh số (sau khi nhập PIN)")
+    p.add_argument("--sync", action="store_true", help="không upload lại ảnh đã có trên mạch")
+    p.add_argument("--fit", choices=("reject", "trim", "rewidth"), default="reject",
+                   help="khi bộ nhớ mạch không đủ: không gửi / cắt bớt ảnh / giảm width")
+    p.set_defaults(func=cmd_send)
+
+    p = sub.add_parser("discover", help="tìm mạch ARGB HSL trong mạng")
+    p.add_argument("-t", "--timeout", type=float, default=3.0, help="thời gian chờ (giây)")
+    p.set_defaults(func=cmd_discover)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if hasattr(args, "width"):
+        _check_width(args.width)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    # process pool spawn khi đóng gói .exe
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
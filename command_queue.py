@@ -0,0 +1,132 @@
+import threading
+import time
+
+# ====================
+# Gộp lệnh /json/state liên tục (kéo bánh xe màu, thanh độ sáng...) cho từng mạch:
+#   - mỗi mạch tối đa 1 request đang chạy, cách nhau ít nhất MIN_INTERVAL_MS
+#   - lệnh mới tới khi đang chờ → gộp vào patch đang chờ, giá trị mới đè giá trị cũ
+#   - lệnh đầu tiên sau lúc rảnh gửi ngay → cảm giác tức thì
+# ESP chỉ nhận giá trị mới nhất, không bị dồn hàng trăm request chồng nhau.
+# ====================
+
+MIN_INTERVAL_MS = 80
+
+
+def merge_patch(base, patch):
+    """
+    Gộp patch vào base (trả dict mới). Dict lồng nhau gộp đệ quy,
+    "seg" gộp theo id segment, giá trị khác → lấy của patch.
+    """
+    out = dict(base)
+    for key, value in patch.items():
+        if key == "seg" and isinstance(value, list) and isinstance(out.get(key), list):
+            out[key] = _merge_segments(out[key], value)
+        elif isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = merge_patch(out[key], value)
+        else:
+            out[key] = value
+    return out
+
+
+def _merge_segments(old, new):
+    segs = {seg.get("id", i): seg for i, seg in enumerate(old)}
+    for i, seg in enumerate(new):
+        sid = seg.get("id", i)
+        segs[sid] = merge_patch(segs.get(sid, {}), seg)
+    return list(segs.values())
+
+
+class _Lane:
+    """Hàng chờ của 1 mạch: patch đang chờ + thread gửi."""
+
+    def __init__(self):
+        self.pending = None
+        self.last_sent = 0.0
+        self.cond = threading.Condition()
+        self.thread = None
+
+
+class CommandCoalescer:
+    """
+    submit(ip, patch) không chặn; send(ip, patch) → Response chạy trên thread
+    riêng của từng mạch. on_result(ip, patch, response, error) sau mỗi lần gửi.
+    """
+
+    def __init__(self, send, interval_ms=MIN_INTERVAL_MS, on_result=None):
+        self.send = send
+        self.interval = interval_ms / 1000
+        self.on_result = on_result
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.submitted = 0      # số lệnh nhận vào
+        self.sent = 0           # số request thật sự gửi đi
+
+    def submit(self, ip, patch):
+        lane = self._lane(ip)
+        with lane.cond:
+            lane.pending = patch if lane.pending is None else merge_patch(lane.pending, patch)
+            lane.cond.notify()
+        # bộ đếm dùng chung mọi mạch (GUI đọc) → khóa chung, không phải khóa từng mạch
+        with self._lock:
+            self.submitted += 1
+
+    def _lane(self, ip):
+        with self._lock:
+            lane = self._lanes.get(ip)
+            if lane is None:
+                lane = self._lanes[ip] = _Lane()
+                lane.thread = threading.Thread(
+                    target=self._run, args=(ip, lane), name=f"cmd-{ip}", daemon=True
+                )
+                lane.thread.start()
+            return lane
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            lanes = list(self._lanes.values())
+        for lane in lanes:
+            with lane.cond:
+                lane.cond.notify()
+
+    def flush(self, timeout=2.0):
+        """Chờ mọi patch đang chờ được gửi (dùng trước khi thoát / khi test)."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            lanes = list(self._lanes.values())
+        for lane in lanes:
+            with lane.cond:
+                while lane.pending is not None and time.monotonic() < deadline:
+                    lane.cond.wait(0.01)
+
+    # ====================
+    # Thread gửi của 1 mạch
+    def _run(self, ip, lane):
+        while not self._stop.is_set():
+            with lane.cond:
+                while lane.pending is None and not self._stop.is_set():
+                    lane.cond.wait()
+                if self._stop.is_set():
+                    return
+
+                # chưa đủ khoảng cách → chờ, lệnh mới trong lúc chờ vẫn gộp vào pending
+                wait = lane.last_sent + self.interval - time.monotonic()
+                if wait > 0:
+                    lane.cond.wait(wait)
+                    continue
+
+                patch, lane.pending = lane.pending, None
+                lane.last_sent = time.monotonic()
+                lane.cond.notify_all()
+
+            response, error = None, None
+            try:
+                response = self.send(ip, patch)
+            except Exception as e:
+                error = e
+            with self._lock:
+                self.sent += 1
+            if self.on_result:
+                self.on_result(ip, patch, response, error)
@@ -16,7 +16,8 @@ APP_COMPANY = "Happy Smart Light"
 # - Sửa lỗi nhỏ giao diện nhìn rỏ hơn
 # ====================
 # Các gói cài đặt phụ thuộc:
-# pip install Pillow PySide6 requests zeroconf
+# pip install Pillow PySide6 requests zeroconf websocket-client
+# (websocket-client tùy chọn: nhận state mạch qua WebSocket, thiếu → đọc qua HTTP)
 # Build command:
 # cmd build app: pyinstaller --onefile --windowed  --icon assets/icon.ico   --add-data "assets;assets"  main.py
 
@@ -27,3 +28,11 @@ def resource_path(relative_path):
     except Exception:
         base_path = os.path.abspath(os.path.dirname(__file__))
     return os.path.join(base_path, relative_path)
+
+
+def data_path(filename):
+    # Thư mục lưu dữ liệu của app (cache đồng bộ, danh sách mạch...)
+    base = os.environ.get("APPDATA") or os.path.join(os.path.expanduser("~"), ".config")
+    folder = os.path.join(base, "POI-HSL")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, filename)
@@ -0,0 +1,300 @@
+import heapq
+import itertools
+import time
+import threading
+from contextlib import contextmanager
+
+# ====================
+# Timeout (connect, read) theo loại request — mọi nơi gọi mạch dùng chung
+# ====================
+TIMEOUTS = {
+    "probe": (1, 1),      # kiểm tra online / PIN
+    "poll": (1, 2),       # theo dõi nền /json/info (telemetry)
+    "state": (2, 2),      # POST /json/state
+    "bulk": (2, 2),       # xóa hàng loạt (preset / file), tự điều chỉnh tốc độ
+    "read": (2, 3),       # đọc /json, presets.json, /edit?list
+    "upload": (3, 10),    # upload BMP
+}
+
+# ESP chỉ chịu được vài socket cùng lúc
+POOL_SIZE = 4
+
+# Số request chạy cùng lúc tới 1 mạch, còn lại xếp hàng theo ưu tiên
+MAX_IN_FLIGHT = 2
+
+# Loại được chạy nhiều hơn MAX_IN_FLIGHT: xóa hàng loạt tự đo quá tải (preset_wipe)
+# nên được dùng hết pool socket; loại khác vẫn chỉ vào khi dưới MAX_IN_FLIGHT
+BULK_IN_FLIGHT = POOL_SIZE
+KIND_IN_FLIGHT = {"bulk": BULK_IN_FLIGHT}
+
+# Ưu tiên (nhỏ = trước): lệnh người dùng > làm mới panel / xóa hàng loạt > theo dõi nền / dò mạch
+PRIORITY = {
+    "state": 0,
+    "upload": 0,
+    "read": 1,
+    "bulk": 1,
+    "poll": 2,
+    "probe": 2,
+}
+
+
+class DeviceOffline(Exception):
+    """Mạch không phản hồi khi kiểm tra online."""
+
+
+class UploadError(Exception):
+    """Upload BMP không thành công."""
+
+
+class PinRequired(Exception):
+    """Mạch đang khóa PIN (HTTP 401), cần mở khóa trước."""
+
+
+class LatencyStats:
+    """Bộ đếm độ trễ cho 1 loại request."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def record(self, elapsed, ok=True):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total += elapsed
+        self.last = elapsed
+        self.min = elapsed if self.min is None else min(self.min, elapsed)
+        self.max = elapsed if self.max is None else max(self.max, elapsed)
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class RequestGate:
+    """
+    Hàng chờ request của 1 mạch: tối đa limit request chạy cùng lúc,
+    chỗ trống dành cho request ưu tiên cao nhất (cùng mức → ai tới trước).
+    Ghi lại thời gian chờ từng loại + độ sâu hàng chờ.
+    """
+
+    def __init__(self, limit=MAX_IN_FLIGHT):
+        self.limit = limit
+        self.in_flight = 0
+        self.max_depth = 0
+        self.waits = {}   # kind -> LatencyStats (thời gian chờ)
+        self._queue = []  # heap (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def acquire(self, kind):
+        ticket = (PRIORITY.get(kind, 1), next(self._seq))
+        start = time.perf_counter()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            limit = max(self.limit, KIND_IN_FLIGHT.get(kind, 0))
+            while self.in_flight >= limit or self._queue[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._queue)
+            self.in_flight += 1
+
+            waited = time.perf_counter() - start
+            stats = self.waits.get(kind)
+            if stats is None:
+                stats = self.waits[kind] = LatencyStats()
+            stats.record(waited)
+            # còn chỗ → người kế tiếp trong hàng vào luôn
+            self._cond.notify_all()
+        return waited
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def summary(self):
+        with self._cond:
+            return {
+                kind: (s.count, s.avg * 1000, s.max * 1000)
+                for kind, s in self.waits.items()
+            }
+
+
+class DeviceClient:
+    """Kết nối keep-alive tới 1 mạch ARGB, mọi request tới mạch đi qua đây."""
+
+    def __init__(self, ip, pool_size=POOL_SIZE, retries=1, max_in_flight=MAX_IN_FLIGHT):
+        # requests nạp ở client đầu tiên, không làm chậm lúc mở app
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.ip = ip
+        self.base_url = f"http://{ip}"
+
+        # Chỉ retry lỗi kết nối (request chưa tới mạch) → an toàn cả với POST
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=0.2,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+            pool_block=True,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+
+        self.stats = {}   # kind -> LatencyStats
+        self.gate = RequestGate(max_in_flight)
+        self._held = threading.local()   # thread đang giữ chỗ (reserve) → không xếp hàng lại
+        self._lock = threading.Lock()
+        self._state_listeners = []   # fn(state hoặc None) sau mỗi lệnh ghi state
+
+    # ====================
+    # Request chung: xếp hàng theo ưu tiên, timeout theo kind + đo độ trễ
+    # r.wire_time = thời gian trên mạng (s), r.queue_time = thời gian chờ trong hàng
+    # → nơi tự đo độ trễ mạch dùng r.wire_time, không tính lúc xếp hàng
+    def request(self, method, path, kind="read", **kwargs):
+        kwargs.setdefault("timeout", TIMEOUTS[kind])
+        held = getattr(self._held, "slot", False)
+        queue_time = 0.0 if held else self.gate.acquire(kind)
+        start = time.perf_counter()
+        try:
+            r = self.session.request(method, self.base_url + path, **kwargs)
+        except Exception:
+            self._record(kind, time.perf_counter() - start, ok=False)
+            raise
+        finally:
+            if not held:
+                self.gate.release()
+
+        r.wire_time = time.perf_counter() - start
+        r.queue_time = queue_time
+        self._record(kind, r.wire_time, ok=r.status_code < 400)
+        return r
+
+    @contextmanager
+    def reserve(self, kind="state"):
+        """
+        Giữ trước 1 chỗ trong hàng chờ: request của thread này trong khối
+        with chạy ngay, không xếp hàng (đo trễ / bắn lệnh đồng bộ đúng giờ).
+        """
+        if getattr(self._held, "slot", False):
+            yield
+            return
+        self.gate.acquire(kind)
+        self._held.slot = True
+        try:
+            yield
+        finally:
+            self._held.slot = False
+            self.gate.release()
+
+    def _record(self, kind, elapsed, ok):
+        with self._lock:
+            stats = self.stats.get(kind)
+            if stats is None:
+                stats = self.stats[kind] = LatencyStats()
+            stats.record(elapsed, ok)
+
+    def get(self, path, kind="read", **kwargs):
+        return self.request("GET", path, kind, **kwargs)
+
+    def post(self, path, kind="state", **kwargs):
+        return self.request("POST", path, kind, **kwargs)
+
+    # ====================
+    # Tiện ích cho các endpoint hay dùng
+    def get_json(self, path, kind="read"):
+        r = self.get(path, kind)
+        r.raise_for_status()
+        return r.json()
+
+    def post_state(self, payload, kind="state", verbose=True):
+        """
+        POST /json/state. verbose → kèm "v": true để mạch trả luôn state sau
+        khi áp dụng (khỏi GET lại), state gắn vào r.state (None nếu không có).
+        """
+        if verbose and "v" not in payload:
+            payload = dict(payload, v=True)
+        r = self.post("/json/state", kind, json=payload)
+        self.accept_state(r)
+        return r
+
+    def accept_state(self, r):
+        # đọc state trong response của lệnh ghi rồi báo cho snapshot
+        r.state = None
+        if r.status_code == 200:
+            try:
+                data = r.json()
+            except ValueError:
+                data = None
+            # firmware cũ / không có "v" chỉ trả {"success": true}
+            if isinstance(data, dict) and ("seg" in data or "on" in data):
+                r.state = data
+
+        if r.status_code < 400:
+            for fn in list(self._state_listeners):
+                fn(r.state)
+        return r.state
+
+    def add_state_listener(self, fn):
+        self._state_listeners.append(fn)
+
+    def upload(self, filename, data, kind="upload"):
+        # data: bytes BMP (hoặc file object)
+        files = {"data": (filename, data, "image/bmp")}
+        return self.post("/upload", kind, files=files)
+
+    def is_online(self):
+        try:
+            return self.get("/json/info", "probe").status_code == 200
+        except Exception:
+            return False
+
+    def latency_summary(self):
+        with self._lock:
+            return {
+                kind: (s.count, s.errors, s.avg * 1000, s.max * 1000)
+                for kind, s in self.stats.items()
+            }
+
+    def close(self):
+        self.session.close()
+
+
+# ====================
+# 1 client cho mỗi IP
+# ====================
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(ip):
+    with _clients_lock:
+        client = _clients.get(ip)
+        if client is None:
+            client = _clients[ip] = DeviceClient(ip)
+        return client
+
+
+def close_all():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
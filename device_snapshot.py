@@ -0,0 +1,133 @@
+import time
+
+from state_diff import diff_state
+
+# ====================
+# Các phần dữ liệu trong /json và endpoint riêng tương ứng
+# ====================
+SECTIONS = {
+    "info": "/json/info",
+    "state": "/json/state",
+    "effects": "/json/eff",
+    "palettes": "/json/pal",
+}
+
+# Thời gian sống (giây) của từng phần trong snapshot
+# effect / palette gần như không đổi → giữ lâu
+DEFAULT_TTL = {
+    "info": 5,
+    "state": 2,
+    "effects": 300,
+    "palettes": 300,
+}
+
+
+class DeviceSnapshot:
+    """Bản chụp dữ liệu /json của 1 mạch, dùng chung cho mọi panel."""
+
+    def __init__(self, client, ttl=None):
+        self.client = client
+        self.ttl = dict(DEFAULT_TTL)
+        if ttl:
+            self.ttl.update(ttl)
+
+        self._data = {}
+        self._stamp = {}
+        self.live = set()   # phần đang được mạch đẩy về (WebSocket) → không hết hạn
+
+        # mọi lệnh ghi state qua client → cập nhật luôn từ response
+        client.add_state_listener(self._on_state_written)
+
+    # ====================
+    # Kiểm tra phần nào đã hết hạn
+    def stale_sections(self, sections=None):
+        now = time.monotonic()
+        stale = []
+        for s in sections or SECTIONS:
+            stamp = self._stamp.get(s)
+            if stamp is None or (s not in self.live and now - stamp > self.ttl[s]):
+                stale.append(s)
+        return stale
+
+    # ====================
+    # Lấy dữ liệu (chỉ gọi mạch khi có phần hết hạn)
+    def get(self, *sections):
+        sections = sections or tuple(SECTIONS)
+        stale = self.stale_sections(sections)
+        if stale:
+            self.fetch(stale)
+        return {s: self._data.get(s) for s in sections}
+
+    def fetch(self, sections, kind="read"):
+        # ≥ 2 phần cũ → 1 lần GET /json lấy tất cả
+        # chỉ 1 phần cũ → dùng endpoint riêng, payload nhỏ hơn nhiều
+        if len(sections) > 1:
+            self.update_from_json(self.client.get_json("/json", kind))
+            return
+
+        section = sections[0]
+        self._store(section, self.client.get_json(SECTIONS[section], kind))
+
+    def update_from_json(self, data):
+        if not isinstance(data, dict):
+            return
+        for s in SECTIONS:
+            if s in data:
+                self._store(s, data[s])
+
+    def _on_state_written(self, state):
+        if state is None:
+            self.invalidate("state")   # mạch không trả state → lần đọc tới lấy lại
+        else:
+            self._store("state", state)
+
+    def _store(self, section, value):
+        self._data[section] = value
+        self._stamp[section] = time.monotonic()
+
+    # ====================
+    # Gọi sau mỗi lệnh ghi để lần đọc tới lấy lại dữ liệu mới
+    # (phần live bỏ qua: mạch sẽ tự đẩy state mới về)
+    def invalidate(self, *sections):
+        for s in sections or SECTIONS:
+            if s not in self.live:
+                self._stamp.pop(s, None)
+
+    def set_live(self, section, on=True):
+        if on:
+            self.live.add(section)
+        else:
+            self.live.discard(section)
+
+    # ====================
+    # Lệnh ghi state: chỉ gửi phần khác với state mạch đã xác nhận
+    # (state chưa có / hết hạn → gửi nguyên payload, không đoán)
+    def patch_for(self, payload):
+        if self.stale_sections(["state"]):
+            return payload
+        return diff_state(self._data.get("state"), payload)
+
+    def post_state(self, payload):
+        """POST phần khác biệt; None nếu mạch đã đúng state (không gửi gì)."""
+        patch = self.patch_for(payload)
+        if not patch:
+            return None
+        return self.client.post_state(patch)
+
+    # ====================
+    # Truy cập nhanh
+    @property
+    def info(self):
+        return self.get("info")["info"] or {}
+
+    @property
+    def state(self):
+        return self.get("state")["state"] or {}
+
+    @property
+    def effects(self):
+        return self.get("effects")["effects"] or []
+
+    @property
+    def palettes(self):
+        return self.get("palettes")["palettes"] or []
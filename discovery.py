@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import data_path
+from device_client import get_client
+
+# ====================
+# Tìm mạch ARGB HSL qua mDNS, chạy nền suốt phiên làm việc
+#   - callback zeroconf chỉ đẩy việc sang pool (không gọi HTTP trong callback)
+#   - mạch hợp lệ khi /json/info có repo == "HappySmartLight"
+#   - danh sách mạch lưu ra file → mở app là có sẵn, sau đó kiểm tra lại
+# ====================
+
+SERVICE_TYPE = "_wled._tcp.local."
+HSL_REPO = "HappySmartLight"
+CACHE_FILE = "known_devices.json"
+RESOLVE_TIMEOUT_MS = 3000
+VALIDATE_WORKERS = 4
+FORGET_AFTER = 30 * 24 * 3600   # mạch không thấy 30 ngày → bỏ khỏi danh sách lưu
+
+
+def is_hsl_device(info):
+    return bool(info.get("name")) and info.get("repo") == HSL_REPO
+
+
+class KnownDevices:
+    """{ip: {"name", "mac", "seen"}} lưu ở known_devices.json."""
+
+    def __init__(self, path=None):
+        self.path = path or data_path(CACHE_FILE)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.devices = json.load(f)
+        except (OSError, ValueError):
+            self.devices = {}
+
+        cutoff = time.time() - FORGET_AFTER
+        self.devices = {ip: d for ip, d in self.devices.items() if d.get("seen", 0) >= cutoff}
+
+    def items(self):
+        # mới thấy gần nhất lên đầu
+        with self._lock:
+            return sorted(self.devices.items(), key=lambda kv: -kv[1].get("seen", 0))
+
+    def remember(self, ip, info):
+        with self._lock:
+            # mạch đổi IP (DHCP) → bỏ IP cũ cùng MAC
+            mac = info.get("mac")
+            if mac:
+                for old_ip in [k for k, v in self.devices.items() if v.get("mac") == mac and k != ip]:
+                    del self.devices[old_ip]
+            self.devices[ip] = {"name": info.get("name", "ARGB"), "mac": mac, "seen": time.time()}
+            self._save()
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.devices, f)
+        os.replace(tmp, self.path)
+
+
+def validate(ip):
+    """Trả /json/info nếu là mạch HSL đang online, ngược lại None."""
+    try:
+        info = get_client(ip).get_json("/json/info", "probe")
+    except Exception:
+        return None
+    return info if is_hsl_device(info) else None
+
+
+class DiscoveryService:
+    """
+    on_found(ip, name) / on_lost(ip) gọi từ thread nền — GUI tự chuyển về
+    thread chính (xem workers.DeviceSignals).
+    """
+
+    def __init__(self, on_found, on_lost=None, known=None):
+        self.on_found = on_found
+        self.on_lost = on_lost or (lambda ip: None)
+        self.known = known or KnownDevices()
+        self._pool = ThreadPoolExecutor(max_workers=VALIDATE_WORKERS)
+        self._zc = None
+        self._browser = None
+        self._services = {}     # tên service mDNS -> ip
+        self._checking = set()  # ip đang kiểm tra
+        self._lock = threading.Lock()
+
+    # ====================
+    # Vòng đời
+    def start(self):
+        # ImportError nếu chưa cài zeroconf → nơi gọi báo người dùng
+        from zeroconf import Zeroconf, ServiceBrowser
+
+        self.stop_browser()
+        self._zc = Zeroconf()
+        self._browser = ServiceBrowser(self._zc, SERVICE_TYPE, handlers=[self._on_change])
+
+    def reconcile(self):
+        # kiểm tra lại các mạch đã lưu (còn → on_found, không phản hồi → on_lost)
+        for ip, _ in self.known.items():
+            self.check(ip)
+
+    def rescan(self):
+        self.reconcile()
+        self.start()
+
+    def stop_browser(self):
+        if self._zc is not None:
+            self._zc.close()
+        self._zc = None
+        self._browser = None
+        with self._lock:
+            self._services.clear()
+
+    def stop(self):
+        self.stop_browser()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ====================
+    # Callback zeroconf: không chặn, chỉ đẩy sang pool
+    def _on_change(self, zeroconf, service_type, name, state_change):
+        from zeroconf import ServiceStateChange
+
+        if state_change is ServiceStateChange.Removed:
+            with self._lock:
+                ip = self._services.pop(name, None)
+            if ip:
+                # mDNS báo rời mạng → kiểm tra lại bằng HTTP rồi mới bỏ
+                self.check(ip)
+            return
+
+        self._submit(self._resolve, zeroconf, service_type, name)
+
+    def _resolve(self, zeroconf, service_type, name):
+        info = zeroconf.get_service_info(service_type, name, timeout=RESOLVE_TIMEOUT_MS)
+        if not info:
+            return
+
+        ipv4 = [a for a in info.parsed_addresses() if ":" not in a]
+        if not ipv4:
+            return
+
+        ip = ipv4[0]
+        if info.port and info.port != 80:
+            ip = f"{ip}:{info.port}"
+        with self._lock:
+            self._services[name] = ip
+        self._validate(ip)
+
+    def check(self, ip):
+        self._submit(self._validate, ip)
+
+    def _validate(self, ip):
+        with self._lock:
+            if ip in self._checking:
+                return
+            self._checking.add(ip)
+        try:
+            info = validate(ip)
+        finally:
+            with self._lock:
+                self._checking.discard(ip)
+
+        if info:
+            self.known.remember(ip, info)
+            self.on_found(ip, info.get("name", "ARGB"))
+        else:
+            self.on_lost(ip)
+
+    def _submit(self, fn, *args):
+        try:
+            self._pool.submit(fn, *args)
+        except RuntimeError:
+            pass   # đã stop
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import data_path
+from device_client import get_client, UploadError, PinRequired
+
+# ====================
+# Gửi cùng 1 lệnh tới cả nhóm mạch cùng lúc
+# Mỗi mạch có DeviceClient riêng → tổng thời gian ≈ mạch chậm nhất
+# ====================
+
+GROUP_FILE = "device_group.json"
+MAX_DEVICES = 32
+
+
+class DeviceResult:
+    """Kết quả 1 mạch trong lượt fan-out."""
+
+    def __init__(self, ip, value=None, error=None, elapsed=0.0):
+        self.ip = ip
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def describe(self):
+        if self.ok:
+            return f"✓ {self.ip} ({self.elapsed * 1000:.0f} ms)"
+        if isinstance(self.error, PinRequired):
+            return f"🔒 {self.ip}: bị khóa PIN"
+        return f"✗ {self.ip}: {self.error}"
+
+
+def fan_out(ips, fn, on_result=None):
+    """
+    Chạy fn(ip) song song cho mọi ip, trả {ip: DeviceResult} theo thứ tự ips.
+    on_result(DeviceResult) gọi ngay khi từng mạch xong.
+    """
+    results = {}
+    if not ips:
+        return results
+
+    def run(ip):
+        start = time.perf_counter()
+        try:
+            value = fn(ip)
+            return DeviceResult(ip, value=value, elapsed=time.perf_counter() - start)
+        except Exception as e:
+            return DeviceResult(ip, error=e, elapsed=time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=min(len(ips), MAX_DEVICES)) as pool:
+        for fut in as_completed([pool.submit(run, ip) for ip in ips]):
+            res = fut.result()
+            results[res.ip] = res
+            if on_result:
+                on_result(res)
+
+    return {ip: results[ip] for ip in ips}
+
+
+def summary(results):
+    ok = sum(1 for r in results.values() if r.ok)
+    slowest = max((r.elapsed for r in results.values()), default=0.0)
+    return ok, len(results), slowest
+
+
+# ====================
+# Lệnh hay dùng
+# ====================
+def check_status(r):
+    """Response 200 → trả lại, 401 → PinRequired, khác → UploadError."""
+    if r.status_code == 401:
+        raise PinRequired()
+    if r.status_code != 200:
+        raise UploadError(f"HTTP {r.status_code}")
+    return r
+
+
+def post_state_all(ips, payload, on_result=None, prepare=None):
+    """
+    Hiệu ứng / màu / palette / preset / bật tắt — cùng 1 payload cho cả nhóm.
+    prepare(ip, payload) → payload riêng từng mạch (vd chỉ phần khác state);
+    rỗng → bỏ qua mạch đó, giá trị None.
+    """
+    def send(ip):
+        body = prepare(ip, payload) if prepare else payload
+        if not body:
+            return None
+        return check_status(get_client(ip).post_state(body))
+
+    return fan_out(ips, send, on_result)
+
+
+def send_image_all(ips, upload_filename, bmp_data, payload, width=None, sync=False, on_result=None):
+    """
+    Upload cùng 1 BMP + lưu preset trên từng mạch. Giá trị: True nếu đã upload.
+    Có width → kiểm tra bộ nhớ trống từng mạch trước khi upload.
+    """
+    from file_sync import DeviceSync, SyncCache
+    from flash_planner import plan_batch
+
+    cache = SyncCache() if sync else None   # 1 cache dùng chung, tránh ghi đè lẫn nhau
+
+    def send(ip):
+        client = get_client(ip)
+        state = DeviceSync(client, cache=cache) if sync else None
+        uploaded = False
+
+        if not (state and state.is_current(upload_filename, bmp_data)):
+            if width:
+                info = client.get_json("/json/info")
+                plan = plan_batch([upload_filename], width, info, state.remote if state else {})
+                if not plan.fits:
+                    raise UploadError(f"bộ nhớ không đủ (cần ~{plan.need / 1024:.0f} KB, còn {plan.free / 1024:.0f} KB)")
+            check_status(client.upload(upload_filename, bmp_data))
+            uploaded = True
+            if state:
+                state.uploaded(upload_filename, bmp_data)
+                state.save()
+
+        check_status(client.post_state(payload, "upload"))
+        return uploaded
+
+    return fan_out(ips, send, on_result)
+
+
+# ====================
+# Nhóm mạch (lưu giữa các lần mở app)
+# ====================
+def load_group():
+    try:
+        with open(data_path(GROUP_FILE), encoding="utf-8") as f:
+            return list(json.load(f).get("ips", []))
+    except (OSError, ValueError):
+        return []
+
+
+def save_group(ips):
+    path = data_path(GROUP_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"ips": list(ips)}, f)
+    os.replace(tmp, path)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+
+from config import data_path
+from fs_cleanup import list_files
+
+# ====================
+# Đồng bộ file lên mạch: chỉ upload BMP mới / thay đổi
+#   - đọc /edit?list 1 lần → tên + dung lượng trên mạch
+#   - hash nội dung đã upload lưu lại theo từng mạch (sync_cache.json)
+#   - trùng tên + dung lượng + hash → bỏ qua
+# ====================
+
+CACHE_FILE = "sync_cache.json"
+
+
+def content_hash(data: bytes):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SyncCache:
+    """{mạch: {"/tên.bmp": {"size": n, "hash": h}}} lưu ra file JSON."""
+
+    def __init__(self, path=None):
+        self.path = path or data_path(CACHE_FILE)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.devices = json.load(f)
+        except (OSError, ValueError):
+            self.devices = {}
+
+    def get(self, device, name):
+        with self._lock:
+            return self.devices.get(device, {}).get(name)
+
+    def put(self, device, name, size, digest):
+        with self._lock:
+            self.devices.setdefault(device, {})[name] = {"size": size, "hash": digest}
+
+    def forget_missing(self, device, remote_names):
+        # file đã bị xóa trên mạch → bỏ khỏi cache
+        with self._lock:
+            files = self.devices.get(device, {})
+            for name in list(files):
+                if name not in remote_names:
+                    del files[name]
+
+    def save(self):
+        with self._lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.devices, f)
+            os.replace(tmp, self.path)
+
+
+class DeviceSync:
+    """
+    Trạng thái file của 1 mạch cho 1 lượt gửi.
+    Mạch khóa PIN → list_files raise PinRequired.
+    """
+
+    def __init__(self, client, device=None, cache=None):
+        self.device = device or client.ip
+        self.cache = cache or SyncCache()
+        self.remote = list_files(client)
+        self.cache.forget_missing(self.device, self.remote)
+
+        # preset đang có (để khỏi lưu lại preset giống hệt)
+        try:
+            self.presets = client.get_json("/presets.json")
+        except Exception:
+            self.presets = {}
+
+        self.skipped = []
+
+    def is_current(self, filename, data):
+        name = "/" + filename.lstrip("/")
+        size = self.remote.get(name)
+        if size != len(data):
+            return False
+
+        known = self.cache.get(self.device, name)
+        return bool(known) and known["size"] == size and known["hash"] == content_hash(data)
+
+    def preset_current(self, preset_id, payload):
+        # preset cùng số, cùng tên, cùng file ảnh → không cần psave lại
+        old = self.presets.get(str(preset_id))
+        if not isinstance(old, dict) or old.get("n") != payload.get("n"):
+            return False
+        segs = old.get("seg") or []
+        if isinstance(segs, dict):
+            segs = [segs]
+        want = payload["seg"][0]
+        return any(
+            isinstance(s, dict) and s.get("n") == want["n"] and s.get("fx") == want["fx"]
+            for s in segs
+        )
+
+    def uploaded(self, filename, data):
+        name = "/" + filename.lstrip("/")
+        self.remote[name] = len(data)
+        self.cache.put(self.device, name, len(data), content_hash(data))
+
+    def save(self):
+        self.cache.save()
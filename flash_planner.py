@@ -0,0 +1,89 @@
+from image_utils import MAX_WIDTH, POI_MAX_BYTES
+
+# ====================
+# Tính trước dung lượng BMP + so với bộ nhớ trống của mạch TRƯỚC khi gửi
+# (upload dở dang vì đầy flash làm preset / file trên mạch lộn xộn)
+# ====================
+
+BMP_HEADER = 54          # 14 byte file header + 40 byte DIB header
+FS_BLOCK = 4096          # LittleFS trên ESP cấp phát theo block 4 KB
+RESERVE = 16 * 1024      # chừa chỗ cho presets.json / cfg.json ghi lại
+PRESET_BYTES = 256       # mỗi preset thêm vào presets.json khoảng chừng này
+MIN_WIDTH = 15
+
+
+def bmp_size(width, height=None):
+    """Dung lượng chính xác của BMP 24-bit (mỗi dòng đệm lên bội số 4 byte)."""
+    height = width if height is None else height
+    row = (width * 3 + 3) // 4 * 4
+    return BMP_HEADER + row * height
+
+
+def flash_cost(nbytes):
+    # dung lượng thật chiếm trên flash (làm tròn lên block)
+    return -(-nbytes // FS_BLOCK) * FS_BLOCK
+
+
+def free_bytes(info):
+    """Bộ nhớ còn trống từ /json/info (fs.u, fs.t tính bằng KB), None nếu không rõ."""
+    fs = (info or {}).get("fs") or {}
+    used, total = fs.get("u"), fs.get("t")
+    if used is None or not total:
+        return None
+    return max(0, (total - used) * 1024)
+
+
+class BatchPlan:
+    """Kết quả lên kế hoạch 1 lượt gửi."""
+
+    def __init__(self, names, width, free, existing):
+        self.names = names
+        self.width = width
+        self.free = free
+        self.file_size = bmp_size(width)
+
+        # file trùng tên sẽ bị ghi đè → chỗ cũ được trả lại
+        self.costs = [
+            flash_cost(self.file_size) + PRESET_BYTES - flash_cost(existing.get(n, 0))
+            for n in names
+        ]
+        self.need = sum(self.costs) + RESERVE
+
+    @property
+    def known(self):
+        return self.free is not None
+
+    @property
+    def fits(self):
+        return not self.known or self.need <= self.free
+
+    @property
+    def too_big_for_poi(self):
+        return self.file_size >= POI_MAX_BYTES
+
+    def fit_count(self):
+        """Số ảnh đầu tiên vừa bộ nhớ ở width hiện tại."""
+        if not self.known:
+            return len(self.names)
+        room = self.free - RESERVE
+        count = 0
+        for cost in self.costs:
+            if cost > room:
+                break
+            room -= cost
+            count += 1
+        return count
+
+
+def plan_batch(names, width, info, existing=None):
+    """names: tên file sẽ upload; existing: {"/tên": dung lượng} đang có trên mạch."""
+    existing = {k.lstrip("/"): v for k, v in (existing or {}).items()}
+    return BatchPlan([n.lstrip("/") for n in names], width, free_bytes(info), existing)
+
+
+def fit_width(names, width, info, existing=None, min_width=MIN_WIDTH):
+    """Width lớn nhất (≤ width) để gửi đủ cả lượt, None nếu nhỏ nhất vẫn không vừa."""
+    for w in range(min(width, MAX_WIDTH), min_width - 1, -1):
+        if plan_batch(names, w, info, existing).fits:
+            return w
+    return None
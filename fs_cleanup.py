@@ -0,0 +1,98 @@
+import fnmatch
+
+from device_client import PinRequired
+from preset_wipe import run_adaptive
+
+# ====================
+# Dọn bộ nhớ mạch: lên kế hoạch từ 1 lần đọc /edit?list (+ presets.json),
+# xóa song song có giới hạn, cuối cùng đọc lại danh sách 1 lần để kiểm tra
+# ====================
+
+# File hệ thống không bao giờ xóa, dù khớp mẫu nào
+PROTECTED = ("/cfg.json", "/presets.json", "/wsec.json")
+
+
+def _norm(name):
+    return name if name.startswith("/") else "/" + name
+
+
+def list_files(client):
+    """Đọc /edit?list → {"/tên": dung lượng}."""
+    r = client.get("/edit?list")
+    if r.status_code == 401:
+        raise PinRequired()
+    r.raise_for_status()
+
+    files = {}
+    for f in r.json():
+        if isinstance(f, dict) and "name" in f and f.get("type", "file") == "file":
+            files[_norm(f["name"])] = f.get("size", 0)
+    return files
+
+
+def referenced_files(presets):
+    """Mọi tên file nhắc tới trong presets.json (vd seg.n = "/abc.bmp")."""
+    names = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+        elif isinstance(node, str) and "." in node:
+            names.add(_norm(node).lower())
+
+    walk(presets)
+    return names
+
+
+def select_files(files, patterns=("*.bmp",), unreferenced_only=False, presets=None):
+    """
+    Chọn file cần xóa theo mẫu glob (không phân biệt hoa thường).
+    unreferenced_only → bỏ qua file đang được preset nào dùng.
+    """
+    used = referenced_files(presets or {}) if unreferenced_only else set()
+    patterns = [_norm(p).lower() for p in patterns]
+
+    selected = []
+    for name in sorted(files):
+        low = name.lower()
+        if name in PROTECTED or low in used:
+            continue
+        if any(fnmatch.fnmatchcase(low, p) for p in patterns):
+            selected.append(name)
+    return selected
+
+
+def plan_cleanup(client, patterns=("*.bmp",), unreferenced_only=False):
+    """1 lần đọc danh sách (+ presets.json nếu cần) → {"/tên": dung lượng} cần xóa."""
+    files = list_files(client)
+
+    presets = None
+    if unreferenced_only:
+        presets = client.get_json("/presets.json")
+
+    return {
+        name: files[name]
+        for name in select_files(files, patterns, unreferenced_only, presets)
+    }
+
+
+def delete_files(client, names, on_progress=None, cancelled=None):
+    """
+    Xóa song song (giới hạn tự điều chỉnh như xóa preset), rồi đọc lại
+    danh sách 1 lần. Trả các file vẫn còn trên mạch.
+    """
+    run_adaptive(
+        lambda name: client.get("/edit", "bulk", params={"func": "delete", "path": name}),
+        names,
+        on_progress=on_progress,
+        cancelled=cancelled,
+        retry_rounds=1,
+    )
+
+    # kết quả thật lấy từ danh sách cuối, không tin từng response
+    remaining = list_files(client)
+    return [name for name in names if name in remaining]
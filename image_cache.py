@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+from image_utils import convert_to_square_rgb, open_for_width
+
+# ====================
+# Cache kết quả convert (crop + resize + RGB), khóa theo nội dung ảnh gốc
+# ====================
+
+DEFAULT_BUDGET = 32 * 1024 * 1024   # 32 MB ảnh đã convert
+
+
+def file_key(path, chunk=1024 * 1024):
+    # Băm nội dung file → 2 file trùng nội dung (khác tên) dùng chung kết quả
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return "f:" + h.hexdigest()
+
+
+def image_key(img: Image.Image):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.mode}{img.size}".encode())
+    h.update(img.tobytes())
+    return "i:" + h.hexdigest()
+
+
+def _image_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+class ConversionCache:
+    """LRU theo (ảnh gốc, width, bộ lọc resize), giới hạn tổng dung lượng."""
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()   # key -> Image
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            img = self._items.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        size = _image_bytes(img)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= _image_bytes(old)
+
+            self._items[key] = img
+            self._bytes += size
+
+            # bỏ bớt ảnh lâu không dùng cho tới khi vừa budget
+            while self._bytes > self.max_bytes:
+                _, dropped = self._items.popitem(last=False)
+                self._bytes -= _image_bytes(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    # ====================
+    # Convert có cache
+    def convert_image(self, source_key, width, img, resample=Image.LANCZOS):
+        key = (source_key, width, resample)
+        out = self.get(key)
+        if out is None:
+            out = convert_to_square_rgb(width, img, resample)
+            self.put(key, out)
+        return out
+
+    def convert_file(self, path, width, resample=Image.LANCZOS):
+        key = (file_key(path), width, resample)
+        out = self.get(key)
+        if out is None:
+            with open_for_width(path) as im:
+                out = convert_to_square_rgb(width, im, resample)
+            self.put(key, out)
+        return out
+
+
+# Cache dùng chung cho preview / lưu / gửi
+shared_cache = ConversionCache()
@@ -1,5 +1,15 @@
+import io
 from PIL import Image
 
+# Thanh POI tối đa 72 pixel
+MAX_WIDTH = 72
+# BMP lớn hơn mức này mạch POI không đọc được
+POI_MAX_BYTES = 63 * 1024
+# Trước bộ lọc LANCZOS chỉ cần ảnh lớn cỡ 4× kích thước đích
+PRESHRINK = 4
+# Mode không hỗ trợ Image.reduce → giữ đường resize cũ
+NO_REDUCE_MODES = ("1", "P", "I;16")
+
 def center_crop_square(im: Image.Image) -> Image.Image:
     w, h = im.size
     if w == h: return im
@@ -9,7 +19,30 @@ def center_crop_square(im: Image.Image) -> Image.Image:
     top = (h-w)//2
     return im.crop((0,top,w,top+w))
 
-def convert_to_square_rgb(width: int, img: Image.Image):
+def draft_for_width(im: Image.Image, width: int = MAX_WIDTH) -> Image.Image:
+    # JPEG: yêu cầu decoder giải mã ở tỉ lệ 1/2, 1/4, 1/8 nếu vẫn đủ lớn
+    # (định dạng khác draft không làm gì)
+    im.draft(None, (width*PRESHRINK, width*PRESHRINK))
+    return im
+
+def open_for_width(path, width: int = MAX_WIDTH) -> Image.Image:
+    return draft_for_width(Image.open(path), width)
+
+def pre_shrink(im: Image.Image, width: int) -> Image.Image:
+    # Thu nhỏ nhanh (trung bình khối) về cỡ vài lần width trước LANCZOS
+    factor = min(im.size) // (width*PRESHRINK)
+    if factor < 2 or im.mode in NO_REDUCE_MODES:
+        return im
+    return im.reduce(factor)
+
+def convert_to_square_rgb(width: int, img: Image.Image, resample=Image.LANCZOS):
     im_sq = center_crop_square(img)
-    im_sq = im_sq.resize((width,width), Image.LANCZOS)
+    im_sq = pre_shrink(im_sq, width)
+    im_sq = im_sq.resize((width,width), resample)
     return im_sq.convert("RGB")
+
+def encode_bmp(img: Image.Image) -> bytes:
+    # Mã hóa BMP 24-bit ngay trong RAM (không ghi file tạm)
+    buf = io.BytesIO()
+    img.save(buf, "BMP")
+    return buf.getvalue()
@@ -0,0 +1,180 @@
+import socket
+import struct
+import threading
+import time
+
+# ====================
+# Xem trực tiếp trên mạch: stream điểm ảnh qua UDP (realtime của WLED),
+# không upload BMP / không ghi preset → không mòn flash, trễ vài chục ms
+#   - DDP (cổng 4048): header 10 byte, tối đa 1440 byte dữ liệu / gói
+#   - DRGB / DNRGB (cổng 21324): giao thức UDP realtime riêng của WLED
+# POI là 1 dải LED → mỗi frame là 1 dòng ảnh, chạy lần lượt hết các dòng
+# (mạch có đủ LED cho cả ảnh, vd ma trận → gửi nguyên ảnh mỗi frame).
+# Ngừng stream → mạch tự quay về hiệu ứng cũ sau thời gian chờ realtime.
+# ====================
+
+DDP_PORT = 4048
+WLED_UDP_PORT = 21324
+PORTS = {"ddp": DDP_PORT, "drgb": WLED_UDP_PORT}
+
+DDP_VER1 = 0x40
+DDP_PUSH = 0x01
+DDP_RGB24 = 0x0B
+DDP_DISPLAY = 1
+DDP_MAX_DATA = 1440         # 480 LED / gói
+
+DRGB = 2
+DNRGB = 4
+DRGB_MAX_LEDS = 490
+DNRGB_MAX_LEDS = 489
+REALTIME_TIMEOUT = 2        # (s) byte timeout của DRGB: hết frame → mạch về chế độ thường
+
+DEFAULT_FPS = 60
+MAX_FPS = 500
+
+
+# ====================
+# Đóng gói
+# ====================
+def ddp_packets(pixels, seq=1):
+    """pixels: bytes RGB liên tiếp → [gói DDP], gói cuối có cờ PUSH (hiển thị)."""
+    packets = []
+    seq = (seq % 15) + 1        # 1..15, 0 = không dùng số thứ tự
+    for offset in range(0, max(len(pixels), 1), DDP_MAX_DATA):
+        chunk = pixels[offset:offset + DDP_MAX_DATA]
+        last = offset + DDP_MAX_DATA >= len(pixels)
+        flags = DDP_VER1 | (DDP_PUSH if last else 0)
+        header = struct.pack(">BBBBIH", flags, seq, DDP_RGB24, DDP_DISPLAY, offset, len(chunk))
+        packets.append(header + chunk)
+    return packets
+
+
+def drgb_packets(pixels, timeout=REALTIME_TIMEOUT):
+    """DRGB nếu ≤ 490 LED, dài hơn → nhiều gói DNRGB (có chỉ số LED bắt đầu)."""
+    leds = len(pixels) // 3
+    if leds <= DRGB_MAX_LEDS:
+        return [bytes((DRGB, timeout)) + pixels]
+
+    packets = []
+    for start in range(0, leds, DNRGB_MAX_LEDS):
+        chunk = pixels[start * 3:(start + DNRGB_MAX_LEDS) * 3]
+        packets.append(struct.pack(">BBH", DNRGB, timeout, start) + chunk)
+    return packets
+
+
+def encode_frame(pixels, protocol="ddp", seq=1):
+    if protocol == "ddp":
+        return ddp_packets(pixels, seq)
+    if protocol == "drgb":
+        return drgb_packets(pixels)
+    raise ValueError(f"Giao thức không hỗ trợ: {protocol}")
+
+
+def image_frames(img, led_count=None):
+    """
+    Ảnh đã convert (RGB) → [bytes] các frame.
+    Dải LED (led_count < số điểm ảnh) → mỗi dòng 1 frame, cắt / đệm đen cho vừa led_count.
+    """
+    img = img.convert("RGB")
+    w, h = img.size
+    data = img.tobytes()
+    if led_count and led_count >= w * h:
+        return [data]
+
+    n = led_count or w
+    frames = []
+    for y in range(h):
+        row = data[y * w * 3:(y + 1) * w * 3]
+        frames.append(row[:n * 3].ljust(n * 3, b"\0"))
+    return frames
+
+
+def target_address(ip, protocol="ddp"):
+    # combo lưu "ip" hoặc "ip:cổng_http" → UDP dùng cổng của giao thức
+    return ip.split(":")[0], PORTS[protocol]
+
+
+# ====================
+# Gửi liên tục theo fps
+# ====================
+class LiveStreamer:
+    """
+    Phát frames tới targets [(host, port)] liên tục theo fps trên thread riêng.
+    set_frames() đổi nội dung ngay frame kế tiếp (chỉnh ảnh thấy luôn trên mạch).
+    """
+
+    def __init__(self, targets, frames, fps=DEFAULT_FPS, protocol="ddp"):
+        self.targets = list(targets)
+        self.protocol = protocol
+        self.fps = max(1, min(fps, MAX_FPS))
+        self._packets = self._encode_all(frames)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.sent = 0           # số frame đã gửi
+        self.late = 0           # số frame trễ lịch (bỏ qua để bắt kịp)
+        self.errors = 0
+        self.started_at = None
+
+    def _encode_all(self, frames):
+        # đóng gói 1 lần, vòng gửi chỉ còn sendto (DDP: đổi số thứ tự theo frame)
+        return [encode_frame(f, self.protocol, i) for i, f in enumerate(frames)]
+
+    def set_frames(self, frames):
+        packets = self._encode_all(frames)
+        with self._lock:
+            self._packets = packets
+
+    # ====================
+    # Vòng đời
+    def start(self):
+        if self._thread is None:
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="live-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._sock.close()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stop.is_set()
+
+    @property
+    def actual_fps(self):
+        if not self.started_at or not self.sent:
+            return 0.0
+        return self.sent / (time.perf_counter() - self.started_at)
+
+    def _run(self):
+        period = 1.0 / self.fps
+        next_at = time.perf_counter()
+        index = 0
+
+        while not self._stop.is_set():
+            with self._lock:
+                frames = self._packets
+            if frames:
+                for packet in frames[index % len(frames)]:
+                    for addr in self.targets:
+                        try:
+                            self._sock.sendto(packet, addr)
+                        except OSError:
+                            self.errors += 1
+                index += 1
+                self.sent += 1
+
+            next_at += period
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif -delay > period:
+                # chậm hơn 1 frame (máy bận) → bỏ lịch cũ, không dồn gói
+                skipped = int(-delay / period)
+                self.late += skipped
+                next_at += skipped * period
@@ -1,15 +1,36 @@
-import sys, os, tempfile, requests, re
-from PIL import Image
+import sys, os, time
+
+# Bắt buộc cho process pool khi đóng gói .exe (pyinstaller --onefile):
+# process con chạy lại file này → xử lý ngay ở đây, trước khi nạp Qt
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+
 from PySide6.QtWidgets import *
 from PySide6.QtGui import *
 from PySide6.QtCore import *
-from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtCore import QTimer, QUrl
 from PySide6.QtWidgets import QColorDialog
 
+# ====================
+# Chỉ nạp những gì cần để hiện cửa sổ.
+# QtWebEngine (Chromium), PIL, requests, zeroconf nạp khi tính năng cần tới
+# (import trong hàm) → xem benchmarks/bench_startup.py
+# ====================
 from config import APP_TITLE, APP_VERSION, APP_COMPANY, resource_path
 from widgets import PixelPreview, PixelIndexBar
-from image_utils import convert_to_square_rgb
+from device_client import get_client, close_all, DeviceOffline, UploadError, PinRequired
+from device_snapshot import DeviceSnapshot
+from preset_wipe import wipe_presets
+from fs_cleanup import plan_cleanup, delete_files, list_files
+from fanout import post_state_all, send_image_all, load_group, save_group
+from fanout import summary as fanout_summary
+from sync_poi import valid_presets, playlist_payload, preset_payload
+from workers import run_task, cancel_all, DeviceSignals
+
+# Chờ cửa sổ vẽ xong rồi mới bắt đầu tìm mạch
+DISCOVERY_DELAY_MS = 300
+
 
 class BMPConverter(QWidget):
 
@@ -36,7 +57,21 @@ class BMPConverter(QWidget):
         # ==== biến lưu trữ ====
         self.input_path = None
         self.loaded_image = None
+        self.loaded_key = None   # khóa nội dung ảnh gốc cho cache convert
         self.preview_qpix = None
+        self.snapshots = {}   # ip -> DeviceSnapshot
+        self.discovery = None
+        self.device_signals = DeviceSignals()
+        self.device_signals.found.connect(self._on_device_found)
+        self.device_signals.lost.connect(self._on_device_lost)
+        self.device_signals.health.connect(self._on_health)
+        self.device_signals.state.connect(self._on_state_push)
+        self.telemetry = None
+        self.state_channel = None
+        self.live = None
+        self.live_leds = None
+        self._refresh_task = None
+        self.commands = None   # CommandCoalescer, tạo khi cần
 
         # ==== màu LED theo chuẩn col[] ====
         self.col = [
@@ -132,6 +167,16 @@ class BMPConverter(QWidget):
 
             layout_color.addLayout(row)
 
+        # ===== ĐỘ SÁNG (kéo là mạch đổi ngay, lệnh được gộp) =====
+        row_bri = QHBoxLayout()
+        row_bri.addWidget(QLabel("☀️ Độ sáng"))
+        self.slider_bri = QSlider(Qt.Horizontal)
+        self.slider_bri.setRange(1, 255)
+        self.slider_bri.setValue(128)
+        self.slider_bri.valueChanged.connect(lambda v: self._push_state({"on": True, "bri": v}))
+        row_bri.addWidget(self.slider_bri, 1)
+        layout_color.addLayout(row_bri)
+
         layout_color.addStretch(1)
 
 
@@ -223,6 +268,19 @@ class BMPConverter(QWidget):
         btn_send.clicked.connect(self.send_to_argb)
         layout_mach.addWidget(btn_send)
 
+        # Live: stream ảnh preview qua UDP, không upload / không ghi flash
+        self.btn_live = QPushButton("📡 Live")
+        self.btn_live.setCheckable(True)
+        self.btn_live.setToolTip("Xem trực tiếp ảnh preview trên mạch (UDP realtime), chỉnh ảnh thấy ngay")
+        self.btn_live.toggled.connect(self.toggle_live)
+        layout_mach.addWidget(self.btn_live)
+
+        self.spin_fps = QSpinBox()
+        self.spin_fps.setRange(10, 500)
+        self.spin_fps.setValue(60)
+        self.spin_fps.setSuffix(" fps")
+        layout_mach.addWidget(self.spin_fps)
+
         btn_sends = QPushButton("📤 Gửi nhiều ảnh")
         def on_send_multiple():
             # Xóa hình hiển thị
@@ -233,6 +291,26 @@ class BMPConverter(QWidget):
         btn_sends.clicked.connect(on_send_multiple)
         layout_mach.addWidget(btn_sends)
 
+        # Đồng bộ: ảnh đã có trên mạch (cùng tên + nội dung) thì không upload lại
+        self.chk_sync = QCheckBox("Bỏ qua ảnh đã có")
+        self.chk_sync.setChecked(True)
+        self.chk_sync.setToolTip(
+            "Chỉ upload ảnh mới hoặc đã thay đổi.\n"
+            "So sánh tên, dung lượng và nội dung đã gửi lần trước."
+        )
+        layout_mach.addWidget(self.chk_sync)
+
+        # Nhóm mạch: bật → mọi lệnh gửi cùng lúc tới cả nhóm
+        self.group_ips = load_group()
+        self.chk_group = QCheckBox()
+        self.chk_group.setToolTip("Gửi ảnh / hiệu ứng / màu / palette / preset / tắt LED tới mọi mạch trong nhóm")
+        layout_mach.addWidget(self.chk_group)
+
+        btn_group = QPushButton("👥 Nhóm...")
+        btn_group.clicked.connect(self.edit_device_group)
+        layout_mach.addWidget(btn_group)
+        self._update_group_label()
+
         layout_mach.addStretch(1)
         grp_mach.setLayout(layout_mach)
         layout_argb_main.addWidget(grp_mach, stretch=2)  # chiếm phần lớn
@@ -297,6 +375,12 @@ class BMPConverter(QWidget):
         """)
         left_layout.addWidget(self.lbl_device_info)
 
+        # Sức khỏe mạch (theo dõi nền: độ trễ, bộ nhớ trống, cảnh báo)
+        self.lbl_health = QLabel("📡 Chưa theo dõi")
+        self.lbl_health.setWordWrap(True)
+        self.lbl_health.setStyleSheet(self.lbl_device_info.styleSheet())
+        left_layout.addWidget(self.lbl_health)
+
         # ====== Đường phân cách ngang ======
         line = QFrame()
         line.setFrameShape(QFrame.HLine)
@@ -426,17 +510,18 @@ class BMPConverter(QWidget):
         footer_layout.setContentsMargins(0,0,0,0)
         footer_layout.setSpacing(10)
 
-        # Logo HSL
-        pixmap_hsl = QPixmap(resource_path("assets/hsl_logo.png")).scaledToWidth(80)
+        # Logo HSL + logo thứ 2: ảnh nạp sau khi cửa sổ đã hiện (_load_logos)
         lbl_logo_hsl = QLabel()
-        lbl_logo_hsl.setPixmap(pixmap_hsl)
+        lbl_logo_hsl.setFixedWidth(80)
         lbl_logo_hsl.setAlignment(Qt.AlignVCenter)
 
-        # Logo thứ 2
-        pixmap_logo2 = QPixmap(resource_path("assets/qrcode_with_logo.png")).scaledToWidth(80)
         lbl_logo2 = QLabel()
-        lbl_logo2.setPixmap(pixmap_logo2)
+        lbl_logo2.setFixedWidth(80)
         lbl_logo2.setAlignment(Qt.AlignVCenter)
+        self._logo_labels = [
+            (lbl_logo_hsl, "assets/hsl_logo.png"),
+            (lbl_logo2, "assets/qrcode_with_logo.png"),
+        ]
 
         # Text
         lbl_text = QLabel(
@@ -462,6 +547,16 @@ class BMPConverter(QWidget):
         btn_quit.clicked.connect(self.close)
         main.addWidget(btn_quit)
 
+        # chạy ở vòng lặp sự kiện đầu tiên → cửa sổ hiện trước, logo vào sau
+        QTimer.singleShot(0, self._load_logos)
+
+    def _load_logos(self):
+        for lbl, path in self._logo_labels:
+            lbl.setPixmap(QPixmap(resource_path(path)).scaledToWidth(80))
+
+        # danh sách mạch đã lưu + mDNS nền (zeroconf/requests nạp sau khi hiện cửa sổ)
+        QTimer.singleShot(DISCOVERY_DELAY_MS, self._start_discovery)
+
     def send_current_effect(self):
         item = self.list_effects.currentItem()
         if item:
@@ -469,20 +564,61 @@ class BMPConverter(QWidget):
 
 
     def pick_color(self, index):
-        color = QColorDialog.getColor(
-            self.col[index],
-            self,
-            f"Chọn màu cho col[{index}]",
-            QColorDialog.ShowAlphaChannel
-        )
+        original = QColor(self.col[index])
 
-        if not color.isValid():
+        dlg = QColorDialog(original, self)
+        dlg.setWindowTitle(f"Chọn màu cho col[{index}]")
+        dlg.setOptions(QColorDialog.ShowAlphaChannel | QColorDialog.DontUseNativeDialog)
+        # kéo bánh xe màu → mạch đổi màu theo ngay
+        dlg.currentColorChanged.connect(lambda c: self._preview_color(index, c))
+
+        if dlg.exec() != QDialog.Accepted or not dlg.selectedColor().isValid():
+            # Hủy → trả lại màu cũ
+            self._preview_color(index, original)
             return
 
-        self.col[index] = color
+        self.col[index] = dlg.selectedColor()
         self.update_color_button(index)
         self.send_current_effect()
 
+    def _preview_color(self, index, color):
+        if not color.isValid():
+            return
+        self.col[index] = QColor(color)
+        self.update_color_button(index)
+        col_json = [[c.red(), c.green(), c.blue()] for c in self.col]
+        self._push_state({"seg": [{"id": 0, "col": col_json}]})
+
+    # ====================
+    # Lệnh liên tục (màu, độ sáng): gộp theo mạch, chỉ gửi giá trị mới nhất
+    def _push_state(self, patch):
+        from command_queue import CommandCoalescer
+        targets = list(self.group_ips) if self._group_mode() else [self.combo_ip.currentData()]
+        targets = [ip for ip in targets if ip]
+        if not targets:
+            return
+
+        if self.commands is None:
+            self.commands = CommandCoalescer(
+                lambda ip, p: self._snapshot(ip).post_state(p),
+                on_result=self._on_command_result
+            )
+        for ip in targets:
+            self.commands.submit(ip, patch)
+
+    def _on_command_result(self, ip, patch, r, error):
+        # chạy trên thread gửi của mạch (state trong response đã vào snapshot)
+        # r None → mạch đã đúng giá trị, không gửi
+        if error is not None:
+            print(f"[Lệnh] {ip}: lỗi {error}")
+        elif r is not None and r.status_code != 200:
+            print(f"[Lệnh] {ip}: HTTP {r.status_code}")
+
+    def stop_commands(self):
+        if self.commands is not None:
+            self.commands.flush()
+            self.commands.stop()
+
 
 
     def update_color_button(self, index):
@@ -507,24 +643,33 @@ class BMPConverter(QWidget):
 
         layout = QVBoxLayout(dlg)
 
+        # Chromium chỉ nạp khi thật sự mở popup PIN
+        from PySide6.QtWebEngineWidgets import QWebEngineView
         browser = QWebEngineView()
         start_url = f"http://{ip}/settings/sec"
         browser.setUrl(QUrl(start_url))
         layout.addWidget(browser)
 
-        # ===== Timer kiểm tra PIN đúng =====
+        # ===== Timer kiểm tra PIN đúng (chạy nền, không chồng request) =====
         timer = QTimer(dlg)
         timer.setInterval(1000)  # 1s
+        pending = []
+
+        def on_pin_status(code):
+            pending.clear()
+            if code == 200 and timer.isActive():
+                timer.stop()
+                dlg.accept()   # 🔓 PIN ĐÚNG → ĐÓNG
+                self.refresh_device_data()
 
         def check_pin_ok():
-            try:
-                r = requests.get(f"http://{ip}/edit", timeout=0.5)
-                if r.status_code == 200:
-                    timer.stop()
-                    dlg.accept()   # 🔓 PIN ĐÚNG → ĐÓNG
-                    self.refresh_device_data()
-            except:
-                pass
+            if pending:
+                return
+            pending.append(run_task(
+                lambda task: get_client(ip).get("/edit", "probe").status_code,
+                on_done=on_pin_status,
+                on_error=lambda e: pending.clear()
+            ))
 
         timer.timeout.connect(check_pin_ok)
         timer.start()
@@ -543,20 +688,34 @@ class BMPConverter(QWidget):
         browser.urlChanged.connect(on_url_changed)
 
         dlg.exec()
+        timer.stop()
 
 
 
     
     # ====================
-    # Kiểm tra mạch ARGB online
+    # Kiểm tra mạch ARGB online (gọi từ thread nền)
     def _is_device_online(self, ip):
-        """Ping nhanh bằng cách GET /json (ARGB luôn trả về JSON)."""
+        """Ping nhanh bằng GET /json/info (kết quả nạp luôn vào snapshot)."""
         try:
-            r = requests.get(f"http://{ip}/json", timeout=1)
-            return r.status_code == 200
+            self._snapshot(ip).fetch(["info"], "probe")
+            return True
         except:
             return False
 
+    def _require_online(self, ip):
+        if not self._is_device_online(ip):
+            raise DeviceOffline(ip)
+
+    # ====================
+    # Snapshot dữ liệu /json dùng chung cho mọi panel
+    def _snapshot(self, ip):
+        snap = self.snapshots.get(ip)
+        if snap is None:
+            snap = DeviceSnapshot(get_client(ip))
+            self.snapshots[ip] = snap
+        return snap
+
     def _fs_icon(self, percent: int) -> str:
         if percent >= 85:
             return "🔴"
@@ -566,119 +725,98 @@ class BMPConverter(QWidget):
             return "🟢"
 
     # ====================
-    # Tải dữ liệu thiết bị (name, ver, wifi, filesystem)
-    def load_device_info(self):
-        ip = self.combo_ip.currentData()
-        if not ip:
-            self.lbl_device_info.setText("❌ Chưa chọn mạch")
-            return
-
-        try:
-            # 🔄 TRIGGER REFRESH FILESYSTEM (preset ảo)
-            try:
-                requests.post(
-                    f"http://{ip}/json/state",
-                    json={"pdel": 250},
-                    timeout=2
-                )
-            except:
-                pass  # ❗ Không được để fail bước chính
-            r = requests.get(f"http://{ip}/json", timeout=3)
-
-            if r.status_code != 200:
-                self.lbl_device_info.setText(f"❌ Lỗi HTTP {r.status_code}")
-                return
-
-            data = r.json()
-            info = data.get("info", {})
-
-            # --- Thông tin thiết bị ---
-            name = info.get("name", "N/A")
-            ver = info.get("ver", "N/A")
-
-            # --- WiFi ---
-            wifi = info.get("wifi", {})
-            signal = wifi.get("signal")  # %
-
-            if signal is not None:
-                if signal >= 70:
-                    wifi_icon = "🟢"
-                elif signal >= 40:
-                    wifi_icon = "🟡"
-                else:
-                    wifi_icon = "🔴"
-
-                wifi_str = f"{wifi_icon} {signal}%"
+    # Hiển thị dữ liệu thiết bị (name, ver, wifi, filesystem)
+    def _render_device_info(self, ip, info):
+        # --- Thông tin thiết bị ---
+        name = info.get("name", "N/A")
+        ver = info.get("ver", "N/A")
+
+        # --- WiFi ---
+        wifi = info.get("wifi", {})
+        signal = wifi.get("signal")  # %
+
+        if signal is not None:
+            if signal >= 70:
+                wifi_icon = "🟢"
+            elif signal >= 40:
+                wifi_icon = "🟡"
             else:
-                wifi_str = "N/A"
+                wifi_icon = "🔴"
 
+            wifi_str = f"{wifi_icon} {signal}%"
+        else:
+            wifi_str = "N/A"
 
-            # --- Filesystem ---
-            fs = info.get("fs", {})
-            fs_used = fs.get("u")
-            fs_total = fs.get("t")
 
-            if fs_used is not None and fs_total:
-                fs_percent = int(fs_used * 100 / fs_total)
-                fs_icon = "🔴" if fs_percent >= 85 else "🟡" if fs_percent >= 70 else "🟢"
-                fs_str = f"{fs_icon} {fs_percent}%"
-            else:
-                fs_str = "N/A"
+        # --- Filesystem ---
+        fs = info.get("fs", {})
+        fs_used = fs.get("u")
+        fs_total = fs.get("t")
 
+        if fs_used is not None and fs_total:
+            fs_percent = int(fs_used * 100 / fs_total)
+            fs_icon = self._fs_icon(fs_percent)
+            fs_str = f"{fs_icon} {fs_percent}%"
+        else:
+            fs_str = "N/A"
 
-            self.lbl_device_info.setText(
-                f"📛 Tên: {name}\n"
-                f"🧩 FW: {ver}\n"
-                f"📶 WiFi: {wifi_str}\n"
-                f"📁 Bộ nhớ: {fs_str}"
-            )
 
+        self.lbl_device_info.setText(
+            f"📛 Tên: {name}\n"
+            f"🧩 FW: {ver}\n"
+            f"📶 WiFi: {wifi_str}\n"
+            f"📁 Bộ nhớ: {fs_str}"
+        )
 
+        # Độ trễ + thời gian xếp hàng từng loại request (di chuột vào để xem)
+        client = get_client(ip)
+        lines = [
+            f"{kind}: {n} req, lỗi {err}, TB {avg:.0f} ms, max {mx:.0f} ms"
+            for kind, (n, err, avg, mx) in client.latency_summary().items()
+        ]
+        lines.append(f"⏳ Hàng chờ: {client.gate.depth} (cao nhất {client.gate.max_depth})")
+        lines += [
+            f"  chờ {kind}: TB {avg:.0f} ms, max {mx:.0f} ms"
+            for kind, (n, avg, mx) in client.gate.summary().items()
+        ]
+        self.lbl_device_info.setToolTip("\n".join(lines))
 
-        except requests.exceptions.Timeout:
+    def _show_device_error(self, e):
+        import requests
+        if isinstance(e, requests.exceptions.HTTPError):
+            self.lbl_device_info.setText(f"❌ Lỗi HTTP {e.response.status_code}")
+        elif isinstance(e, requests.exceptions.Timeout):
             self.lbl_device_info.setText("⏱️ Timeout kết nối")
-
-        except requests.exceptions.ConnectionError:
+        elif isinstance(e, requests.exceptions.ConnectionError):
             self.lbl_device_info.setText("❌ Không kết nối được")
-
-        except Exception as e:
+        else:
             self.lbl_device_info.setText(f"⚠️ Lỗi:\n{e}")
 
-
-    
     # ====================
-    # Tải danh sách effect
-    def load_effect_list(self):
-        ip = self.combo_ip.currentData()
-        if not ip:
-            return
-
-        self.list_effects.clear()
-
+    # 🔄 TRIGGER REFRESH FILESYSTEM (preset ảo)
+    def _trigger_fs_refresh(self, ip):
         try:
-            r = requests.get(f"http://{ip}/json", timeout=3)
-            if r.status_code != 200:
-                return
-
-            data = r.json()
+            get_client(ip).post_state({"pdel": 250}, verbose=False)
+        except:
+            pass  # ❗ Không được để fail bước chính
 
-            # WLED/HSL: effects là list, index = fx id
-            effects = data.get("effects", [])
-            if not isinstance(effects, list):
-                return
 
-            for fx_id, fx_name in enumerate(effects):
-                # Hiển thị: [ID] Tên effect
-                item = QListWidgetItem(f"[{fx_id}] {fx_name}")
-                item.setData(Qt.UserRole, fx_id)
-                item.setToolTip(f"Effect ID: {fx_id}")
-                self.list_effects.addItem(item)
+    
+    # ====================
+    # Hiển thị danh sách effect
+    def _render_effect_list(self, effects):
+        self.list_effects.clear()
 
-            # ⭐ highlight effect đang chạy
-            self.highlight_current_effect()
+        # WLED/HSL: effects là list, index = fx id
+        if not isinstance(effects, list):
+            return
 
-        except Exception as e:
-            print(f"[load_effect_list] Lỗi: {e}")
+        for fx_id, fx_name in enumerate(effects):
+            # Hiển thị: [ID] Tên effect
+            item = QListWidgetItem(f"[{fx_id}] {fx_name}")
+            item.setData(Qt.UserRole, fx_id)
+            item.setToolTip(f"Effect ID: {fx_id}")
+            self.list_effects.addItem(item)
 
 
     # ====================
@@ -701,7 +839,7 @@ class BMPConverter(QWidget):
 
         payload = {
             "on": True,
-            "bri": 128,
+            "bri": self.slider_bri.value(),
             "seg": [
                 {
                     "id": 0,
@@ -711,12 +849,29 @@ class BMPConverter(QWidget):
             ]
         }
 
-        try:
-            r = requests.post(
-                f"http://{ip}/json/state",
-                json=payload,
-                timeout=2
-            )
+        if self._group_mode():
+            self._fan_out_state(payload, "Hiệu ứng")
+            return
+
+        def work(task):
+            snap = self._snapshot(ip)
+            r = snap.post_state(payload)
+            if r is None:
+                return None, snap.state   # effect đang chạy đúng rồi → không gửi lại
+
+            if r.status_code != 200:
+                return r, None
+
+            # mạch trả state mới trong response → khỏi đọc lại
+            # (firmware không trả → snapshot tự đọc /json/state)
+            return r, r.state if r.state is not None else snap.state
+
+        def done(result):
+            r, state = result
+            if r is None:
+                if ip == self.combo_ip.currentData():
+                    self._highlight_state(state)
+                return
 
             # 🔐 Nếu bị khóa PIN
             if r.status_code == 401:
@@ -737,10 +892,14 @@ class BMPConverter(QWidget):
                 return
 
             # (Optional) highlight effect đang chạy
-            self.highlight_current_effect()
+            if state is not None and ip == self.combo_ip.currentData():
+                self._highlight_state(state)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", str(e))
+        run_task(
+            work,
+            on_done=done,
+            on_error=lambda e: QMessageBox.critical(self, "Lỗi", str(e))
+        )
 
 
     # ====================
@@ -780,18 +939,13 @@ class BMPConverter(QWidget):
         ) != QMessageBox.Yes:
             return
 
-        try:
-            payload = {
-                "psave": preset_id
-            }
-
-            r = requests.post(
-                f"http://{ip}/json/state",
-                json=payload,
-                timeout=2
-            )
+        payload = {
+            "psave": preset_id
+        }
 
+        def done(r):
             if r.status_code == 200:
+                self._snapshot(ip).invalidate("info")   # presets.json lớn thêm
                 QMessageBox.information(
                     self,
                     "Đã lưu preset",
@@ -806,41 +960,37 @@ class BMPConverter(QWidget):
                     f"Lưu preset thất bại (HTTP {r.status_code})"
                 )
 
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", str(e))
+        run_task(
+            lambda task: get_client(ip).post_state(payload),
+            on_done=done,
+            on_error=lambda e: QMessageBox.critical(self, "Lỗi", str(e))
+        )
 
 
 
 
     # ====================
     # Highlight effect đang chạy
-    def highlight_current_effect(self):
-        ip = self.combo_ip.currentData()
-        if not ip:
+    def _highlight_state(self, state):
+        # effect / palette của seg 0 + preset đang chạy
+        state = state or {}
+        segs = state.get("seg") or [{}]
+        self._highlight_item(self.list_effects, segs[0].get("fx"))
+        self._highlight_item(self.list_palettes, segs[0].get("pal"))
+        self._highlight_item(self.list_presets, state.get("ps"))
+
+    def _highlight_item(self, list_widget, value):
+        if value is None:
             return
 
-        try:
-            r = requests.get(f"http://{ip}/json", timeout=2)
-            if r.status_code != 200:
-                return
-
-            data = r.json()
-            segs = data.get("state", {}).get("seg", [])
-            if not segs:
-                return
-
-            current_fx = segs[0].get("fx", None)
-            if current_fx is None:
+        for i in range(list_widget.count()):
+            if list_widget.item(i).data(Qt.UserRole) == value:
+                if list_widget.currentRow() != i:
+                    list_widget.setCurrentRow(i)
                 return
 
-            for i in range(self.list_effects.count()):
-                item = self.list_effects.item(i)
-                if item.data(Qt.UserRole) == current_fx:
-                    self.list_effects.setCurrentRow(i)
-                    break
-
-        except Exception:
-            pass
+        # vd preset -1 (không chạy preset nào)
+        list_widget.clearSelection()
 
 
     # ==================
@@ -850,55 +1000,69 @@ class BMPConverter(QWidget):
         if not ip:
             return
 
-        self.list_presets.clear()
+        def done(presets):
+            if ip == self.combo_ip.currentData():
+                self._render_preset_list(presets)
+
+        run_task(lambda task: self._fetch_presets(ip), on_done=done)
 
+    # Đọc presets.json (gọi từ thread nền), lỗi → None
+    def _fetch_presets(self, ip):
         try:
-            r = requests.get(f"http://{ip}/presets.json", timeout=3)
+            r = get_client(ip).get("/presets.json")
             if r.status_code != 200:
                 print(f"[preset] HTTP {r.status_code}")
-                return
+                return None
 
             presets = r.json()
             # print("[preset] RAW JSON:", presets)
 
             if not isinstance(presets, dict):
                 print("[preset] ❌ presets.json không phải dict")
-                return
+                return None
 
-            # ---- Lọc + sort preset ID hợp lệ ----
-            preset_items = []
+            return presets
 
-            for pid_str, pdata in presets.items():
-                # key phải là số
-                if not pid_str.isdigit():
-                    continue
+        except Exception as e:
+            print(f"[load_preset_list] ❌ Exception: {e}")
+            return None
 
-                pid = int(pid_str)
+    def _render_preset_list(self, presets):
+        self.list_presets.clear()
+        if presets is None:
+            return
 
-                # ❌ Bỏ qua preset 0 hoặc object rỗng
-                if pid == 0 or not isinstance(pdata, dict) or not pdata:
-                    continue
+        # ---- Lọc + sort preset ID hợp lệ ----
+        preset_items = []
 
-                # Tên preset nằm ở level top: "n"
-                name = pdata.get("n", f"Preset {pid}")
+        for pid_str, pdata in presets.items():
+            # key phải là số
+            if not pid_str.isdigit():
+                continue
 
-                preset_items.append((pid, name))
+            pid = int(pid_str)
 
-            # Sort theo ID tăng dần
-            preset_items.sort(key=lambda x: x[0])
+            # ❌ Bỏ qua preset 0 hoặc object rỗng
+            if pid == 0 or not isinstance(pdata, dict) or not pdata:
+                continue
 
-            # ---- Đưa lên UI ----
-            for pid, name in preset_items:
-                item = QListWidgetItem(f"[{pid}] {name}")
-                item.setData(Qt.UserRole, pid)
-                item.setToolTip(f"Preset ID: {pid}")
+            # Tên preset nằm ở level top: "n"
+            name = pdata.get("n", f"Preset {pid}")
 
-                self.list_presets.addItem(item)
+            preset_items.append((pid, name))
 
-            print(f"[preset] ✔ Load {len(preset_items)} preset")
+        # Sort theo ID tăng dần
+        preset_items.sort(key=lambda x: x[0])
 
-        except Exception as e:
-            print(f"[load_preset_list] ❌ Exception: {e}")
+        # ---- Đưa lên UI ----
+        for pid, name in preset_items:
+            item = QListWidgetItem(f"[{pid}] {name}")
+            item.setData(Qt.UserRole, pid)
+            item.setToolTip(f"Preset ID: {pid}")
+
+            self.list_presets.addItem(item)
+
+        print(f"[preset] ✔ Load {len(preset_items)} preset")
 
 
     # ====================
@@ -917,48 +1081,36 @@ class BMPConverter(QWidget):
             "ps": preset_id
         }
 
-        try:
-            r = requests.post(
-                f"http://{ip}/json/state",
-                json=payload,
-                timeout=2
-            )
+        if self._group_mode():
+            self._fan_out_state(payload, "Preset")
+            return
 
+        def done(r):
             if r.status_code != 200:
                 print(f"[Preset] HTTP {r.status_code}")
+            elif r.state is not None and ip == self.combo_ip.currentData():
+                self._highlight_state(r.state)
 
-        except Exception as e:
-            print(f"[Preset] Lỗi chạy preset {preset_id}: {e}")
+        run_task(
+            lambda task: self._snapshot(ip).post_state(payload),
+            on_done=done,
+            on_error=lambda e: print(f"[Preset] Lỗi chạy preset {preset_id}: {e}")
+        )
 
 
     # ====================
-    # Tải danh sách palette
-    def load_palette_list(self):
-        ip = self.combo_ip.currentData()
-        if not ip:
-            return
-
+    # Hiển thị danh sách palette
+    def _render_palette_list(self, palettes):
         self.list_palettes.clear()
 
-        try:
-            r = requests.get(f"http://{ip}/json", timeout=3)
-            if r.status_code != 200:
-                return
-
-            j = r.json()
-            palettes = j.get("palettes", [])
-
-            if not isinstance(palettes, list):
-                return
-
-            for pid, name in enumerate(palettes):
-                item = QListWidgetItem(f"[{pid}] {name}")
-                item.setData(Qt.UserRole, pid)
-                item.setToolTip(f"Palette ID: {pid}")
-                self.list_palettes.addItem(item)
+        if not isinstance(palettes, list):
+            return
 
-        except Exception as e:
-            print(f"[load_palette_list] Lỗi: {e}")
+        for pid, name in enumerate(palettes):
+            item = QListWidgetItem(f"[{pid}] {name}")
+            item.setData(Qt.UserRole, pid)
+            item.setToolTip(f"Palette ID: {pid}")
+            self.list_palettes.addItem(item)
 
 
     # ====================
@@ -979,12 +1131,13 @@ class BMPConverter(QWidget):
             ]
         }
 
-        try:
-            r = requests.post(
-                f"http://{ip}/json/state",
-                json=payload,
-                timeout=2
-            )
+        if self._group_mode():
+            self._fan_out_state(payload, "Palette")
+            return
+
+        def done(r):
+            if r is None:
+                return   # palette đang dùng rồi → không gửi
 
             if r.status_code != 200:
                 QMessageBox.warning(
@@ -994,16 +1147,70 @@ class BMPConverter(QWidget):
                 )
                 return
 
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", str(e))
+            if r.state is not None and ip == self.combo_ip.currentData():
+                self._highlight_state(r.state)
+
+        run_task(
+            lambda task: self._snapshot(ip).post_state(payload),
+            on_done=done,
+            on_error=lambda e: QMessageBox.critical(self, "Lỗi", str(e))
+        )
 
 
+    # ====================
+    # Làm mới toàn bộ panel — tải nền, vẽ lại khi có kết quả
     def refresh_device_data(self):
-        self.load_device_info()
-        self.load_effect_list()
-        self.load_preset_list()
-        self.load_palette_list()
-        self.highlight_current_effect()
+        ip = self.combo_ip.currentData()
+        if not ip:
+            self.lbl_device_info.setText("❌ Chưa chọn mạch")
+            return
+
+        self._show_health(ip)
+        self._watch_state(ip)
+
+        # Bỏ lượt làm mới cũ (vd: đổi mạch liên tục)
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+
+        self._refresh_task = run_task(
+            self._fetch_device_data, ip,
+            on_done=lambda data: self._apply_device_data(ip, data),
+            on_error=lambda e: self._apply_device_error(ip, e)
+        )
+
+    def _fetch_device_data(self, task, ip):
+        # Bấm làm mới → bỏ toàn bộ cache, cả chuỗi chỉ tốn 1 lần GET /json
+        snap = self._snapshot(ip)
+        snap.invalidate()
+        self._trigger_fs_refresh(ip)
+        task.check()
+
+        data = snap.get()
+        task.check()
+
+        data["presets"] = self._fetch_presets(ip)
+        return data
+
+    def _apply_device_data(self, ip, data):
+        if ip != self.combo_ip.currentData():
+            return
+
+        self._render_device_info(ip, data["info"] or {})
+        self._render_effect_list(data["effects"])
+        self._render_preset_list(data["presets"])
+        self._render_palette_list(data["palettes"])
+        # ⭐ highlight effect / palette / preset đang chạy
+        self._highlight_state(data["state"])
+
+    def _apply_device_error(self, ip, e):
+        if ip != self.combo_ip.currentData():
+            return
+
+        # Mạch lỗi → báo 1 lần, không để từng panel chờ timeout lại
+        self.list_effects.clear()
+        self.list_presets.clear()
+        self.list_palettes.clear()
+        self._show_device_error(e)
 
     # ====================
     # Mở trang cài đặt ARGB (KIỂM TRA ONLINE TRƯỚC)
@@ -1014,34 +1221,151 @@ class BMPConverter(QWidget):
             QMessageBox.warning(self, "Lỗi", "Không có IP để mở trang Cài đặt.")
             return
 
-        # ⭐ Kiểm tra thiết bị còn online không
-        if not self._is_device_online(ip):
-            QMessageBox.critical(
-                self,
-                "Không kết nối",
-                f"Không thể truy cập thiết bị {ip}.\n"
-                "Thiết bị có thể đã tắt nguồn hoặc mất WiFi."
+        def done(online):
+            # ⭐ Kiểm tra thiết bị còn online không
+            if not online:
+                QMessageBox.critical(
+                    self,
+                    "Không kết nối",
+                    f"Không thể truy cập thiết bị {ip}.\n"
+                    "Thiết bị có thể đã tắt nguồn hoặc mất WiFi."
+                )
+                return
+
+            # ⭐ Nếu online → mở trang cấu hình
+            QDesktopServices.openUrl(QUrl(f"http://{ip}/"))
+
+        run_task(lambda task: self._is_device_online(ip), on_done=done)
+
+
+    # ====================
+    # Đồng bộ POI: đo trễ từng mạch → bắt đầu preset / playlist cùng lúc
+    # ====================
+    def _sync_targets(self):
+        # nhóm đã chọn, chưa có nhóm → mọi mạch đang thấy
+        if self.group_ips:
+            return list(self.group_ips)
+        return [
+            self.combo_ip.itemData(i)
+            for i in range(self.combo_ip.count())
+            if self.combo_ip.itemData(i)
+        ]
+
+    def sync_poi(self):
+        from sync_poi import common_presets
+
+        ips = self._sync_targets()
+        if len(ips) < 2:
+            QMessageBox.warning(
+                self, "Chưa đủ mạch",
+                "Cần ít nhất 2 mạch POI (tạo nhóm bằng nút 👥 Nhóm... hoặc quét mạch)."
             )
             return
 
-        # ⭐ Nếu online → mở trang cấu hình
-        QDesktopServices.openUrl(QUrl(f"http://{ip}/"))
+        def failed(e):
+            QMessageBox.critical(self, "Lỗi", f"Không đọc được preset:\n{e}")
+
+        run_task(
+            lambda task: common_presets(ips),
+            on_done=lambda result: self._sync_choose(*result),
+            on_error=failed
+        )
+
+    def _sync_choose(self, common, results):
+        ips = [ip for ip, r in results.items() if r.ok]
+        offline = [r.describe() for r in results.values() if not r.ok]
+        if offline:
+            QMessageBox.warning(self, "Bỏ qua mạch lỗi", "\n".join(offline))
+        if len(ips) < 2:
+            return
+        if not common:
+            QMessageBox.information(self, "Không có preset", "Các mạch không có preset ID chung!")
+            return
+
+        playlist = f"▶ Playlist: chạy lần lượt {len(common)} preset chung"
+        items = [playlist] + [f"ID {pid}: {name}" for pid, name in common]
+        choice, ok = QInputDialog.getItem(
+            self, "🔗 Đồng bộ Mạch POI",
+            f"Bắt đầu cùng lúc trên {len(ips)} mạch:", items, 0, False
+        )
+        if not ok:
+            return
+
+        if choice == playlist:
+            seconds, ok = QInputDialog.getInt(
+                self, "Thời gian chạy mỗi preset", "Nhập số giây cho mỗi preset:", 5, 1, 3600, 1
+            )
+            if not ok:
+                return
+            payload = playlist_payload([pid for pid, _ in common], seconds)
+        else:
+            payload = preset_payload(common[items.index(choice) - 1][0])
+
+        self._sync_start(ips, payload)
+
+    def _sync_start(self, ips, payload):
+        from sync_poi import sync_start
+
+        def work(task):
+            for ip in ips:
+                self._snapshot(ip)   # snapshot nhận state từ response lệnh bắn
+            return sync_start(ips, payload)
 
+        def done(result):
+            report, timings = result
+            text = (
+                f"Độ lệch giữa các mạch: ~{report.spread * 1000:.1f} ms\n\n"
+                "Đo trễ:\n" + "\n".join(t.describe() for t in timings)
+                + "\n\nLệnh bắt đầu:\n" + "\n".join(report.lines())
+            )
+            print(f"[Sync] {len(report.rows)}/{len(ips)} mạch, lệch ~{report.spread * 1000:.1f} ms")
+            if report.errors:
+                QMessageBox.warning(self, "Đồng bộ chưa đủ mạch", text)
+            else:
+                QMessageBox.information(self, "✅ Đã đồng bộ", text)
+
+        run_task(work, on_done=done, on_error=lambda e: QMessageBox.critical(self, "Lỗi đồng bộ", str(e)))
 
     # ====================
-    # Đồng bộ POI (chưa implement)
-    def sync_poi(self):
-        """
-        Hàm đồng bộ các mạch POI.
-        Hiện tại chỉ thông báo đang được xây dựng.
-        """
-        from PySide6.QtWidgets import QMessageBox
+    # Chạy task nền kèm hộp tiến trình (nút Hủy → hủy task)
+    # ====================
+    def _run_with_progress(self, title, label, total, fn, *args,
+                           on_done, cancel_msg, error_title="Lỗi"):
+        progress = QProgressDialog(label, "Hủy", 0, total, self)
+        progress.setWindowTitle(title)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.setValue(0)
 
-        QMessageBox.information(
-            self,
-            "🚧 Tính năng đang xây dựng",
-            "Tính năng Đồng bộ các Mạch POI hiện đang được xây dựng. Vui lòng thử lại sau."
+        def on_progress(value, text):
+            if text:
+                progress.setLabelText(text)
+            progress.setValue(value)
+
+        def finished(result):
+            progress.close()
+            on_done(result)
+
+        def failed(e):
+            progress.close()
+            if isinstance(e, DeviceOffline):
+                QMessageBox.critical(self, "Không online", f"Mạch ARGB {e} không phản hồi!")
+            else:
+                QMessageBox.critical(self, error_title, str(e))
+
+        def cancelled():
+            progress.close()
+            QMessageBox.information(self, "Đã hủy", cancel_msg)
+
+        task = run_task(
+            fn, *args,
+            on_done=finished,
+            on_error=failed,
+            on_progress=on_progress,
+            on_cancel=cancelled
         )
+        progress.canceled.connect(task.cancel)
+        return task
 
     # ====================
     # FN1: Kiểm tra IP → đọc preset → popup → nhập thời gian → chạy playlist
@@ -1052,27 +1376,28 @@ class BMPConverter(QWidget):
             QMessageBox.warning(self, "Lỗi", "Chưa chọn mạch ARGB trong danh sách!")
             return
 
-        # 1️⃣ Kiểm tra online
-        if not self._is_device_online(ip):
-            QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
-            return
+        def fetch(task):
+            # 1️⃣ Kiểm tra online
+            self._require_online(ip)
 
-        # 2️⃣ Tải presets.json
-        try:
-            r = requests.get(f"http://{ip}/presets.json", timeout=2)
-            presets = r.json()
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không đọc được presets.json:\n{e}")
-            return
+            # 2️⃣ Tải presets.json
+            return get_client(ip).get("/presets.json").json()
 
-        # 3️⃣ Lọc preset hợp lệ (ID >= 1)
-        valid = []
-        for k, v in presets.items():
-            if k.isdigit() and int(k) >= 1 and isinstance(v, dict) and len(v) > 0:
-                name = v.get("n", f"Preset {k}")
-                valid.append((int(k), name))
+        def failed(e):
+            if isinstance(e, DeviceOffline):
+                QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
+            else:
+                QMessageBox.critical(self, "Lỗi", f"Không đọc được presets.json:\n{e}")
+
+        run_task(
+            fetch,
+            on_done=lambda presets: self._fn1_start_playlist(ip, presets),
+            on_error=failed
+        )
 
-        valid.sort(key=lambda x: x[0])
+    def _fn1_start_playlist(self, ip, presets):
+        # 3️⃣ Lọc preset hợp lệ (ID >= 1)
+        valid = valid_presets(presets)
 
         if not valid:
             QMessageBox.information(self, "Không có preset", "Thiết bị không có preset hợp lệ!")
@@ -1100,27 +1425,11 @@ class BMPConverter(QWidget):
             return  # Người dùng bấm Cancel
 
 
-        # ⭐ Convert giây → dur WLED (1s = 10 đơn vị)
-        dur_value = seconds * 10  
-
         # 6️⃣ Chuẩn bị playlist
-        preset_ids = [pid for pid, _ in valid]
-        dur_list   = [dur_value] * len(preset_ids)
-
-        payload = {
-            "on": True,
-            "playlist": {
-                "ps": preset_ids,
-                "dur": dur_list,
-                "repeat": 0
-            }
-        }
+        payload = playlist_payload([pid for pid, _ in valid], seconds)
 
         # 7️⃣ Gửi playlist
-        try:
-            url = f"http://{ip}/json/state"
-            r = requests.post(url, json=payload, timeout=2)
-
+        def done(r):
             if r.status_code == 200:
                 QMessageBox.information(
                     self,
@@ -1131,18 +1440,17 @@ class BMPConverter(QWidget):
             else:
                 QMessageBox.critical(self, "Lỗi", f"Gửi playlist thất bại!\nHTTP {r.status_code}")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không gửi được playlist:\n{e}")
+        run_task(
+            lambda task: get_client(ip).post_state(payload),
+            on_done=done,
+            on_error=lambda e: QMessageBox.critical(self, "Lỗi", f"Không gửi được playlist:\n{e}")
+        )
 
 
     # ====================
     # FN2: Xóa Preset + Xóa file BMP (có Progress)
     # ====================
     def fn2_clear_presets(self):
-        from PySide6.QtWidgets import QMessageBox, QProgressDialog, QApplication
-        from PySide6.QtCore import Qt
-        import requests
-
         ip = self.combo_ip.currentData()
         if not ip:
             QMessageBox.warning(self, "Lỗi", "Chưa chọn mạch ARGB hợp lệ.")
@@ -1172,188 +1480,187 @@ class BMPConverter(QWidget):
         ) != QMessageBox.Yes:
             return
 
-        # 1️⃣ Kiểm tra online
-        if not self._is_device_online(ip):
-            QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
-            return
+        def fetch(task):
+            # 1️⃣ Kiểm tra online
+            self._require_online(ip)
 
-        # ===============================================================
-        # ⭐ 2️⃣ LẤY DANH SÁCH PRESET
-        # ===============================================================
-        preset_ids = []
-        try:
-            r = requests.get(f"http://{ip}/presets.json", timeout=2)
-            if r.status_code == 200:
-                presets = r.json()
-                preset_ids = sorted(
-                    int(k) for k in presets.keys()
-                    if k.isdigit() and int(k) >= 1
-                )
-        except:
-            pass
+            # ===============================================================
+            # ⭐ 2️⃣ LẤY DANH SÁCH PRESET
+            # ===============================================================
+            preset_ids = []
+            try:
+                r = get_client(ip).get("/presets.json")
+                if r.status_code == 200:
+                    presets = r.json()
+                    preset_ids = sorted(
+                        int(k) for k in presets.keys()
+                        if k.isdigit() and int(k) >= 1
+                    )
+            except:
+                pass
+            return preset_ids
 
-        # ===============================================================
-        # ⭐ 3️⃣ XÓA PRESET (CÓ PROGRESS)
-        # ===============================================================
-        if preset_ids:
-            progress = QProgressDialog(
-                "🧹 Đang xóa preset...",
-                "Hủy",
-                0,
-                len(preset_ids),
-                self
-            )
-            progress.setWindowTitle("Xóa Preset")
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setMinimumDuration(0)
-            progress.setValue(0)
+        def failed(e):
+            if isinstance(e, DeviceOffline):
+                QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
+            else:
+                QMessageBox.critical(self, "Lỗi", str(e))
+
+        run_task(
+            fetch,
+            on_done=lambda preset_ids: self._fn2_delete_presets(ip, preset_ids),
+            on_error=failed
+        )
+
+    # ===============================================================
+    # ⭐ 3️⃣ XÓA PRESET (CÓ PROGRESS)
+    # ===============================================================
+    def _fn2_delete_presets(self, ip, preset_ids):
+        if not preset_ids:
+            self._fn2_ask_delete_bmp(ip)
+            return
+
+        def work(task):
+            client = get_client(ip)
 
             try:
                 # đưa về trạng thái an toàn
-                requests.post(f"http://{ip}/json/state", json={"ps": 0}, timeout=2)
-                requests.post(f"http://{ip}/json/state", json={"on": False}, timeout=2)
+                client.post_state({"ps": 0})
+                client.post_state({"on": False})
             except:
                 pass
 
-            failed = []
+            total = len(preset_ids)
 
-            for idx, pid in enumerate(preset_ids, start=1):
-                if progress.wasCanceled():
-                    progress.close()
-                    QMessageBox.information(self, "Đã hủy", "⛔ Người dùng đã hủy xóa preset.")
-                    return
-
-                progress.setLabelText(f"🧹 Xóa preset {pid} ({idx}/{len(preset_ids)})")
-                QApplication.processEvents()
-
-                try:
-                    r = requests.post(
-                        f"http://{ip}/json/state",
-                        json={"pdel": pid},
-                        timeout=2
-                    )
-                    if r.status_code != 200:
-                        failed.append(pid)
-                except:
-                    failed.append(pid)
+            # song song, tự tăng/giảm số request theo độ trễ + lỗi của mạch
+            def progress(processed, pid, limit):
+                if limit:
+                    info = f"🧹 Xóa preset {pid} ({processed}/{total}) — {limit} luồng"
+                else:
+                    info = f"🔁 Thử lại preset {pid}"
+                task.report(processed, info)
 
-                progress.setValue(idx)
-                QApplication.processEvents()
+            failed = wipe_presets(
+                client, preset_ids,
+                on_progress=progress,
+                cancelled=lambda: task.is_cancelled
+            )
+            task.check()
+            return failed
+
+        self._run_with_progress(
+            "Xóa Preset",
+            "🧹 Đang xóa preset...",
+            len(preset_ids),
+            work,
+            on_done=lambda failed: self._fn2_presets_done(ip, preset_ids, failed),
+            cancel_msg="⛔ Người dùng đã hủy xóa preset."
+        )
 
-            progress.close()
+    def _fn2_presets_done(self, ip, preset_ids, failed):
+        if failed:
+            QMessageBox.warning(
+                self,
+                "Xóa preset chưa hoàn tất",
+                "Một số preset không xóa được:\n" + ", ".join(map(str, failed))
+            )
+        else:
+            QMessageBox.information(
+                self,
+                "Preset đã xóa",
+                f"🎉 Đã xóa {len(preset_ids)} preset thành công!"
+            )
 
-            if failed:
-                QMessageBox.warning(
-                    self,
-                    "Xóa preset chưa hoàn tất",
-                    "Một số preset không xóa được:\n" + ", ".join(map(str, failed))
-                )
-            else:
-                QMessageBox.information(
-                    self,
-                    "Preset đã xóa",
-                    f"🎉 Đã xóa {len(preset_ids)} preset thành công!"
-                )
+        self._fn2_ask_delete_bmp(ip)
 
+    def _fn2_ask_delete_bmp(self, ip):
         # ===============================================================
         # ⭐ 4️⃣ HỎI CÓ MUỐN XÓA FILE BMP KHÔNG
         # ===============================================================
-        if QMessageBox.question(
-            self,
-            "Xóa file ảnh BMP?",
-            "Bạn có muốn xóa toàn bộ file ảnh (*.bmp) trong bộ nhớ thiết bị không?",
-            QMessageBox.Yes | QMessageBox.No
-        ) != QMessageBox.Yes:
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Question)
+        box.setWindowTitle("Xóa file ảnh BMP?")
+        box.setText("Bạn có muốn xóa file ảnh (*.bmp) trong bộ nhớ thiết bị không?")
+        btn_all = box.addButton("Xóa toàn bộ BMP", QMessageBox.YesRole)
+        btn_unused = box.addButton("Chỉ BMP không preset nào dùng", QMessageBox.YesRole)
+        box.addButton("Không", QMessageBox.NoRole)
+        box.exec()
+
+        if box.clickedButton() not in (btn_all, btn_unused):
             self.refresh_device_data()
             return
 
-        # ===============================================================
-        # ⭐ 5️⃣ LẤY DANH SÁCH FILE BMP
-        # ===============================================================
-        try:
-            r = requests.get(f"http://{ip}/edit?list", timeout=3)
-
-            if r.status_code == 401:
-                self.open_pin_browser_popup(ip)
-                r = requests.get(f"http://{ip}/edit?list", timeout=3)
+        self._fn2_list_bmp(ip, unreferenced_only=box.clickedButton() is btn_unused)
 
-            if r.status_code != 200:
-                QMessageBox.critical(self, "Lỗi", f"Không lấy được danh sách file! HTTP {r.status_code}")
+    # ===============================================================
+    # ⭐ 5️⃣ LÊN DANH SÁCH FILE BMP CẦN XÓA (1 lần đọc /edit?list)
+    # ===============================================================
+    def _fn2_list_bmp(self, ip, unreferenced_only=False, pin_asked=False):
+        def done(plan):
+            if not plan:
+                QMessageBox.information(self, "Không có file BMP", "Không có file BMP để xóa.")
+                self.refresh_device_data()
                 return
 
-            files = r.json()
-            bmp_files = [
-                f["name"]
-                for f in files
-                if isinstance(f, dict)
-                and "name" in f
-                and f["name"].lower().endswith(".bmp")
-            ]
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không đọc danh sách file:\n{e}")
-            return
+            self._fn2_delete_bmp(ip, plan)
 
-        if not bmp_files:
-            QMessageBox.information(self, "Không có file BMP", "Không có file BMP để xóa.")
-            self.refresh_device_data()
-            return
+        def failed(e):
+            if isinstance(e, PinRequired) and not pin_asked:
+                self.open_pin_browser_popup(ip)
+                self._fn2_list_bmp(ip, unreferenced_only, pin_asked=True)
+                return
+            QMessageBox.critical(self, "Lỗi", f"Không đọc danh sách file:\n{e}")
 
-        # ===============================================================
-        # ⭐ 6️⃣ XÓA FILE BMP (CÓ PROGRESS)
-        # ===============================================================
-        progress = QProgressDialog(
-            "🗑️ Đang xóa file BMP...",
-            "Hủy",
-            0,
-            len(bmp_files),
-            self
+        run_task(
+            lambda task: plan_cleanup(get_client(ip), ["*.bmp"], unreferenced_only),
+            on_done=done,
+            on_error=failed
         )
-        progress.setWindowTitle("Xóa ảnh BMP")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)
-        progress.setValue(0)
-
-        failed_bmp = []
-
-        for idx, filename in enumerate(bmp_files, start=1):
-            if progress.wasCanceled():
-                progress.close()
-                QMessageBox.information(self, "Đã hủy", "⛔ Người dùng đã hủy xóa file BMP.")
-                return
 
-            progress.setLabelText(f"🗑️ Xóa {filename} ({idx}/{len(bmp_files)})")
-            QApplication.processEvents()
+    # ===============================================================
+    # ⭐ 6️⃣ XÓA FILE BMP (SONG SONG + KIỂM TRA LẠI 1 LẦN, CÓ PROGRESS)
+    # ===============================================================
+    def _fn2_delete_bmp(self, ip, plan):
+        bmp_files = list(plan)
+        total = len(bmp_files)
+
+        def work(task):
+            def progress(processed, filename, limit):
+                task.report(processed, f"🗑️ Xóa {filename} ({processed}/{total})")
+
+            remaining = delete_files(
+                get_client(ip), bmp_files,
+                on_progress=progress,
+                cancelled=lambda: task.is_cancelled
+            )
+            task.check()
+            return remaining
 
-            try:
-                rr = requests.get(
-                    f"http://{ip}/edit",
-                    params={"func": "delete", "path": filename},
-                    timeout=3
+        def done(remaining):
+            if remaining:
+                QMessageBox.warning(
+                    self,
+                    "Xóa ảnh chưa hoàn tất",
+                    "Một số file BMP không xóa được:\n" + "\n".join(remaining)
+                )
+            else:
+                freed = sum(plan.values()) / 1024
+                QMessageBox.information(
+                    self,
+                    "Hoàn tất",
+                    f"🎉 Đã xóa {total} file BMP thành công! (giải phóng {freed:.1f} KB)"
                 )
-                if rr.status_code != 200:
-                    failed_bmp.append(filename)
-            except:
-                failed_bmp.append(filename)
-
-            progress.setValue(idx)
-            QApplication.processEvents()
-
-        progress.close()
 
-        if failed_bmp:
-            QMessageBox.warning(
-                self,
-                "Xóa ảnh chưa hoàn tất",
-                "Một số file BMP không xóa được:\n" + "\n".join(failed_bmp)
-            )
-        else:
-            QMessageBox.information(
-                self,
-                "Hoàn tất",
-                f"🎉 Đã xóa toàn bộ {len(bmp_files)} file BMP thành công!"
-            )
+            self.refresh_device_data()
 
-        self.refresh_device_data()
+        self._run_with_progress(
+            "Xóa ảnh BMP",
+            "🗑️ Đang xóa file BMP...",
+            total,
+            work,
+            on_done=done,
+            cancel_msg="⛔ Người dùng đã hủy xóa file BMP."
+        )
 
 
     # ====================
@@ -1366,10 +1673,15 @@ class BMPConverter(QWidget):
             return
 
         # 1️⃣ Kiểm tra online
-        if not self._is_device_online(ip):
-            QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
-            return
+        def done(online):
+            if not online:
+                QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
+                return
+            self._fn_reboot_confirmed(ip)
+
+        run_task(lambda task: self._is_device_online(ip), on_done=done)
 
+    def _fn_reboot_confirmed(self, ip):
         # -----------------------------
         # XÁC MINH LẦN 1
         # -----------------------------
@@ -1398,24 +1710,30 @@ class BMPConverter(QWidget):
         if confirm_2 != QMessageBox.Yes:
             return
 
-        # 2️⃣ Tắt LED trước khi reboot
-        try:
-            requests.post(
-                f"http://{ip}/json/state",
-                json={"on": False},
-                timeout=2
-            )
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                "Lỗi",
-                f"Lỗi khi tắt LED:\n{e}"
-            )
-            return
+        def work(task):
+            client = get_client(ip)
 
-        # 3️⃣ Gửi lệnh reset
-        try:
-            r = requests.get(f"http://{ip}/reset", timeout=2)
+            # 2️⃣ Tắt LED trước khi reboot (lỗi → báo ở on_error)
+            client.post_state({"on": False})
+
+            # Thiết bị sắp reboot → bỏ toàn bộ cache
+            self._snapshot(ip).invalidate()
+
+            # 3️⃣ Gửi lệnh reset
+            try:
+                return client.get("/reset", "state")
+            except Exception:
+                # Thiết bị ngắt kết nối khi reboot → hành vi bình thường
+                return None
+
+        def done(r):
+            if r is None:
+                QMessageBox.information(
+                    self,
+                    "Đang khởi động lại",
+                    "Thiết bị đã nhận lệnh reset và đang khởi động lại..."
+                )
+                return
 
             # WLED thường trả 200 hoặc 302 Redirect
             if r.status_code not in (200, 302):
@@ -1426,20 +1744,17 @@ class BMPConverter(QWidget):
                 )
                 return
 
-        except Exception:
-            # Thiết bị ngắt kết nối khi reboot → hành vi bình thường
+            # 4️⃣ Nếu request không lỗi
             QMessageBox.information(
                 self,
-                "Đang khởi động lại",
-                "Thiết bị đã nhận lệnh reset và đang khởi động lại..."
+                "Hoàn tất",
+                "Thiết bị đã được tắt LED và khởi động lại thành công!"
             )
-            return
 
-        # 4️⃣ Nếu request không lỗi
-        QMessageBox.information(
-            self,
-            "Hoàn tất",
-            "Thiết bị đã được tắt LED và khởi động lại thành công!"
+        run_task(
+            work,
+            on_done=done,
+            on_error=lambda e: QMessageBox.critical(self, "Lỗi", f"Lỗi khi tắt LED:\n{e}")
         )
 
 
@@ -1462,24 +1777,19 @@ class BMPConverter(QWidget):
             QMessageBox.warning(self, "Chưa chọn mạch", "Vui lòng chọn mạch ARGB hợp lệ.")
             return
 
-        # ⭐ KIỂM TRA ONLINE TRƯỚC
-        if not self._is_device_online(ip):
-            QMessageBox.critical(
-                self,
-                "Không kết nối",
-                f"Không thể tắt LED vì thiết bị {ip} không phản hồi.\n"
-                "Thiết bị có thể đã tắt nguồn hoặc mất WiFi."
-            )
+        if self._group_mode():
+            self._fan_out_state({"on": False}, "Tắt LED", notify=True)
             return
 
-        # ⭐ THIẾT BỊ ONLINE → gửi lệnh tắt
-        try:
-            url_state = f"http://{ip}/json/state"
-            json_payload = {"on": False}
+        def work(task):
+            # ⭐ KIỂM TRA ONLINE TRƯỚC
+            self._require_online(ip)
 
-            r = requests.post(url_state, json=json_payload, timeout=3)
+            # ⭐ THIẾT BỊ ONLINE → gửi lệnh tắt (đã tắt sẵn → None, không gửi)
+            return self._snapshot(ip).post_state({"on": False})
 
-            if r.status_code == 200:
+        def done(r):
+            if r is None or r.status_code == 200:
                 QMessageBox.information(self, "OK", "Đã tắt LED ARGB thành công!")
             else:
                 QMessageBox.warning(
@@ -1488,98 +1798,364 @@ class BMPConverter(QWidget):
                     f"Tắt LED thất bại!\nHTTP {r.status_code}"
                 )
 
-        except Exception as e:
+        def failed(e):
+            if isinstance(e, DeviceOffline):
+                QMessageBox.critical(
+                    self,
+                    "Không kết nối",
+                    f"Không thể tắt LED vì thiết bị {ip} không phản hồi.\n"
+                    "Thiết bị có thể đã tắt nguồn hoặc mất WiFi."
+                )
+                return
+
             QMessageBox.critical(
                 self,
                 "Lỗi",
                 f"Không thể gửi lệnh tắt LED:\n{e}"
             )
 
+        run_task(work, on_done=done, on_error=failed)
+
 
     # ====================
-    # Scan ARGB qua mDNS (không cần subnet)
+    # Live: stream ảnh preview qua UDP (DDP) tới mạch / cả nhóm
     # ====================
-    def scan_argb_mdns(self):
+    def toggle_live(self, on):
+        if not on:
+            self.stop_live()
+            return
+
+        ip = self.combo_ip.currentData()
+        if self.loaded_image is None or not ip:
+            QMessageBox.warning(self, "Chưa sẵn sàng", "Vui lòng mở ảnh và chọn mạch trước.")
+            self.btn_live.setChecked(False)
+            return
+
+        w = self._get_target_width()
+        targets = list(self.group_ips) if self._group_mode() else [ip]
+
+        def fetch(task):
+            # số LED của mạch đầu tiên (POI: 1 dải → mỗi dòng ảnh 1 frame)
+            return (self._snapshot(targets[0]).info.get("leds") or {}).get("count")
+
+        def failed(e):
+            self.btn_live.setChecked(False)
+            QMessageBox.critical(self, "Không online", f"Mạch ARGB {targets[0]} không phản hồi!\n{e}")
+
+        run_task(fetch, on_done=lambda leds: self._start_live(targets, w, leds), on_error=failed)
+
+    def _start_live(self, targets, w, leds):
+        from live_stream import LiveStreamer, image_frames, target_address
+        if not self.btn_live.isChecked():
+            return   # đã tắt trong lúc chờ
+
+        self.live_leds = leds
+        self.live = LiveStreamer(
+            [target_address(ip) for ip in targets],
+            image_frames(self._convert_loaded(w), leds),
+            fps=self.spin_fps.value()
+        )
+        self.live.start()
+        self.btn_live.setText(f"⏹ Live ({len(targets)})")
+        print(f"[Live] DDP → {', '.join(targets)} @ {self.live.fps} fps, {leds or w} LED")
+
+    def stop_live(self):
+        if self.live is not None:
+            print(f"[Live] Dừng: {self.live.sent} frame, ~{self.live.actual_fps:.0f} fps, trễ lịch {self.live.late}")
+            self.live.stop()
+            self.live = None
+        self.btn_live.setText("📡 Live")
+
+    # ====================
+    # Nhóm mạch + gửi song song (fan-out)
+    # ====================
+    def _group_mode(self):
+        return self.chk_group.isChecked() and bool(self.group_ips)
+
+    def _update_group_label(self):
+        self.chk_group.setText(f"Cả nhóm ({len(self.group_ips)})")
+        self.chk_group.setEnabled(bool(self.group_ips))
+        if not self.group_ips:
+            self.chk_group.setChecked(False)
+
+    def edit_device_group(self):
+        dlg = QDialog(self)
+        dlg.setWindowTitle("👥 Nhóm mạch trình diễn")
+        layout = QVBoxLayout(dlg)
+        layout.addWidget(QLabel("Chọn các mạch nhận lệnh cùng lúc:"))
+
+        lst = QListWidget()
+        entries = [
+            (self.combo_ip.itemData(i), self.combo_ip.itemText(i))
+            for i in range(self.combo_ip.count())
+            if self.combo_ip.itemData(i)
+        ]
+        # mạch trong nhóm nhưng hiện không thấy trên mạng vẫn giữ
+        seen = {ip for ip, _ in entries}
+        entries += [(ip, f"{ip} (chưa thấy)") for ip in self.group_ips if ip not in seen]
+
+        for ip, text in entries:
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, ip)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if ip in self.group_ips else Qt.Unchecked)
+            lst.addItem(item)
+        layout.addWidget(lst)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dlg.accept)
+        buttons.rejected.connect(dlg.reject)
+        layout.addWidget(buttons)
+
+        if dlg.exec() != QDialog.Accepted:
+            return
+
+        self.group_ips = [
+            lst.item(i).data(Qt.UserRole)
+            for i in range(lst.count())
+            if lst.item(i).checkState() == Qt.Checked
+        ]
+        save_group(self.group_ips)
+        self._update_group_label()
+        if self.group_ips:
+            self.chk_group.setChecked(True)
+
+    def _show_fanout_result(self, title, results, extra=""):
+        ok, total, slowest = fanout_summary(results)
+        text = (
+            f"{ok}/{total} mạch thành công — chậm nhất {slowest * 1000:.0f} ms\n\n"
+            + "\n".join(r.describe() for r in results.values())
+            + extra
+        )
+        if ok == total:
+            QMessageBox.information(self, title, text)
+        else:
+            QMessageBox.warning(self, title, text)
+
+    def _fan_out_state(self, payload, title, notify=False):
+        targets = list(self.group_ips)
+
+        def work(task):
+            for ip in targets:
+                self._snapshot(ip)   # tạo trước để nhận state từ response
+            # mỗi mạch chỉ nhận phần khác state của nó, đã đúng → bỏ qua
+            return post_state_all(targets, payload,
+                                  prepare=lambda ip, p: self._snapshot(ip).patch_for(p))
+
+        def done(results):
+            ok, total, slowest = fanout_summary(results)
+            print(f"[Nhóm] {title}: {ok}/{total} mạch OK, chậm nhất {slowest * 1000:.0f} ms")
+            # lệnh click liên tục (effect/palette) chỉ báo khi có mạch lỗi
+            if notify or ok < total:
+                self._show_fanout_result(title, results)
+
+        run_task(work, on_done=done, on_error=lambda e: QMessageBox.critical(self, "Lỗi", str(e)))
+
+    def _fan_out_image(self, upload_filename, bmp_data, payload, width, sync):
+        targets = list(self.group_ips)
+
+        def work(task):
+            def on_result(res):
+                task.report(len(done_ips) + 1, res.describe())
+                done_ips.append(res.ip)
+
+            done_ips = []
+            return send_image_all(targets, upload_filename, bmp_data, payload, width, sync, on_result)
+
+        def done(results):
+            skipped = [ip for ip, r in results.items() if r.ok and not r.value]
+            extra = f"\n\n⏭ Đã có sẵn ảnh, không upload lại: {', '.join(skipped)}" if skipped else ""
+            self._show_fanout_result(f"Gửi {upload_filename} tới nhóm", results, extra)
+            self.refresh_device_data()
+
+        self._run_with_progress(
+            "📤 Gửi ảnh tới cả nhóm",
+            f"Đang gửi tới {len(targets)} mạch...",
+            len(targets),
+            work,
+            on_done=done,
+            cancel_msg="⛔ Người dùng đã hủy gửi ảnh.",
+            error_title="Lỗi Upload"
+        )
+
+    # ====================
+    # Tìm mạch: mDNS chạy nền suốt phiên, cập nhật combo từng mạch một
+    # ====================
+    def _start_discovery(self):
+        # gọi sau khi cửa sổ đã hiện: điền ngay danh sách mạch đã lưu
+        from discovery import DiscoveryService
+        self._start_telemetry()
+        self.discovery = DiscoveryService(
+            on_found=self.device_signals.found.emit,
+            on_lost=self.device_signals.lost.emit
+        )
+        for ip, dev in self.discovery.known.items():
+            self._on_device_found(ip, dev.get("name", "ARGB"))
+
+        self.discovery.reconcile()
         try:
-            from zeroconf import Zeroconf, ServiceBrowser
+            self.discovery.start()
         except ImportError:
+            print("[mDNS] Chưa cài zeroconf, chỉ dùng danh sách mạch đã lưu")
+
+    def stop_discovery(self):
+        if self.discovery is not None:
+            self.discovery.stop()
+
+    def scan_argb_mdns(self):
+        # chỉ kiểm tra đã cài chưa, chưa nạp zeroconf ở đây
+        import importlib.util
+        if importlib.util.find_spec("zeroconf") is None:
             QMessageBox.warning(
                 self, "Thiếu thư viện",
                 "Bạn cần cài đặt zeroconf:\n\npip install zeroconf"
             )
             return
 
-        self.combo_ip.clear()
-        self.combo_ip.addItem("Đang quét ARGB...")
-        QApplication.processEvents()
-
-        found_devices = {}  # ip -> name
-
-        class WledListener:
-            def add_service(self, zeroconf, type, name):
-                info = zeroconf.get_service_info(type, name)
-                if not info or not info.addresses:
-                    return
-
-                ip_bytes = info.addresses[0]
-                ip = ".".join(str(b) for b in ip_bytes)
-
-                if ip in found_devices:
-                    return
-
-                try:
-                    r = requests.get(f"http://{ip}/json", timeout=0.3)
-                    if r.status_code != 200:
-                        return
+        if self.discovery is None:
+            self._start_discovery()
+        else:
+            # gửi truy vấn mDNS mới + kiểm tra lại các mạch đang có
+            self.discovery.rescan()
+
+    def _device_index(self, ip):
+        for i in range(self.combo_ip.count()):
+            if self.combo_ip.itemData(i) == ip:
+                return i
+        return -1
+
+    def _on_device_found(self, ip, dev_name):
+        text = f"{dev_name} ({ip})"
+        idx = self._device_index(ip)
+        if idx >= 0:
+            self.combo_ip.setItemText(idx, text)
+            return
 
-                    j = r.json()
-                    info_j = j.get("info", {})
+        print(f"[mDNS] Phát hiện ARGB HSL: {ip} ({dev_name})")
+        if self.telemetry is not None:
+            self.telemetry.watch(ip)
+        first = self.combo_ip.count() == 0
+        self.combo_ip.addItem(text, userData=ip)
 
-                    # ⚠️ đúng theo firmware HSL của bạn
-                    if info_j.get("name") and info_j.get("repo") == "HappySmartLight":
-                        dev_name = info_j.get("name", "ARGB")
-                        found_devices[ip] = dev_name
-                        print(f"[mDNS] Phát hiện ARGB HSL: {ip} ({dev_name})")
+        # ⭐ mạch đầu tiên → tự chọn + refresh data
+        if first:
+            self.combo_ip.setCurrentIndex(0)
 
-                except Exception as e:
-                    print(f"[mDNS] Lỗi kiểm tra JSON từ {ip}: {e}")
+    def _on_device_lost(self, ip):
+        idx = self._device_index(ip)
+        # không gỡ mạch đang chọn (người dùng có thể đang thao tác)
+        if idx >= 0 and idx != self.combo_ip.currentIndex():
+            self.combo_ip.removeItem(idx)
+            if self.telemetry is not None:
+                self.telemetry.unwatch(ip)
 
-            def remove_service(self, zeroconf, type, name):
-                pass
+    # ====================
+    # State mạch qua WebSocket: mạch đẩy về mỗi khi đổi (cả từ web UI / nút trên mạch)
+    # ====================
+    def _watch_state(self, ip):
+        from state_channel import StateChannel
+        if self.state_channel is not None:
+            if self.state_channel.ip == ip:
+                return
+            self.stop_state_channel()
 
-            def update_service(self, zeroconf, type, name):
-                pass
+        channel = StateChannel(ip, on_message=self.device_signals.state.emit)
+        try:
+            channel.start()
+        except ImportError:
+            if not getattr(self, "_ws_warned", False):
+                print("[WS] Chưa cài websocket-client (pip install websocket-client), đọc state qua HTTP")
+                self._ws_warned = True
+            return
+        self.state_channel = channel
 
-        zeroconf = Zeroconf()
-        listener = WledListener()
-        browser = ServiceBrowser(zeroconf, "_wled._tcp.local.", listener)
+    def stop_state_channel(self):
+        channel, self.state_channel = self.state_channel, None
+        if channel is not None:
+            channel.stop()
+            self._snapshot(channel.ip).set_live("state", False)
 
-        def finish_scan():
-            zeroconf.close()
-            self.combo_ip.clear()
+    def _on_state_push(self, ip, data):
+        if self.state_channel is None or self.state_channel.ip != ip:
+            return   # channel cũ (vừa đổi mạch)
 
-            if found_devices:
-                for ip, dev_name in found_devices.items():
-                    self.combo_ip.addItem(f"{dev_name} ({ip})", userData=ip)
+        snap = self._snapshot(ip)
+        if data is None:
+            snap.set_live("state", False)
+            return
 
-                # ⭐ TỰ ĐỘNG CHỌN THIẾT BỊ ĐẦU TIÊN
-                self.combo_ip.setCurrentIndex(0)
+        snap.update_from_json(data)
+        snap.set_live("state")
+        if ip == self.combo_ip.currentData():
+            self._highlight_state(data["state"])
 
-                # # ⭐ GỌI LOAD INFO NGAY
-                # self.load_device_info()
-                # # ⭐ LOAD EFFECT + PRESET
-                # self.load_effect_list()
-                # # ⭐ LOAD PRESET
-                # self.load_preset_list()
-                # ⭐ refresh data
-                self.refresh_device_data()
+    # ====================
+    # Theo dõi sức khỏe mạch chạy nền (chỉ /json/info, tự giãn / dày lịch hỏi)
+    # ====================
+    def _start_telemetry(self):
+        from telemetry import TelemetryMonitor
+        if self.telemetry is None:
+            self.telemetry = TelemetryMonitor(on_sample=self.device_signals.health.emit)
+            for i in range(self.combo_ip.count()):
+                if self.combo_ip.itemData(i):
+                    self.telemetry.watch(self.combo_ip.itemData(i))
+            self.telemetry.start()
+
+    def stop_telemetry(self):
+        if self.telemetry is not None:
+            self.telemetry.stop()
+
+    def _show_health(self, ip):
+        # đổi mạch đang chọn → vẽ lại toàn bộ từ lịch sử đã có
+        if self.telemetry is None:
+            return
+        self.telemetry.watch(ip)
+        health = self.telemetry.health(ip)
+        if health is not None and health.samples:
+            self._render_health(health)
+        else:
+            self.lbl_health.setText("📡 Đang theo dõi...")
+            self.lbl_health.setToolTip("")
 
-            else:
-                self.combo_ip.addItem("Không tìm thấy mạch ARGB HSL")
+    def _on_health(self, ip, health, changed):
+        if health.samples[-1].ok:
+            # /json/info mới → các panel khác khỏi đọc lại
+            self._snapshot(ip).update_from_json({"info": health.info})
 
-        QTimer.singleShot(2000, finish_scan)
+        if ip != self.combo_ip.currentData():
+            return
 
+        # chỉ vẽ lại nhãn có trường vừa đổi
+        if changed.keys() & {"name", "ver", "rssi", "fs"}:
+            self._render_device_info(ip, health.info)
+        if changed.keys() & {"online", "latency", "free", "warnings"}:
+            self._render_health(health)
+        else:
+            self.lbl_health.setToolTip(self._health_tooltip(health))
 
+    def _render_health(self, health):
+        f = health.fields
+        if not f.get("online"):
+            text = "📡 ❌ Không phản hồi"
+        else:
+            text = f"📡 Trễ: {f.get('latency', 0)} ms"
+            if f.get("free") is not None:
+                text += f"  •  💾 Trống: {f['free'] // 1024} KB"
+
+        for w in f.get("warnings", ()):
+            text += f"\n⚠️ {w}"
+
+        self.lbl_health.setText(text)
+        self.lbl_health.setToolTip(self._health_tooltip(health))
+
+    def _health_tooltip(self, health):
+        lat = health.latencies()
+        if not lat:
+            return ""
+        return (
+            f"Độ trễ {len(lat)} mẫu gần nhất: {health.sparkline()}\n"
+            f"min {min(lat):.0f} / max {max(lat):.0f} ms — hỏi mỗi {health.interval:.1f} s"
+        )
 
     # ====================
     # Contact
@@ -1638,21 +2214,12 @@ class BMPConverter(QWidget):
     # ====================
     # Logic crop + resize
     # ====================
-    def _center_crop_square(self, im: Image.Image) -> Image.Image:
-        w, h = im.size
-        if w == h:
-            return im
-        if w > h:
-            left = (w - h)//2
-            return im.crop((left, 0, left + h, h))
-        else:
-            top = (h - w)//2
-            return im.crop((0, top, w, top + w))
-
-    def _convert_to_square_rgb(self, width: int, img: Image.Image):
-        im_sq = self._center_crop_square(img)
-        im_sq = im_sq.resize((width, width), Image.LANCZOS)
-        return im_sq.convert("RGB")
+    # Dùng chung image_utils với batch_convert → kết quả giống hệt nhau
+    # Ảnh đang mở: preview → lưu → gửi chỉ resize 1 lần
+    def _convert_loaded(self, width: int):
+        from image_cache import shared_cache, image_key
+        key = self.loaded_key or image_key(self.loaded_image)
+        return shared_cache.convert_image(key, width, self.loaded_image)
 
     def _get_target_width(self):
         try:
@@ -1695,24 +2262,30 @@ class BMPConverter(QWidget):
         )
         if not file:
             return
+
+        from PIL import Image
+        from image_utils import draft_for_width
+        from image_cache import file_key
         try:
             img = Image.open(file)
+            src_w, src_h = img.size
+
+            # Chỉ decode ở độ phân giải vừa đủ cho POI (JPEG lớn nhanh hơn nhiều)
+            draft_for_width(img)
             self.input_path = file
             self.loaded_image = img.copy()
             img.close()
+            self.loaded_key = file_key(file)
 
             # ====== GÁN THÔNG TIN CHO PREVIEW ======
             # ảnh gốc
             self.lbl_preview.source_name = os.path.basename(file)
-            self.lbl_preview.source_size = (
-                self.loaded_image.width,
-                self.loaded_image.height
-            )
+            self.lbl_preview.source_size = (src_w, src_h)
             # ======================================
 
             self.lbl_info.setText(
                 f"Đã tải: {os.path.basename(file)} — "
-                f"kích thước {self.loaded_image.width}x{self.loaded_image.height}"
+                f"kích thước {src_w}x{src_h}"
             )
 
             self.preview_convert()
@@ -1731,14 +2304,18 @@ class BMPConverter(QWidget):
         if not w:
             return
 
-        im2 = self._convert_to_square_rgb(w, self.loaded_image)
+        im2 = self._convert_loaded(w)
         qimg = self._image_to_qpixmap(im2).toImage()
         self.lbl_preview.setImage(qimg)
         self.index_bar.setCount(im2.width)
 
+        if self.live is not None:
+            from live_stream import image_frames
+            self.live.set_frames(image_frames(im2, self.live_leds))
+
 
 
-    def _image_to_qpixmap(self, im: Image.Image):
+    def _image_to_qpixmap(self, im):
         data = im.tobytes("raw", "RGB")
         qimg = QImage(data, im.width, im.height, im.width * 3, QImage.Format_RGB888)
         return QPixmap.fromImage(qimg)
@@ -1746,16 +2323,32 @@ class BMPConverter(QWidget):
     # ====================
     # Save BMP (kèm dung lượng + khuyến nghị)
     # ====================
+    # Dung lượng BMP biết trước từ width → hỏi trước khi ghi file quá lớn
+    def _confirm_bmp_size(self, w):
+        from flash_planner import bmp_size
+        from image_utils import POI_MAX_BYTES
+        size = bmp_size(w)
+        if size < POI_MAX_BYTES:
+            return True
+        return QMessageBox.question(
+            self,
+            "File quá lớn",
+            f"BMP {w}x{w} sẽ nặng {size/1024:.1f} KB, vượt giới hạn "
+            f"{POI_MAX_BYTES // 1024} KB của POI HSL.\nVẫn tiếp tục?",
+            QMessageBox.Yes | QMessageBox.No
+        ) == QMessageBox.Yes
+
     def save_as_bmp(self):
+        from image_utils import POI_MAX_BYTES
         if self.loaded_image is None:
             QMessageBox.warning(self, "Chưa có ảnh", "Vui lòng mở ảnh trước.")
             return
 
         w = self._get_target_width()
-        if not w:
+        if not w or not self._confirm_bmp_size(w):
             return
 
-        im2 = self._convert_to_square_rgb(w, self.loaded_image)
+        im2 = self._convert_loaded(w)
 
         default_name = os.path.splitext(os.path.basename(self.input_path))[0] + ".bmp"
 
@@ -1785,7 +2378,7 @@ class BMPConverter(QWidget):
                 human = f"{size_bytes/1024/1024:.2f} MB"
 
             # ==== đánh giá POI ====
-            if size_bytes < 63 * 1024:
+            if size_bytes < POI_MAX_BYTES:
                 comment = "<font color='green'><b>Sử dụng tốt cho POI HSL ✓</b></font>"
             else:
                 comment = "<font color='red'><b>⚠ Không phù hợp cho POI HSL (file quá lớn)</b></font>"
@@ -1817,6 +2410,8 @@ class BMPConverter(QWidget):
     # Convert multiple files
     # ====================
     def convert_multiple(self):
+        from image_utils import POI_MAX_BYTES
+        from batch_convert import iter_convert
         files, _ = QFileDialog.getOpenFileNames(
             self,
             "Chọn nhiều ảnh",
@@ -1826,7 +2421,7 @@ class BMPConverter(QWidget):
             return
 
         w = self._get_target_width()
-        if not w:
+        if not w or not self._confirm_bmp_size(w):
             return
 
         out_dir = QFileDialog.getExistingDirectory(
@@ -1836,19 +2431,18 @@ class BMPConverter(QWidget):
         if not out_dir:
             return
 
-        report = []   # danh sách thông tin
+        # ==== convert song song trên process pool, nhận kết quả dần ====
+        def work(task):
+            report = {}   # src -> dòng thông tin
+
+            results = iter_convert(files, out_dir, w, cancelled=lambda: task.is_cancelled)
+            for done_count, (src, name, size_bytes, error) in enumerate(results, start=1):
+                task.report(done_count, f"🖼 Đã chuyển {done_count}/{len(files)}\n{name}")
+
+                if error:
+                    report[src] = f"<b>{os.path.basename(src)}</b> — <font color='red'>Lỗi: {error}</font>"
+                    continue
 
-        for f in files:
-            try:
-                im = Image.open(f)
-                im2 = self._convert_to_square_rgb(w, im)
-                name = os.path.splitext(os.path.basename(f))[0] + ".bmp"
-                out_path = os.path.join(out_dir, name)
-                im2.save(out_path, "BMP")
-
-                # ==== size ====
-                size_bytes = os.path.getsize(out_path)
-                
                 # format đẹp
                 if size_bytes < 1024:
                     sz = f"{size_bytes} bytes"
@@ -1858,16 +2452,18 @@ class BMPConverter(QWidget):
                     sz = f"{size_bytes/1024/1024:.2f} MB"
 
                 # đánh giá
-                if size_bytes < 63 * 1024:
+                if size_bytes < POI_MAX_BYTES:
                     status = "<font color='green'>✓ Hợp lệ cho POI</font>"
                 else:
                     status = "<font color='red'>⚠ Quá lớn, không phù hợp</font>"
 
-                report.append(f"<b>{name}</b> ({sz}) — {status}")
+                report[src] = f"<b>{name}</b> ({sz}) — {status}"
 
-            except Exception as e:
-                report.append(f"<b>{os.path.basename(f)}</b> — <font color='red'>Lỗi: {e}</font>")
+            task.check()
+            # giữ đúng thứ tự file người dùng chọn
+            return [report[f] for f in files if f in report]
 
+        def done(report):
             html = "<br>".join(report)
 
             msg = QMessageBox(self)
@@ -1888,9 +2484,22 @@ class BMPConverter(QWidget):
             if msg.clickedButton() == btn_open:
                 QDesktopServices.openUrl(QUrl.fromLocalFile(out_dir))
 
+        self._run_with_progress(
+            "Chuyển nhiều ảnh",
+            "🖼 Đang chuyển ảnh...",
+            len(files),
+            work,
+            on_done=done,
+            cancel_msg="⛔ Người dùng đã hủy chuyển ảnh."
+        )
+
     # ====================
     # Gửi BMP đến ARGB và cập nhật trạng thái
     def send_to_argb(self):
+        from image_utils import encode_bmp
+        from upload_pipeline import make_preset_name, image_preset_payload
+        from file_sync import DeviceSync
+        from flash_planner import plan_batch
         if self.loaded_image is None:
             QMessageBox.warning(self, "Chưa có ảnh", "Vui lòng mở ảnh trước.")
             return
@@ -1901,31 +2510,11 @@ class BMPConverter(QWidget):
             QMessageBox.warning(self, "Chưa chọn mạch", "Vui lòng chọn mạch ARGB hợp lệ.")
             return
 
-        # ⭐ KIỂM TRA KẾT NỐI TRƯỚC
-        if not self._is_device_online(ip):
-            QMessageBox.critical(
-                self,
-                "Thiết bị không online",
-                f"Không thể kết nối đến {ip}.\nThiết bị có thể đã tắt nguồn hoặc mất WiFi."
-            )
-            return
-
         # ======================
         # 🧩 A) TẠO TÊN PRESET TỪ TÊN FILE ẢNH GỐC
         # ======================
-        import re
-
-        base_name = os.path.basename(self.input_path)            # vd: logo_hsl_demo.png
-        name_no_ext = os.path.splitext(base_name)[0]             # logo_hsl_demo
-
-        # chỉ giữ ký tự an toàn
-        safe_name = re.sub(r"[^a-zA-Z0-9_-]", "_", name_no_ext)
-
-        # giới hạn 20 ký tự
-        preset_name = safe_name[:20] if len(safe_name) > 20 else safe_name
-        if not preset_name:
-            preset_name = "Preset_1"
-
+        # vd: logo_hsl_demo.png → logo_hsl_demo
+        preset_name = make_preset_name(self.input_path, "Preset_1")
         upload_filename = preset_name + ".bmp"   # tên file BMP upload
 
         # ======================
@@ -1935,92 +2524,91 @@ class BMPConverter(QWidget):
         if not w:
             return
 
-        im2 = self._convert_to_square_rgb(w, self.loaded_image)
+        im2 = self._convert_loaded(w)
+        bmp_data = encode_bmp(im2)
 
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".bmp")
-        im2.save(tmp.name, "BMP")
-        tmp.close()
+        # ======================
+        # 2) JSON CẤU HÌNH + LƯU PRESET
+        # ======================
+        json_payload = image_preset_payload(upload_filename, preset_name, 1)
+        sync = self.chk_sync.isChecked()
 
-        try:
-            # ======================
-            # 1) UPLOAD FILE — HỖ TRỢ 401
-            # ======================
-            while True:
-                if not self._is_device_online(ip):
-                    QMessageBox.critical(
-                        self,
-                        "Mất kết nối",
-                        f"Thiết bị {ip} đã mất kết nối trong khi upload."
-                    )
-                    return
-
-                url_upload = f"http://{ip}/upload"
-
-                with open(tmp.name, "rb") as f:
-                    files = {
-                        "data": (upload_filename, f, "image/bmp")
-                    }
-                    try:
-                        r = requests.post(url_upload, files=files, timeout=5)
-                    except Exception:
-                        QMessageBox.critical(
-                            self,
-                            "Lỗi Upload",
-                            "Không thể upload file (Timeout / thiết bị không phản hồi)."
-                        )
-                        return
-
-                # ---- 401 PIN ----
-                if r.status_code == 401:
-                    msg = QMessageBox(self)
-                    msg.setWindowTitle("Thiết bị đang bị khóa (401)")
-                    msg.setText("Thiết bị yêu cầu mã PIN để truy cập.\nBạn muốn làm gì?")
-
-                    btn_open = msg.addButton("Mở trang PIN", QMessageBox.ActionRole)
-                    btn_retry = msg.addButton("Gửi lại", QMessageBox.AcceptRole)
-                    btn_cancel = msg.addButton("Hủy", QMessageBox.RejectRole)
-                    msg.exec()
-
-                    if msg.clickedButton() == btn_open:
-                        # QDesktopServices.openUrl(QUrl(f"http://{ip}/settings/sec"))
-                        self.open_pin_browser_popup(ip)
-                        continue
-                    elif msg.clickedButton() == btn_retry:
-                        continue
-                    else:
-                        return
-
-                elif r.status_code != 200:
-                    QMessageBox.warning(
-                        self,
-                        "Lỗi Upload",
-                        f"Upload không thành công!\nHTTP {r.status_code}"
-                    )
-                    return
+        if self._group_mode():
+            self._fan_out_image(upload_filename, bmp_data, json_payload, w, sync)
+            return
 
-                break  # upload OK
+        def work(task):
+            # ⭐ KIỂM TRA KẾT NỐI TRƯỚC
+            self._require_online(ip)
+            client = get_client(ip)
+
+            # ảnh giống hệt đã có trên mạch → khỏi upload
+            state = DeviceSync(client) if sync else None
+            if state and state.is_current(upload_filename, bmp_data):
+                if state.preset_current(1, json_payload):
+                    return None, None, True
+                return None, client.post_state(json_payload), True
+
+            # đủ chỗ trống trên flash chưa
+            existing = state.remote if state else {}
+            plan = plan_batch([upload_filename], w, self._fresh_info(ip), existing)
+            if not plan.fits:
+                raise UploadError(
+                    f"Bộ nhớ mạch không đủ: cần ~{plan.need / 1024:.0f} KB, "
+                    f"còn trống {plan.free / 1024:.0f} KB.\n"
+                    "Hãy xóa bớt ảnh / preset (FN2) rồi gửi lại."
+                )
 
             # ======================
-            # 2) POST JSON CẤU HÌNH + LƯU PRESET
+            # 1) UPLOAD FILE
             # ======================
-            url_state = f"http://{ip}/json/state"
-            json_payload = {
-                "on": True,
-                "bri": 100,
-                "seg": [
-                    {
-                        "id": 0,
-                        "on": True,
-                        "bri": 60,
-                        "n": f"/{upload_filename}",
-                        "fx": 48
-                    }
-                ],
-                "psave": 1,
-                "n": preset_name        # ⭐ TÊN PRESET RÕ RÀNG
-            }
+            try:
+                r = client.upload(upload_filename, bmp_data)
+            except Exception:
+                raise UploadError(
+                    "Không thể upload file (Timeout / thiết bị không phản hồi)."
+                )
+
+            if r.status_code != 200:
+                return r, None, False
+
+            if state:
+                state.uploaded(upload_filename, bmp_data)
+                state.save()
+
+            task.check()
+            r2 = client.post_state(json_payload)
+            return r, r2, False
+
+        def done(result):
+            r, r2, skipped = result
+
+            if skipped:
+                if r2 is not None and r2.status_code != 200:
+                    print(f"[WARN] POST JSON thất bại HTTP {r2.status_code}")
+                QMessageBox.information(
+                    self,
+                    "Hoàn tất",
+                    f"Ảnh {upload_filename} đã có trên mạch, không cần gửi lại.\n"
+                    f"Preset: {preset_name}"
+                )
+                self.refresh_device_data()
+                return
+
+            # ---- 401 PIN → hỏi rồi gửi lại ----
+            if r.status_code == 401:
+                if self._ask_pin_retry(ip, "Thiết bị yêu cầu mã PIN để truy cập.\nBạn muốn làm gì?", "Mở trang PIN"):
+                    start()
+                return
+
+            elif r.status_code != 200:
+                QMessageBox.warning(
+                    self,
+                    "Lỗi Upload",
+                    f"Upload không thành công!\nHTTP {r.status_code}"
+                )
+                return
 
-            r2 = requests.post(url_state, json=json_payload, timeout=3)
             if r2.status_code != 200:
                 print(f"[WARN] POST JSON thất bại HTTP {r2.status_code}")
 
@@ -2032,11 +2620,44 @@ class BMPConverter(QWidget):
             # Cập nhật lại danh sách preset
             self.refresh_device_data()
 
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không thể gửi BMP:\n{e}")
+        def failed(e):
+            if isinstance(e, PinRequired):
+                if self._ask_pin_retry(ip, "Thiết bị yêu cầu mã PIN để truy cập.\nBạn muốn làm gì?", "Mở trang PIN"):
+                    start()
+            elif isinstance(e, DeviceOffline):
+                QMessageBox.critical(
+                    self,
+                    "Thiết bị không online",
+                    f"Không thể kết nối đến {ip}.\nThiết bị có thể đã tắt nguồn hoặc mất WiFi."
+                )
+            elif isinstance(e, UploadError):
+                QMessageBox.critical(self, "Lỗi Upload", str(e))
+            else:
+                QMessageBox.critical(self, "Lỗi", f"Không thể gửi BMP:\n{e}")
+
+        def start():
+            run_task(work, on_done=done, on_error=failed)
+
+        start()
+
+    # ====================
+    # Thiết bị trả 401 → hỏi người dùng: nhập PIN / gửi lại / hủy
+    # Trả về True nếu cần gửi lại
+    def _ask_pin_retry(self, ip, text, open_label):
+        msg = QMessageBox(self)
+        msg.setWindowTitle("Thiết bị đang bị khóa (401)")
+        msg.setText(text)
 
-        finally:
-            os.unlink(tmp.name)
+        btn_open = msg.addButton(open_label, QMessageBox.ActionRole)
+        btn_retry = msg.addButton("Gửi lại", QMessageBox.AcceptRole)
+        msg.addButton("Hủy", QMessageBox.RejectRole)   # không cần xử lý riêng: trả False
+        msg.exec()
+
+        clicked = msg.clickedButton()
+        if clicked == btn_open:
+            self.open_pin_browser_popup(ip)
+            return True
+        return clicked == btn_retry
 
 
 
@@ -2045,13 +2666,6 @@ class BMPConverter(QWidget):
     # Gửi nhiều ảnh đến ARGB (Preset tăng dần, có Progress)
     # ====================
     def send_multiple_to_argb(self):
-        from PySide6.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
-        from PySide6.QtCore import Qt, QUrl
-        from PySide6.QtGui import QDesktopServices
-        from PIL import Image
-        import tempfile, os, requests, re
-        from PySide6.QtWidgets import QApplication
-
         # 1️⃣ Lấy IP mạch
         ip = self.combo_ip.currentData()
         if not ip:
@@ -2070,159 +2684,157 @@ class BMPConverter(QWidget):
         if not file_paths:
             return
 
-        # 4️⃣ Load ảnh PIL
-        try:
-            images = [(p, Image.open(p)) for p in file_paths]
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không thể load ảnh: {e}")
-            return
+        self._plan_multi_send(ip, w, file_paths)
 
-        total = len(images)
+    def _fresh_info(self, ip):
+        # /json/info mới nhất (dung lượng flash thay đổi sau mỗi lần gửi / xóa)
+        snap = self._snapshot(ip)
+        snap.invalidate("info")
+        return snap.info
 
-        # ====================
-        # PROGRESS DIALOG
-        progress = QProgressDialog(
-            "Chuẩn bị gửi ảnh...",
-            "Hủy",
-            0,
-            total,
-            self
-        )
-        progress.setWindowTitle("📤 Đang gửi ảnh lên ARGB")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)
-        progress.setValue(0)
-
-        # ====================
-        # 5️⃣ Gửi từng ảnh
-        for idx, (path, img) in enumerate(images, start=1):
+    # ====================
+    # 4️⃣ Tính trước dung lượng cả lượt, không đủ chỗ → hỏi cắt bớt / giảm width
+    def _plan_multi_send(self, ip, w, file_paths):
+        from upload_pipeline import make_preset_name
+        from flash_planner import plan_batch, fit_width
+        names = [
+            make_preset_name(path, f"Preset_{idx}") + ".bmp"
+            for idx, path in enumerate(file_paths, start=1)
+        ]
 
-            if progress.wasCanceled():
-                QMessageBox.information(self, "Đã hủy", "⛔ Người dùng đã hủy quá trình gửi.")
+        def work(task):
+            self._require_online(ip)
+            info = self._fresh_info(ip)
+            try:
+                existing = list_files(get_client(ip))
+            except PinRequired:
+                existing = {}   # chưa mở khóa → tính như chưa có file nào
+            return plan_batch(names, w, info, existing), fit_width(names, w, info, existing)
+
+        def done(result):
+            plan, best_w = result
+            if plan.fits:
+                self._send_images_from(ip, w, file_paths, 1)
                 return
 
-            progress.setLabelText(
-                f"📤 Đang gửi ảnh {idx}/{total}\n"
-                f"{os.path.basename(path)}"
+            count = plan.fit_count()
+            box = QMessageBox(self)
+            box.setIcon(QMessageBox.Warning)
+            box.setWindowTitle("Bộ nhớ mạch không đủ")
+            box.setText(
+                f"Gửi {len(file_paths)} ảnh {w}px cần khoảng {plan.need / 1024:.0f} KB,\n"
+                f"mạch chỉ còn trống {plan.free / 1024:.0f} KB.\n\n"
+                "Chọn cách xử lý (chưa có file nào được gửi):"
             )
-            QApplication.processEvents()
-
-            # 🧩 A) Tạo tên preset
-            base = os.path.basename(path)
-            name_no_ext = os.path.splitext(base)[0]
-            safe_name = re.sub(r"[^a-zA-Z0-9_-]", "_", name_no_ext)
-            preset_name = safe_name[:20] if len(safe_name) > 20 else safe_name
-            if not preset_name:
-                preset_name = f"Preset_{idx}"
-
-            upload_filename = preset_name + ".bmp"
-
-            while True:  # retry loop (PIN / retry)
-                tmp_file = None
-                try:
-                    # 🧩 B) Convert ảnh
-                    bmp_image = self._convert_to_square_rgb(w, img)
-
-                    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".bmp")
-                    bmp_image.save(tmp_file.name, "BMP")
-                    tmp_file.close()
-
-                    # 🧩 C) Upload BMP
-                    with open(tmp_file.name, "rb") as f:
-                        files = {"data": (upload_filename, f, "image/bmp")}
-                        r = requests.post(
-                            f"http://{ip}/upload",
-                            files=files,
-                            timeout=10
-                        )
-
-                    # --- PIN 401 ---
-                    if r.status_code == 401:
-                        msg = QMessageBox(self)
-                        msg.setWindowTitle("Thiết bị đang bị khóa (401)")
-                        msg.setText("Thiết bị yêu cầu mã PIN.\nBạn muốn làm gì?")
-                        btn_open = msg.addButton("Nhập mã PIN", QMessageBox.ActionRole)
-                        btn_retry = msg.addButton("Gửi lại", QMessageBox.AcceptRole)
-                        btn_cancel = msg.addButton("Hủy", QMessageBox.RejectRole)
-                        msg.exec()
-
-                        clicked = msg.clickedButton()
-                        if clicked == btn_open:
-                            self.open_pin_browser_popup(ip)
-                            continue
-                        elif clicked == btn_retry:
-                            continue
-                        else:
-                            progress.close()
-                            return
-
-                    elif r.status_code != 200:
-                        QMessageBox.warning(
-                            self, "Lỗi Upload",
-                            f"Upload thất bại!\nHTTP {r.status_code}"
-                        )
-                        progress.close()
-                        return
-
-                    # 🧩 D) Lưu preset
-                    payload = {
-                        "on": True,
-                        "bri": 100,
-                        "seg": [
-                            {
-                                "id": 0,
-                                "on": True,
-                                "bri": 60,
-                                "n": f"/{upload_filename}",
-                                "fx": 48
-                            }
-                        ],
-                        "psave": idx,
-                        "n": preset_name
-                    }
-
-                    r2 = requests.post(
-                        f"http://{ip}/json/state",
-                        json=payload,
-                        timeout=10
-                    )
+            btn_trim = box.addButton(f"Chỉ gửi {count} ảnh đầu", QMessageBox.AcceptRole) if count else None
+            btn_width = box.addButton(f"Giảm còn {best_w}px", QMessageBox.AcceptRole) if best_w else None
+            box.addButton("Hủy", QMessageBox.RejectRole)
+            box.exec()
+
+            clicked = box.clickedButton()
+            if btn_trim is not None and clicked == btn_trim:
+                self._send_images_from(ip, w, file_paths[:count], 1)
+            elif btn_width is not None and clicked == btn_width:
+                self._send_images_from(ip, best_w, file_paths, 1)
+
+        def failed(e):
+            if isinstance(e, DeviceOffline):
+                QMessageBox.critical(self, "Không online", f"Mạch ARGB {ip} không phản hồi!")
+            else:
+                QMessageBox.critical(self, "Lỗi", f"Không đọc được bộ nhớ mạch:\n{e}")
 
-                    if r2.status_code != 200:
-                        QMessageBox.warning(
-                            self, "Lỗi",
-                            f"Không lưu preset!\nHTTP {r2.status_code}"
-                        )
+        run_task(work, on_done=done, on_error=failed)
 
-                    break  # ✅ xong ảnh này
+    def _send_images_from(self, ip, w, file_paths, start_idx):
+        from upload_pipeline import send_images
+        sync = self.chk_sync.isChecked()
+        total = len(file_paths)
 
-                except Exception as e:
-                    QMessageBox.critical(self, "Lỗi", f"Lỗi khi gửi ảnh:\n{e}")
-                    progress.close()
-                    return
+        # ====================
+        # 5️⃣ Gửi từng ảnh (thread nền)
+        # ảnh được mở + convert ở pipeline, song song với lúc upload ảnh trước
+        def work(task):
+            def on_item(idx, path):
+                task.check()
+                task.report(
+                    idx - 1,
+                    f"📤 Đang gửi ảnh {idx}/{total}\n"
+                    f"{os.path.basename(path)}"
+                )
 
-                finally:
-                    if tmp_file and os.path.exists(tmp_file.name):
-                        os.unlink(tmp_file.name)
+            return send_images(get_client(ip), file_paths, w, start_idx, on_item, sync)
 
-            progress.setValue(idx)
-            QApplication.processEvents()
+        def done(result):
+            if result["warnings"]:
+                QMessageBox.warning(
+                    self, "Lỗi",
+                    "Không lưu preset!\n" + "\n".join(result["warnings"])
+                )
 
-        progress.close()
+            locked = result["locked"]
+            if locked is not None:
+                if self._ask_pin_retry(ip, "Thiết bị yêu cầu mã PIN.\nBạn muốn làm gì?", "Nhập mã PIN"):
+                    self._send_images_from(ip, w, file_paths, locked)
+                return
 
-        QMessageBox.information(
-            self,
-            "Hoàn tất",
-            f"🎉 Đã gửi và lưu {total} ảnh thành công!"
-        )
+            skipped = result["skipped"]
+            text = f"🎉 Đã gửi và lưu {total} ảnh thành công!"
+            if skipped:
+                text += (
+                    f"\n\n⏭ {len(skipped)} ảnh đã có trên mạch, không upload lại:\n"
+                    + ", ".join(skipped[:20]) + (" ..." if len(skipped) > 20 else "")
+                )
+            QMessageBox.information(self, "Hoàn tất", text)
 
-        self.refresh_device_data()
+            self.refresh_device_data()
+
+        # ====================
+        # PROGRESS DIALOG
+        self._run_with_progress(
+            "📤 Đang gửi ảnh lên ARGB",
+            "Chuẩn bị gửi ảnh...",
+            total,
+            work,
+            on_done=done,
+            cancel_msg="⛔ Người dùng đã hủy quá trình gửi.",
+            error_title="Lỗi Upload"
+        )
 
 
 if __name__ == "__main__":
+    # QtWebEngine (popup nhập PIN) nạp sau khi đã có QApplication
+    # → Qt yêu cầu bật chia sẻ OpenGL context trước khi tạo app
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     icon = resource_path("assets/favicon.ico")
     app.setWindowIcon(QIcon(icon))
     win = BMPConverter()
+    app.aboutToQuit.connect(win.stop_discovery)
+    app.aboutToQuit.connect(win.stop_telemetry)
+    app.aboutToQuit.connect(win.stop_live)
+    app.aboutToQuit.connect(win.stop_state_channel)
+    app.aboutToQuit.connect(win.stop_commands)
+    app.aboutToQuit.connect(cancel_all)
+    app.aboutToQuit.connect(close_all)
     win.setWindowIcon(QIcon(icon))
     win.show()
+    shown_at = time.time()
+
+    # Đo thời gian khởi động: POI_STARTUP_PROBE=<file json>
+    # (exe --windowed không có stdout nên ghi ra file)
+    probe = os.environ.get("POI_STARTUP_PROBE")
+    if probe:
+        def report_startup():
+            import json
+            heavy = ("PIL", "requests", "zeroconf", "PySide6.QtWebEngineWidgets")
+            with open(probe, "w", encoding="utf-8") as f:
+                json.dump({
+                    "shown": shown_at,
+                    "ready": time.time(),
+                    "loaded": [m for m in heavy if m in sys.modules],
+                }, f)
+            app.quit()
+
+        QTimer.singleShot(0, report_startup)
+
     sys.exit(app.exec())
@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from device_client import BULK_IN_FLIGHT
+
+# ====================
+# Gửi nhiều request xóa song song (preset, file...), số request đồng thời
+# tự điều chỉnh (AIMD):
+#   - request nhanh + thành công → tăng dần (+1 sau mỗi "vòng" limit request)
+#   - quá tải → giảm một nửa + nghỉ chút. Quá tải = timeout / mất kết nối,
+#     HTTP 503 (mạch đang bận buffer JSON), hoặc chậm hẳn so với lúc nhanh nhất
+#   - lỗi khác (vd HTTP 500) không phải do tải → chỉ để thử lại ở cuối
+# ESP yếu thì tự lùi về 1 request/lần, không làm rớt Wi-Fi
+# ====================
+
+START_LIMIT = 2
+MAX_LIMIT = BULK_IN_FLIGHT   # không vượt số request "bulk" DeviceClient cho chạy cùng lúc
+SLOW_FLOOR = 0.5        # (s) dưới mức này luôn coi là nhanh
+SLOW_RATIO = 3.0        # chậm hơn 3× lần nhanh nhất → mạch đang quá tải
+BACKOFF = 0.3           # (s) nghỉ sau mỗi lần giảm
+PROBE_AFTER = 20        # số lần OK liên tiếp trước khi thử lại mức từng bị quá tải
+                        # (gấp đôi mỗi lần thử lại vẫn quá tải ở cùng mức)
+BUSY_CODES = (429, 503)
+RETRY_ROUNDS = 2        # số lượt xóa lại ID lỗi (tuần tự, ở cuối)
+
+
+class AdaptiveLimit:
+    """Giới hạn đồng thời kiểu AIMD theo độ trễ + lỗi đo được."""
+
+    def __init__(self, start=START_LIMIT, low=1, high=MAX_LIMIT):
+        self.low = low
+        self.high = high
+        self.value = float(max(low, min(start, high)))
+        self.best = None        # độ trễ nhanh nhất đã thấy
+        self.ceiling = None     # mức đồng thời lần gần nhất bị lỗi / chậm
+        self.streak = 0
+        self.probe_after = PROBE_AFTER
+        self.cool_until = 0.0
+        self.cut_at = 0.0       # lúc giảm gần nhất
+
+    @property
+    def limit(self):
+        return int(self.value)
+
+    def is_slow(self, latency):
+        if self.best is None or latency <= SLOW_FLOOR:
+            return False
+        return latency > self.best * SLOW_RATIO
+
+    def success(self, started, latency):
+        slow = self.is_slow(latency)
+        self.best = latency if self.best is None else min(self.best, latency)
+        if slow:
+            self._decrease(started)
+            return
+
+        # +1 sau khoảng `limit` request thành công
+        self.streak += 1
+        grow = self.value + 1.0 / self.value
+        if self.ceiling and self.limit < self.ceiling <= int(grow) and self.streak < self.probe_after:
+            return   # mức này vừa quá tải → chờ ổn định lâu hơn rồi mới thử lại
+        self.value = min(self.high, grow)
+
+    def failure(self, started, latency, status):
+        # status None = exception (timeout, mất kết nối)
+        if status is None or status in BUSY_CODES or self.is_slow(latency):
+            self._decrease(started)
+
+    def _decrease(self, started):
+        # request gửi trước lần giảm trước thuộc "đợt" đã bị phạt → bỏ qua
+        if started < self.cut_at:
+            return
+        self.cut_at = time.monotonic()
+        if self.limit == self.ceiling:
+            self.probe_after *= 2
+        self.ceiling = self.limit
+        self.streak = 0
+        self.value = max(self.low, self.value / 2)
+        self.cool_until = time.monotonic() + BACKOFF
+
+    def cooling(self):
+        return time.monotonic() < self.cool_until
+
+
+def _send_one(send, item):
+    # trả (item, HTTP status hoặc None nếu lỗi kết nối, lúc gửi, độ trễ)
+    # Response của DeviceClient có wire_time / queue_time → bỏ thời gian chờ
+    # trong hàng, chỉ tính lúc mạch thật sự xử lý
+    start = time.monotonic()
+    try:
+        r = send(item)
+    except Exception:
+        return item, None, start, time.monotonic() - start
+    latency = getattr(r, "wire_time", time.monotonic() - start)
+    return item, r.status_code, start + getattr(r, "queue_time", 0.0), latency
+
+
+def run_adaptive(send, items, on_progress=None, cancelled=None, retry_rounds=RETRY_ROUNDS):
+    """
+    Gọi send(item) → Response cho từng item, trả danh sách item vẫn lỗi
+    (khác HTTP 200) sau khi đã thử lại.
+    on_progress(số đã xử lý, item, limit hiện tại) gọi trên thread gọi hàm
+    (lượt thử lại ở cuối báo limit = 0).
+    cancelled() → True thì ngừng gửi thêm, chờ request đang chạy rồi về.
+    """
+    ctl = AdaptiveLimit()
+    pending = list(items)
+    failed = []
+    processed = 0
+
+    with ThreadPoolExecutor(max_workers=MAX_LIMIT) as pool:
+        in_flight = set()
+
+        while pending or in_flight:
+            if cancelled and cancelled():
+                pending.clear()
+
+            while pending and len(in_flight) < ctl.limit and not ctl.cooling():
+                in_flight.add(pool.submit(_send_one, send, pending.pop(0)))
+
+            if not in_flight:
+                # đang nghỉ sau khi giảm tốc
+                time.sleep(max(0.0, ctl.cool_until - time.monotonic()))
+                continue
+
+            finished, in_flight = wait(in_flight, timeout=BACKOFF, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                item, status, started, latency = fut.result()
+                if status == 200:
+                    ctl.success(started, latency)
+                else:
+                    ctl.failure(started, latency, status)
+                    failed.append(item)
+                processed += 1
+                if on_progress:
+                    on_progress(processed, item, ctl.limit)
+
+    # ==== thử lại ID lỗi ở cuối, từng cái một ====
+    for _ in range(retry_rounds):
+        if not failed or (cancelled and cancelled()):
+            break
+        time.sleep(BACKOFF)
+        retry, failed = failed, []
+        for item in retry:
+            if cancelled and cancelled():
+                failed.append(item)
+                continue
+            if on_progress:
+                on_progress(processed, item, 0)
+            if _send_one(send, item)[1] != 200:
+                failed.append(item)
+
+    return sorted(failed)
+
+
+def wipe_presets(client, preset_ids, **kwargs):
+    """Xóa preset_ids (pdel), trả ID vẫn lỗi — tham số như run_adaptive."""
+    return run_adaptive(lambda pid: client.post_state({"pdel": pid}, "bulk", verbose=False), preset_ids, **kwargs)
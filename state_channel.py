@@ -0,0 +1,91 @@
+import json
+import threading
+
+# ====================
+# Nhận state của mạch qua WebSocket ws://<ip>/ws (WLED đẩy {"state", "info"}
+# ngay khi kết nối và sau mỗi lần state đổi — kể cả đổi từ web UI / nút trên mạch)
+# → không cần GET lại /json/state sau mỗi lệnh.
+# Cần thư viện websocket-client (tùy chọn): thiếu thì nơi gọi quay về đọc HTTP.
+# ====================
+
+RECONNECT_MIN = 1.0     # (s) chờ trước khi kết nối lại, gấp đôi mỗi lần lỗi
+RECONNECT_MAX = 30.0
+PING_INTERVAL = 20      # (s) giữ kết nối qua router / phát hiện mạch mất điện
+PING_TIMEOUT = 5
+
+
+def ws_url(ip):
+    return f"ws://{ip}/ws"
+
+
+class StateChannel:
+    """
+    Giữ kết nối WebSocket tới 1 mạch, tự kết nối lại khi rớt.
+    on_message(ip, data) với data = {"state": ..., "info": ...};
+    on_message(ip, None) khi mất kết nối. Gọi từ thread nền
+    — GUI tự chuyển về thread chính (xem workers.DeviceSignals).
+    """
+
+    def __init__(self, ip, on_message):
+        self.ip = ip
+        self.on_message = on_message
+        self.connected = False
+        self._ws = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._delay = RECONNECT_MIN
+
+    # ====================
+    # Vòng đời
+    def start(self):
+        # ImportError nếu chưa cài websocket-client → nơi gọi báo người dùng
+        import websocket  # noqa: F401
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"ws-{self.ip}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+
+    def _run(self):
+        import websocket
+
+        while not self._stop.is_set():
+            self._ws = websocket.WebSocketApp(
+                ws_url(self.ip),
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_close=self._on_close,
+            )
+            self._ws.run_forever(ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT)
+
+            # mạch chưa có / đang khởi động lại → chờ giãn dần
+            # (kết nối được lần nào thì _on_open đã đặt lại về RECONNECT_MIN)
+            self._stop.wait(self._delay)
+            self._delay = min(RECONNECT_MAX, self._delay * 2)
+
+    # ====================
+    # Callback websocket-client (thread của channel)
+    def _on_open(self, ws):
+        self.connected = True
+        self._delay = RECONNECT_MIN
+
+    def _on_message(self, ws, message):
+        if isinstance(message, bytes):
+            return   # gói nhị phân (live LED) không dùng
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return
+        if isinstance(data, dict) and "state" in data and not self._stop.is_set():
+            self.on_message(self.ip, data)
+
+    def _on_close(self, ws, *args):
+        if self.connected:
+            self.connected = False
+            if not self._stop.is_set():
+                self.on_message(self.ip, None)
@@ -0,0 +1,62 @@
+# ====================
+# So lệnh muốn gửi với state mạch đã xác nhận (response "v": true / WebSocket)
+# → chỉ gửi phần thật sự khác. Không khác gì → {} (bỏ lệnh):
+#   - body nhỏ hơn
+#   - không khởi động lại effect đang chạy / không ghi flash vô ích
+# ====================
+
+# Lệnh hành động: luôn gửi dù giá trị trùng state (vd bấm lại preset = chạy lại)
+ACTION_KEYS = {"ps", "psave", "pdel", "playlist", "np", "rb", "nl"}
+
+# Đi kèm lệnh, tự nó không thay đổi gì → chỉ giữ khi patch còn nội dung
+MODIFIER_KEYS = {"v", "tt"}
+
+
+def same(current, wanted):
+    """wanted đã có sẵn trong current chưa (dict: mọi key của wanted; list: phần đầu)."""
+    if isinstance(wanted, dict):
+        return isinstance(current, dict) and all(
+            same(current.get(k), v) for k, v in wanted.items()
+        )
+    if isinstance(wanted, list):
+        # màu [r,g,b] so với state [r,g,b,w] của dải RGBW → chỉ so phần gửi đi
+        return isinstance(current, list) and len(current) >= len(wanted) and all(
+            same(c, w) for c, w in zip(current, wanted)
+        )
+    return current == wanted
+
+
+def diff_segments(current, wanted):
+    by_id = {seg.get("id", i): seg for i, seg in enumerate(current or [])}
+    out = []
+    for i, seg in enumerate(wanted):
+        sid = seg.get("id", i)
+        cur = by_id.get(sid)
+        if cur is None:
+            out.append(seg)   # segment mới
+            continue
+        changed = {k: v for k, v in seg.items() if k != "id" and not same(cur.get(k), v)}
+        if changed:
+            out.append({"id": sid, **changed})
+    return out
+
+
+def diff_state(current, wanted):
+    """Patch nhỏ nhất để state mạch (current) thành wanted; {} nếu không cần gửi."""
+    current = current or {}
+    patch = {}
+    for key, value in wanted.items():
+        if key in MODIFIER_KEYS:
+            continue
+        if key in ACTION_KEYS:
+            patch[key] = value
+        elif key == "seg" and isinstance(value, list):
+            segs = diff_segments(current.get("seg"), value)
+            if segs:
+                patch["seg"] = segs
+        elif not same(current.get(key), value):
+            patch[key] = value
+
+    if patch:
+        patch.update({k: wanted[k] for k in MODIFIER_KEYS if k in wanted})
+    return patch
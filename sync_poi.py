@@ -0,0 +1,205 @@
+import json
+import statistics
+import threading
+import time
+
+from device_client import get_client, UploadError
+from fanout import fan_out, check_status
+
+# ====================
+# Bắt đầu preset / playlist trên nhiều POI gần như cùng lúc
+#   1) đo: vài request nhỏ tới từng mạch → RTT, trễ 1 chiều ≈ RTT / 2
+#   2) chuẩn bị: kiểm tra preset có trên mọi mạch, giữ sẵn kết nối keep-alive,
+#      dựng sẵn body lệnh (lúc bắn không còn việc gì phải làm)
+#   3) bắn: chọn thời điểm T chung, mạch i nhận lệnh lúc T - trễ_i
+#      → mạch xa gửi trước, mạch gần gửi sau, tất cả tới nơi ≈ T
+# Mạch WLED không có đồng hồ ms để hẹn giờ qua HTTP, nên "offset" ở đây là
+# thời gian từ lúc gửi tới lúc mạch áp dụng lệnh, không phải lệch đồng hồ.
+# ====================
+
+PROBES = 7          # số lần đo mỗi mạch (lần đầu mở kết nối → bỏ)
+LEAD = 0.05         # (s) thời gian chờ thêm trước khi bắn, cho các thread kịp sẵn sàng
+SPIN = 0.003        # (s) đoạn cuối chờ bằng vòng lặp bận cho chính xác
+
+
+class Timing:
+    """Kết quả đo 1 mạch."""
+
+    def __init__(self, ip, rtts):
+        self.ip = ip
+        self.rtts = sorted(rtts)
+        self.rtt = statistics.median(self.rtts)
+        self.offset = self.rtt / 2           # trễ 1 chiều ước lượng
+        self.jitter = (self.rtts[-1] - self.rtts[0]) / 2
+
+    def describe(self):
+        return (f"{self.ip}: RTT {self.rtt * 1000:.1f} ms, "
+                f"trễ ~{self.offset * 1000:.1f} ms (±{self.jitter * 1000:.1f})")
+
+
+# ====================
+# Preset / playlist (dùng chung với FN1)
+# ====================
+def valid_presets(presets):
+    """[(id, tên)] các preset dùng được (ID >= 1, không rỗng), theo ID."""
+    valid = []
+    for k, v in presets.items():
+        if k.isdigit() and int(k) >= 1 and isinstance(v, dict) and len(v) > 0:
+            valid.append((int(k), v.get("n", f"Preset {k}")))
+    return sorted(valid)
+
+
+def playlist_payload(preset_ids, seconds):
+    # dur của WLED tính theo 1/10 giây
+    return {
+        "on": True,
+        "playlist": {
+            "ps": list(preset_ids),
+            "dur": [seconds * 10] * len(preset_ids),
+            "repeat": 0
+        }
+    }
+
+
+def preset_payload(preset_id):
+    return {"on": True, "ps": preset_id}
+
+
+# ====================
+# 1) Đo
+# ====================
+def measure_one(ip, probes=PROBES):
+    client = get_client(ip)
+    rtts = []
+    # giữ chỗ trong hàng chờ của mạch suốt lượt đo → RTT không lẫn thời gian xếp hàng
+    with client.reserve():
+        for i in range(probes + 1):
+            r = check_status(client.get("/json/info", "probe"))
+            if i:
+                rtts.append(r.wire_time)
+    return Timing(ip, rtts)
+
+
+def measure(ips, probes=PROBES):
+    return fan_out(ips, lambda ip: measure_one(ip, probes))
+
+
+# ====================
+# 2) Chuẩn bị
+# ====================
+def common_presets(ips):
+    """Preset có trên mọi mạch (so theo ID) → ([(id, tên)], {ip: DeviceResult})."""
+    results = fan_out(ips, lambda ip: valid_presets(get_client(ip).get_json("/presets.json")))
+    common = None
+    for r in results.values():
+        if r.ok:
+            ids = dict(r.value)
+            common = ids if common is None else {k: v for k, v in common.items() if k in ids}
+    return sorted((common or {}).items()), results
+
+
+def _encode(payload):
+    # "tt": 0 → đổi preset ngay, không chuyển mờ (chỉ áp dụng cho lệnh này)
+    # "v": true → mạch trả state mới trong response
+    return json.dumps(dict(payload, tt=0, v=True), separators=(",", ":")).encode()
+
+
+# ====================
+# 3) Bắn lệnh
+# ====================
+def _wait_until(deadline):
+    while True:
+        left = deadline - time.perf_counter()
+        if left <= 0:
+            return
+        if left > SPIN:
+            time.sleep(left - SPIN)
+
+
+class SyncReport:
+    """Thời điểm gửi / tới nơi ước lượng của từng mạch + độ lệch giữa các mạch."""
+
+    def __init__(self, target, rows, errors):
+        self.target = target
+        self.rows = rows        # ip -> (gửi, tới nơi ước lượng, RTT lệnh bắn)
+        self.errors = errors    # ip -> Exception
+
+    @property
+    def spread(self):
+        arrivals = [arrive for _, arrive, _ in self.rows.values()]
+        return max(arrivals) - min(arrivals) if arrivals else 0.0
+
+    def lines(self):
+        out = []
+        for ip, (sent, arrive, rtt) in self.rows.items():
+            out.append(f"✓ {ip}: gửi T{(sent - self.target) * 1000:+.1f} ms, "
+                       f"tới ~T{(arrive - self.target) * 1000:+.1f} ms (RTT {rtt * 1000:.1f} ms)")
+        for ip, e in self.errors.items():
+            out.append(f"✗ {ip}: {e}")
+        return out
+
+
+def trigger(timings, payload, lead=LEAD):
+    """
+    timings: [Timing] (đã đo); gửi payload sao cho mọi mạch nhận ≈ cùng lúc.
+    Trả SyncReport.
+    """
+    body = _encode(payload)
+    headers = {"Content-Type": "application/json"}
+    clients = {t.ip: get_client(t.ip) for t in timings}
+
+    rows, errors = {}, {}
+    lock = threading.Lock()
+    # mọi mạch giữ được chỗ trong hàng chờ rồi mới chọn mốc → lệnh bắn không phải xếp hàng
+    ready = threading.Barrier(len(timings) + 1)
+    go = threading.Event()
+    target = 0.0
+
+    def fire(t):
+        client = clients[t.ip]
+        with client.reserve():
+            ready.wait()
+            go.wait()
+            _wait_until(target - t.offset)
+            sent = time.perf_counter()
+            try:
+                r = check_status(client.post("/json/state", "state", data=body, headers=headers))
+            except Exception as e:
+                with lock:
+                    errors[t.ip] = e
+                return
+        rtt = r.wire_time
+        client.accept_state(r)
+        with lock:
+            # chiều đi ≈ nửa RTT của chính lệnh bắn
+            rows[t.ip] = (sent, sent + rtt / 2, rtt)
+
+    threads = [threading.Thread(target=fire, args=(t,), daemon=True) for t in timings]
+    for th in threads:
+        th.start()
+    ready.wait()
+    target = time.perf_counter() + max(t.offset for t in timings) + lead
+    go.set()
+    for th in threads:
+        th.join()
+
+    order = [t.ip for t in timings]
+    rows = {ip: rows[ip] for ip in order if ip in rows}
+    return SyncReport(target, rows, errors)
+
+
+def sync_start(ips, payload, probes=PROBES, lead=LEAD):
+    """
+    Đo + bắn. Mạch đo lỗi thì bỏ khỏi lượt bắn (ghi vào report.errors).
+    Trả (SyncReport, [Timing]).
+    """
+    measured = measure(ips, probes)
+    timings = [r.value for r in measured.values() if r.ok]
+    if not timings:
+        raise UploadError("Không mạch nào phản hồi khi đo độ trễ.")
+
+    report = trigger(timings, payload, lead)
+    for ip, r in measured.items():
+        if not r.ok:
+            report.errors[ip] = r.error
+    return report, timings
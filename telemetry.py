@@ -0,0 +1,273 @@
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from device_client import get_client
+from flash_planner import free_bytes
+
+# ====================
+# Theo dõi sức khỏe mạch chạy nền: chỉ GET /json/info (nhỏ, không kèm
+# state / effect / palette như /json)
+#   - không có gì đổi → giãn dần khoảng hỏi (tới MAX_INTERVAL)
+#   - vừa gửi lệnh tới mạch → hỏi dày lại một lúc
+#   - mỗi mạch giữ HISTORY mẫu gần nhất (độ trễ, sóng Wi-Fi, bộ nhớ trống)
+# → thấy mạch yếu dần trước khi upload bị lỗi
+# ====================
+
+MIN_INTERVAL = 1.0      # (s)
+MAX_INTERVAL = 15.0
+FAIL_INTERVAL = 5.0     # mạch không phản hồi → vẫn hỏi thưa để biết khi nào có lại
+BACKOFF = 1.5           # hệ số giãn khi không có gì đổi
+BOOST_FOR = 10.0        # (s) hỏi dày sau khi có lệnh gửi tới mạch
+TICK = 0.5              # (s) vòng kiểm tra lịch hỏi
+HISTORY = 120           # số mẫu giữ lại mỗi mạch
+POLL_WORKERS = 4
+
+WRITE_KINDS = ("state", "upload", "bulk")
+
+# Ngưỡng cảnh báo
+SLOW_MS = 150           # trễ gần đây vượt mức này và gấp đôi bình thường
+WEAK_SIGNAL = 40        # %
+SIGNAL_DROP = 15        # tụt bao nhiêu % so với bình thường
+LOW_FREE = 64 * 1024    # (byte)
+RECENT = 5              # số mẫu gần nhất để so với cả lịch sử
+RSSI_STEP = 3           # sóng Wi-Fi dao động vài % là bình thường → không tính là đổi
+LATENCY_STEP = 10       # (ms) làm tròn độ trễ hiển thị
+
+SPARK = "▁▂▃▄▅▆▇█"
+
+
+class Sample:
+    __slots__ = ("time", "ok", "latency", "rssi", "free")
+
+    def __init__(self, ok, latency=None, rssi=None, free=None):
+        self.time = time.time()
+        self.ok = ok
+        self.latency = latency  # ms
+        self.rssi = rssi        # % sóng Wi-Fi
+        self.free = free        # byte flash trống
+
+
+class DeviceHealth:
+    """Lịch sử mẫu của 1 mạch (ring buffer) + các trường hiển thị."""
+
+    def __init__(self, ip, history=HISTORY):
+        self.ip = ip
+        self.samples = deque(maxlen=history)
+        self.fields = {}        # trường hiển thị -> giá trị (để biết trường nào đổi)
+        self.info = None        # /json/info gần nhất
+        self.interval = MIN_INTERVAL
+        self.due = 0.0          # time.monotonic() lần hỏi tới
+        self.boost_until = 0.0
+        self.writes = 0         # số lệnh ghi đã thấy (để phát hiện lệnh mới)
+
+    # ====================
+    # Nhận mẫu mới → trả {trường: giá trị} những trường vừa đổi
+    def add(self, sample, info=None):
+        self.samples.append(sample)
+        if info is not None:
+            self.info = info
+
+        fields = {"online": sample.ok}
+        if sample.ok and info is not None:
+            rssi = sample.rssi
+            old = self.fields.get("rssi")
+            if rssi is not None and old is not None and abs(rssi - old) < RSSI_STEP:
+                rssi = old
+            recent = self._values("latency", list(self.samples)[-RECENT:])
+            fields.update({
+                "name": info.get("name"),
+                "ver": info.get("ver"),
+                "rssi": rssi,
+                "fs": _fs_percent(info),
+                "free": sample.free,
+                "latency": round(statistics.median(recent) / LATENCY_STEP) * LATENCY_STEP,
+            })
+        fields["warnings"] = tuple(self.warnings())
+
+        changed = {k: v for k, v in fields.items() if self.fields.get(k) != v}
+        self.fields.update(fields)
+        return changed
+
+    # ====================
+    # Số liệu
+    def _values(self, attr, samples=None):
+        # samples = [] (cửa sổ rỗng) → không có dữ liệu, không lấy cả bộ đệm
+        if samples is None:
+            samples = self.samples
+        return [getattr(s, attr) for s in samples
+                if s.ok and getattr(s, attr) is not None]
+
+    def latencies(self):
+        return self._values("latency")
+
+    def warnings(self):
+        """Các dấu hiệu mạch đang yếu dần (danh sách chuỗi)."""
+        out = []
+        recent = list(self.samples)[-RECENT:]
+        fails = sum(1 for s in recent if not s.ok)
+        if fails >= 2:
+            out.append(f"mất kết nối {fails}/{len(recent)} lần gần đây")
+
+        lat_all, lat_recent = self.latencies(), self._values("latency", recent)
+        if len(lat_all) > RECENT and lat_recent:
+            now, usual = statistics.median(lat_recent), statistics.median(lat_all)
+            if now > SLOW_MS and now > 2 * usual:
+                out.append(f"phản hồi chậm ({now:.0f} ms, bình thường {usual:.0f} ms)")
+
+        rssi_all, rssi_recent = self._values("rssi"), self._values("rssi", recent)
+        if rssi_recent:
+            now = statistics.median(rssi_recent)
+            if now < WEAK_SIGNAL:
+                out.append(f"sóng Wi-Fi yếu ({now:.0f}%)")
+            elif len(rssi_all) > RECENT and statistics.median(rssi_all) - now >= SIGNAL_DROP:
+                out.append(f"sóng Wi-Fi đang tụt ({now:.0f}%)")
+
+        free = self._values("free", recent)
+        if free and free[-1] < LOW_FREE:
+            out.append(f"bộ nhớ sắp đầy (còn {free[-1] // 1024} KB)")
+        return out
+
+    def sparkline(self, count=12):
+        values = self.latencies()[-count:]
+        if not values:
+            return ""
+        low, high = min(values), max(values)
+        span = (high - low) or 1
+        return "".join(SPARK[int((v - low) / span * (len(SPARK) - 1))] for v in values)
+
+    # ====================
+    # Lịch hỏi
+    def schedule(self, changed, now):
+        if not self.samples[-1].ok:
+            self.interval = FAIL_INTERVAL
+        elif now < self.boost_until:
+            self.interval = MIN_INTERVAL
+        elif set(changed) - {"latency"}:
+            # có gì đó thật sự đổi → hỏi dày lại (độ trễ đổi không tính)
+            self.interval = MIN_INTERVAL
+        else:
+            self.interval = min(MAX_INTERVAL, self.interval * BACKOFF)
+        self.due = now + self.interval
+
+    def boost(self, now):
+        self.boost_until = now + BOOST_FOR
+        self.interval = MIN_INTERVAL
+        self.due = min(self.due, now + MIN_INTERVAL / 2)
+
+
+def _fs_percent(info):
+    fs = info.get("fs") or {}
+    if fs.get("u") is None or not fs.get("t"):
+        return None
+    return int(fs["u"] * 100 / fs["t"])
+
+
+class TelemetryMonitor:
+    """
+    on_sample(ip, DeviceHealth, changed) gọi từ thread nền mỗi lần hỏi xong
+    — GUI tự chuyển về thread chính (xem workers.DeviceSignals).
+    """
+
+    def __init__(self, on_sample):
+        self.on_sample = on_sample
+        self.devices = {}           # ip -> DeviceHealth
+        self._lock = threading.Lock()
+        self._busy = set()          # ip đang hỏi
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=POLL_WORKERS)
+        self._thread = None
+
+    # ====================
+    # Vòng đời
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="telemetry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def watch(self, ip):
+        with self._lock:
+            if ip not in self.devices:
+                self.devices[ip] = DeviceHealth(ip)
+        self._wake.set()
+
+    def unwatch(self, ip):
+        with self._lock:
+            self.devices.pop(ip, None)
+
+    def health(self, ip):
+        with self._lock:
+            return self.devices.get(ip)
+
+    def boost(self, ip):
+        """Hỏi dày lại (vd: vừa gửi lệnh tới mạch)."""
+        with self._lock:
+            dev = self.devices.get(ip)
+            if dev:
+                dev.boost(time.monotonic())
+        self._wake.set()
+
+    # ====================
+    # Vòng lặp: chỉ xếp lịch, việc gọi mạch đẩy sang pool
+    def _loop(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = []
+                for dev in self.devices.values():
+                    self._check_writes(dev, now)
+                    if dev.due <= now and dev.ip not in self._busy:
+                        self._busy.add(dev.ip)
+                        due.append(dev)
+
+            for dev in due:
+                try:
+                    self._pool.submit(self._poll, dev)
+                except RuntimeError:
+                    return   # đã stop
+
+            self._wake.wait(TICK)
+            self._wake.clear()
+
+    def _check_writes(self, dev, now):
+        # lệnh ghi mới (từ bất kỳ đâu trong app) → hỏi dày lại
+        stats = get_client(dev.ip).stats
+        writes = sum(stats[k].count for k in WRITE_KINDS if k in stats)
+        if writes != dev.writes:
+            if dev.samples:
+                dev.boost(now)
+            dev.writes = writes
+
+    def _poll(self, dev):
+        info = None
+        latency = None
+        try:
+            r = get_client(dev.ip).get("/json/info", "poll")
+            if r.status_code == 200:
+                info = r.json()
+                # chỉ thời gian trên mạng: poll ưu tiên thấp, chờ sau upload không phải mạch chậm
+                latency = r.wire_time * 1000
+        except Exception:
+            pass
+
+        if info is None:
+            sample = Sample(False)
+        else:
+            sample = Sample(True, latency, (info.get("wifi") or {}).get("signal"), free_bytes(info))
+
+        with self._lock:
+            changed = dev.add(sample, info)
+            dev.schedule(changed, time.monotonic())
+            self._busy.discard(dev.ip)
+            watched = self.devices.get(dev.ip) is dev
+
+        if watched and not self._stop.is_set():
+            self.on_sample(dev.ip, dev, changed)
@@ -0,0 +1,126 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from image_utils import encode_bmp
+from image_cache import shared_cache
+from device_client import UploadError, PinRequired
+from file_sync import DeviceSync
+
+# ====================
+# Gửi nhiều ảnh: convert ảnh N+1 trong lúc ảnh N đang upload
+# ====================
+
+
+def make_preset_name(path, fallback):
+    # chỉ giữ ký tự an toàn, tối đa 20 ký tự
+    name_no_ext = os.path.splitext(os.path.basename(path))[0]
+    safe_name = re.sub(r"[^a-zA-Z0-9_-]", "_", name_no_ext)
+    return safe_name[:20] or fallback
+
+
+def image_preset_payload(upload_filename, preset_name, preset_id):
+    # Hiệu ứng 48 đọc ảnh BMP từ bộ nhớ, lưu luôn thành preset
+    return {
+        "on": True,
+        "bri": 100,
+        "seg": [
+            {
+                "id": 0,
+                "on": True,
+                "bri": 60,
+                "n": f"/{upload_filename}",
+                "fx": 48
+            }
+        ],
+        "psave": preset_id,
+        "n": preset_name
+    }
+
+
+def prepare_bmp(path, width):
+    # Mở ảnh khi cần, đóng ngay sau khi convert (ảnh trùng lấy từ cache)
+    return encode_bmp(shared_cache.convert_file(path, width))
+
+
+def iter_prepared(paths, width, start=1, prefetch=1):
+    """
+    Trả (idx, path, bmp_bytes) theo đúng thứ tự, idx bắt đầu từ `start`.
+    Luôn có sẵn tối đa `prefetch` ảnh đang convert phía trước → RAM không đổi.
+    """
+    items = list(enumerate(paths, start=1))[start - 1:]
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        queue = []
+        pos = 0
+
+        def fill():
+            nonlocal pos
+            while len(queue) <= prefetch and pos < len(items):
+                idx, path = items[pos]
+                queue.append((idx, path, pool.submit(prepare_bmp, path, width)))
+                pos += 1
+
+        try:
+            fill()
+            while queue:
+                idx, path, fut = queue.pop(0)
+                data = fut.result()
+                fill()
+                yield idx, path, data
+        finally:
+            for _, _, fut in queue:
+                fut.cancel()
+
+
+def send_images(client, paths, width, start=1, on_item=None, sync=False):
+    """
+    Upload từng ảnh + lưu preset số idx (GUI và CLI dùng chung).
+    on_item(idx, path) gọi trước mỗi ảnh — có thể raise để dừng giữa chừng.
+    sync=True → ảnh đã có trên mạch (cùng tên, dung lượng, nội dung) không upload lại.
+    Trả {"locked": idx ảnh bị PIN chặn hoặc None, "warnings": [...], "skipped": [...]}.
+    """
+    warnings = []
+    skipped = []
+    state = None
+
+    if sync:
+        try:
+            state = DeviceSync(client)
+        except PinRequired:
+            return {"locked": start, "warnings": warnings, "skipped": skipped}
+
+    try:
+        for idx, path, bmp_data in iter_prepared(paths, width, start=start):
+            if on_item:
+                on_item(idx, path)
+
+            preset_name = make_preset_name(path, f"Preset_{idx}")
+            upload_filename = preset_name + ".bmp"
+            payload = image_preset_payload(upload_filename, preset_name, idx)
+
+            if state and state.is_current(upload_filename, bmp_data):
+                skipped.append(upload_filename)
+                if state.preset_current(idx, payload):
+                    continue
+            else:
+                r = client.upload(upload_filename, bmp_data)
+
+                # PIN 401 → dừng, nơi gọi quyết định mở khóa rồi chạy lại từ ảnh này
+                if r.status_code == 401:
+                    return {"locked": idx, "warnings": warnings, "skipped": skipped}
+                elif r.status_code != 200:
+                    raise UploadError(f"Upload thất bại!\nHTTP {r.status_code}")
+
+                if state:
+                    state.uploaded(upload_filename, bmp_data)
+
+            r2 = client.post_state(payload, "upload")
+
+            if r2.status_code != 200:
+                warnings.append(f"{preset_name}: HTTP {r2.status_code}")
+    finally:
+        if state:
+            state.save()
+
+    return {"locked": None, "warnings": warnings, "skipped": skipped}
@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import QWidget
-from PySide6.QtGui import QPainter, QColor, QPalette, QFont, QPen, QImage, QFontMetrics
-from PySide6.QtCore import Qt, QRect
+from PySide6.QtGui import QPainter, QColor, QPalette, QFont, QPen, QImage, QFontMetrics, QPixmap
+from PySide6.QtCore import Qt, QRect, QLine
 
 class PixelPreview(QWidget):
     def __init__(self):
@@ -9,14 +9,51 @@ class PixelPreview(QWidget):
         self.grid = True
         self.setAutoFillBackground(True)
 
+        # Ảnh đã phóng to sẵn (kèm lưới) → mỗi lần vẽ chỉ còn 1 lần blit
+        self._cache = None
+        self._cache_key = None
+
     def setImage(self, qimg: QImage):
         self.image = qimg
+        self._cache = None
+        self.update()
+
+    def setGrid(self, on: bool):
+        self.grid = on
         self.update()
 
     def clear(self):
         self.image = None
+        self._cache = None
         self.update()
 
+    def _scaled_pixmap(self, px):
+        key = (self.image.cacheKey(), px, self.grid)
+        if self._cache is not None and self._cache_key == key:
+            return self._cache
+
+        img_w, img_h = self.image.width(), self.image.height()
+        w, h = img_w * px, img_h * px
+
+        # Phóng to kiểu nearest-neighbour: mỗi pixel → ô px x px
+        scaled = self.image.scaled(w, h, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+
+        pix = QPixmap(w + 1, h + 1)
+        pix.fill(Qt.transparent)
+        painter = QPainter(pix)
+        painter.drawImage(0, 0, scaled)
+
+        # Lưới: 2 lượt vẽ (dọc + ngang) thay vì 1 drawRect mỗi pixel
+        if self.grid and px >= 4:
+            painter.setPen(QColor(40, 40, 40))
+            painter.drawLines([QLine(x * px, 0, x * px, h) for x in range(img_w + 1)])
+            painter.drawLines([QLine(0, y * px, w, y * px) for y in range(img_h + 1)])
+        painter.end()
+
+        self._cache = pix
+        self._cache_key = key
+        return pix
+
     def paintEvent(self, event):
         painter = QPainter(self)
         pal = self.palette()
@@ -44,17 +81,12 @@ class PixelPreview(QWidget):
         img_w, img_h = self.image.width(), self.image.height()
 
         px = min(w // img_w, h // img_h)
+        if px <= 0:
+            return
         ox = (w - img_w * px) // 2
         oy = (h - img_h * px) // 2
 
-        for y in range(img_h):
-            for x in range(img_w):
-                color = QColor(self.image.pixel(x, y))
-                painter.fillRect(ox + x * px, oy + y * px, px, px, color)
-
-                if self.grid and px >= 4:
-                    painter.setPen(QColor(40, 40, 40))
-                    painter.drawRect(ox + x * px, oy + y * px, px, px)
+        painter.drawPixmap(ox, oy, self._scaled_pixmap(px))
 
         # # ==========================
         # # OVERLAY THÔNG TIN ẢNH
@@ -0,0 +1,115 @@
+import threading
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+# ====================
+# Pool riêng cho I/O mạch ARGB (không dùng chung globalInstance)
+# ====================
+MAX_THREADS = 8
+
+_pool = None
+_running = set()   # giữ tham chiếu task cho tới khi GUI nhận kết quả
+
+
+class Cancelled(Exception):
+    """Task bị hủy giữa chừng."""
+
+
+class TaskSignals(QObject):
+    finished = Signal(object)
+    failed = Signal(object)
+    cancelled = Signal()
+    progress = Signal(int, object)
+
+
+class DeviceSignals(QObject):
+    """Sự kiện từ thread nền (discovery, telemetry) về GUI."""
+    found = Signal(str, str)   # ip, tên
+    lost = Signal(str)
+    health = Signal(str, object, object)   # ip, DeviceHealth, {trường vừa đổi}
+    state = Signal(str, object)            # ip, {"state", "info"} qua WebSocket (None = mất kết nối)
+
+
+class DeviceTask(QRunnable):
+    """Chạy fn(task, *args) trên thread nền, trả kết quả qua signal về GUI."""
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self._cancel = threading.Event()
+
+    # ====================
+    # Hủy: fn kiểm tra cờ giữa các bước qua task.check()
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def report(self, value, info=None):
+        self.signals.progress.emit(value, info)
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            if self._cancel.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+
+
+def thread_pool():
+    global _pool
+    if _pool is None:
+        _pool = QThreadPool()
+        _pool.setMaxThreadCount(MAX_THREADS)
+    return _pool
+
+
+# ====================
+# Khởi chạy task — phải gọi từ GUI thread
+# ====================
+def run_task(fn, *args, on_done=None, on_error=None, on_progress=None,
+             on_cancel=None, **kwargs):
+    task = DeviceTask(fn, *args, **kwargs)
+    sig = task.signals
+
+    if on_done:
+        sig.finished.connect(on_done)
+    if on_error:
+        sig.failed.connect(on_error)
+    if on_progress:
+        sig.progress.connect(on_progress)
+    if on_cancel:
+        sig.cancelled.connect(on_cancel)
+
+    def release(*_):
+        _running.discard(task)
+
+    sig.finished.connect(release)
+    sig.failed.connect(release)
+    sig.cancelled.connect(release)
+
+    _running.add(task)
+    thread_pool().start(task)
+    return task
+
+
+def cancel_all(wait_ms=3000):
+    for task in list(_running):
+        task.cancel()
+    if _pool is not None:
+        _pool.waitForDone(wait_ms)